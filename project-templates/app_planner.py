@@ -0,0 +1,253 @@
+"""
+Plan-then-parallel generation for Doc2App.
+
+One call for a whole multi-file app is capped at max_output_tokens (8192),
+so bigger apps - Full Stack especially - arrive cut off, and every file is
+written one after the other. In plan mode:
+
+1. plan: one small call returns a JSON manifest - every file's path,
+   purpose and the interfaces other files rely on, plus shared conventions
+2. files: each file is generated on its own, concurrently, with the whole
+   plan (and the docs) as context, so imports and signatures line up
+3. continuation: a file that still hits the output cap is continued from
+   where it stopped, up to MAX_CONTINUATIONS times
+
+Wall time is roughly plan + the slowest file. assemble() renders the files
+in the same ### `path` + fence layout project_files parses, so caching,
+history and the ZIP download work unchanged.
+"""
+
+import json
+import re
+
+from call_metrics import start_call
+from fan_out import fan_out
+from gemini_client import generate
+from project_files import clean_path, language_for
+
+
+DEFAULT_MAX_WORKERS = 4
+MAX_FILES = 25
+MAX_CONTINUATIONS = 3
+CONTINUATION_TAIL_CHARS = 2000   # how much of the cut-off text we show the model again
+
+PLAN_CONFIG = {
+    'temperature': 0.2,
+    'max_output_tokens': 4096,
+    'response_mime_type': 'application/json',
+}
+
+PLAN_PROMPT = """You are the lead developer planning a {app_type} built from the documentation below.
+Do NOT write the code yet. Return ONLY a JSON object:
+
+{{
+  "summary": "<one paragraph: what the app does and how it is structured>",
+  "conventions": "<shared decisions every file must follow: package layout, config/env vars, naming, error handling, how files import each other>",
+  "files": [
+    {{"path": "<relative path>", "purpose": "<one sentence>", "interfaces": "<what this file exposes to the others: classes, functions, endpoints, components - with signatures>"}}
+  ]
+}}
+
+REQUIREMENTS:
+- Include comprehensive tests: {include_tests}
+- Include detailed documentation: {include_docs}
+- Include robust error handling: {include_error_handling}
+- Complexity Level: {complexity}/5
+- At most {max_files} files, including a requirements/dependencies file and a README
+- Every file small enough to write in one go - split big modules
+
+DOCUMENTATION:
+{documentation}
+"""
+
+FILE_PROMPT = """You are writing ONE file of a {app_type} that a team is building in parallel.
+Other files are written by others from the same plan, so follow it exactly.
+
+PROJECT PLAN:
+{plan}
+
+YOUR FILE: {path}
+PURPOSE: {purpose}
+MUST PROVIDE: {interfaces}
+
+DOCUMENTATION:
+{documentation}
+
+Return ONLY the complete contents of {path} - no explanations, no markdown code fences."""
+
+CONTINUE_PROMPT = """
+
+Your previous answer for this file was cut off by the output limit. It ended with:
+<<<
+{tail}
+>>>
+Continue exactly from that point. Do not repeat anything already written and do not add fences."""
+
+FENCED_RE = re.compile(r'^\s*```[^\n]*\n(.*?)\n?```\s*$', re.DOTALL)
+
+
+class PlannedFile:
+    def __init__(self, path, purpose='', interfaces=''):
+        self.path = path
+        self.purpose = purpose
+        self.interfaces = interfaces
+
+
+class Plan:
+    """Parsed manifest from the planning call."""
+
+    def __init__(self, files, summary='', conventions=''):
+        self.files = files
+        self.summary = summary
+        self.conventions = conventions
+
+    def render(self):
+        """The plan as every file prompt sees it."""
+        lines = [self.summary, '', f"CONVENTIONS: {self.conventions}", '', 'FILES:']
+        for f in self.files:
+            lines.append(f"- {f.path}: {f.purpose}")
+            if f.interfaces:
+                lines.append(f"  provides: {f.interfaces}")
+        return '\n'.join(lines).strip()
+
+
+def _text(value):
+    if isinstance(value, (list, tuple)):
+        return '; '.join(_text(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value or '').strip()
+
+
+def parse_plan(text, max_files=MAX_FILES):
+    """Plan from the model's JSON (tolerates a fenced or chatty answer)."""
+    match = FENCED_RE.match(text)
+    if match:
+        text = match.group(1)
+    start, end = text.find('{'), text.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError("The plan is not JSON")
+    data = json.loads(text[start:end + 1])
+    files = []
+    seen = set()
+    for item in data.get('files') or []:
+        if not isinstance(item, dict):
+            continue
+        path = clean_path(_text(item.get('path')))
+        if not path or path in seen:
+            continue
+        seen.add(path)
+        files.append(PlannedFile(path, _text(item.get('purpose')), _text(item.get('interfaces'))))
+    if not files:
+        raise ValueError("The plan lists no files")
+    return Plan(files[:max_files], _text(data.get('summary')), _text(data.get('conventions')))
+
+
+def make_plan(model, documentation, app_type, include_tests=True, include_docs=True,
+              include_error_handling=True, complexity=3, session_id=None, feature=None, on_retry=None):
+    """Planning call -> Plan."""
+    prompt = PLAN_PROMPT.format(
+        app_type=app_type, include_tests=include_tests, include_docs=include_docs,
+        include_error_handling=include_error_handling, complexity=complexity,
+        max_files=MAX_FILES, documentation=documentation
+    )
+    record = start_call(feature, prompt) if feature else None
+    response = generate(model, prompt, generation_config=PLAN_CONFIG, session_id=session_id,
+                        on_retry=on_retry, record=record)
+    if record is not None:
+        record.finish(response)
+    return parse_plan(response.text)
+
+
+def hit_output_cap(response):
+    """True when generation stopped because of max_output_tokens."""
+    try:
+        reason = response.candidates[0].finish_reason
+    except (AttributeError, IndexError, TypeError):
+        return False
+    return getattr(reason, 'name', reason) in ('MAX_TOKENS', 2)
+
+
+def opens_fence(text):
+    """True when the first line of text is a code fence."""
+    return text.split('\n', 1)[0].lstrip().startswith('```')
+
+
+def strip_fence(text, wrapped=False):
+    """Drop a wrapping code fence - also the opening one alone when the answer was cut off.
+
+    A trailing fence is only dropped when it closes that wrapper: when text
+    opened one, or when wrapped says an earlier piece of the same file did.
+    Otherwise it closes a block inside the file (a README's shell example).
+    """
+    lines = text.split('\n')
+    if opens_fence(text):
+        lines = lines[1:]
+        wrapped = True
+    while lines and not lines[-1].strip():
+        lines.pop()
+    if wrapped and lines and lines[-1].strip() == '```':
+        lines.pop()
+    return '\n'.join(lines)
+
+
+def join_continuation(previous, piece):
+    """Append piece, dropping any overlap the model repeated from the tail."""
+    for size in range(min(len(previous), len(piece), 300), 20, -1):
+        if previous.endswith(piece[:size]):
+            return previous + piece[size:]
+    return previous + piece
+
+
+def generate_files(model, plan, documentation, app_type, generation_config,
+                   max_workers=DEFAULT_MAX_WORKERS, session_id=None, feature=None):
+    """Write every planned file concurrently.
+
+    Yields (index, content, seconds, continuations, error) in completion
+    order so the caller can drive progress from the main thread, like
+    doc_chunker.extract_contracts. All calls queue under session_id.
+    """
+    rendered = plan.render()
+    total = len(plan.files)
+
+    def write(index):
+        planned = plan.files[index]
+        prompt = FILE_PROMPT.format(
+            app_type=app_type, plan=rendered, path=planned.path, purpose=planned.purpose,
+            interfaces=planned.interfaces or "see plan", documentation=documentation
+        )
+        content = ''
+        continuations = 0
+        wrapped = False
+        request = prompt
+        while True:
+            record = start_call(feature, request) if feature else None
+            response = generate(model, request, generation_config=generation_config,
+                                session_id=session_id, record=record)
+            if record is not None:
+                record.finish(response)
+            piece = strip_fence(response.text, wrapped)
+            wrapped = wrapped or opens_fence(response.text)
+            content = join_continuation(content, piece) if content else piece
+            if not hit_output_cap(response) or continuations >= MAX_CONTINUATIONS:
+                break
+            continuations += 1
+            request = prompt + CONTINUE_PROMPT.format(tail=content[-CONTINUATION_TAIL_CHARS:])
+        return content, continuations
+
+    for index, written, seconds, error in fan_out(write, total, max_workers):
+        content, continuations = written if error is None else (None, 0)
+        yield index, content, seconds, continuations, error
+
+
+def assemble(plan, contents):
+    """Markdown answer in the layout project_files parses (None = failed file, skipped)."""
+    blocks = [plan.summary] if plan.summary else []
+    for planned, content in zip(plan.files, contents):
+        if content is None:
+            continue
+        language = language_for(planned.path)
+        fence = '````' if '```' in content else '```'
+        blocks.append(f"### `{planned.path}`\n{fence}{language if language != 'text' else ''}\n"
+                      f"{content.rstrip()}\n{fence}")
+    return '\n\n'.join(blocks) + '\n'
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks for Doc2App and CodeVision - no API key, no quota.
+
+Every scenario runs the same pipeline the app runs for one click (spec
+compaction, chunking, image decode/preprocess, dedupe, prompt building,
+retries, streaming and redraws) against the fake backend in
+fake_gemini.py, with configurable latency, chunk cadence and error rate.
+Requests are fired from a thread pool to see how things behave under
+concurrency. Each scenario runs in its own process so CPU time and peak
+RSS belong to that scenario alone.
+
+Reported per scenario: p50/p95/p99 latency, throughput, CPU ms per request
+(the apps' own overhead - the fake backend only sleeps), CPU utilisation
+and peak RSS. --json saves the numbers, --compare fails on regressions.
+
+Workloads are synthetic by default. To replay recorded ones pass a JSONL
+file, one request per line (paths relative to the file):
+
+    {"scenario": "doc2app", "doc_path": "specs/billing.yaml", "app_type": "CLI Tool"}
+    {"scenario": "image", "image_path": "shots/home.png", "framework": "React"}
+    {"scenario": "multi", "image_paths": ["shots/home.png", "shots/cart.png"]}
+    {"scenario": "refactor", "code_path": "legacy/view.py", "image_path": "shots/home.png"}
+
+Examples:
+    python benchmark.py
+    python benchmark.py --scenarios image multi -c 8 -n 40 --ttft 0.2 --error-rate 0.05
+    python benchmark.py --json baseline.json
+    python benchmark.py --compare baseline.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows - no RSS / rusage numbers
+    resource = None
+
+
+SCENARIOS = ['doc2app', 'doc2app-chunked', 'doc2app-planned', 'image', 'multi', 'refactor']
+SESSION_ID = 'benchmark'
+
+
+# === Synthetic workloads ===
+
+def synthetic_openapi(paths=40):
+    """A bloated-but-typical OpenAPI spec: expanded schemas, examples, x-* noise."""
+    item = {
+        'type': 'object', 'required': ['id', 'name'],
+        'description': 'A catalogue item. Items are versioned and soft-deleted.',
+        'properties': {
+            'id': {'type': 'string', 'format': 'uuid', 'example': '5f1c...'},
+            'name': {'type': 'string', 'maxLength': 200, 'example': 'Blue mug'},
+            'price': {'type': 'number', 'minimum': 0, 'x-currency': 'EUR'},
+            'tags': {'type': 'array', 'items': {'type': 'string'}},
+            'status': {'type': 'string', 'enum': ['draft', 'active', 'retired']},
+        },
+    }
+    error = {'type': 'object', 'properties': {'code': {'type': 'integer'}, 'message': {'type': 'string'}}}
+
+    def body(schema):
+        return {'content': {'application/json': {'schema': schema, 'examples': {'one': {'value': {'id': '1'}}}}}}
+
+    spec = {
+        'openapi': '3.0.3',
+        'info': {'title': 'Catalogue', 'version': '2.1.0', 'description': 'Internal catalogue API. ' * 20},
+        'servers': [{'url': 'https://api.example.com/v2'}],
+        'components': {'schemas': {'Item': item, 'Error': error}},
+        'paths': {},
+    }
+    for n in range(paths):
+        spec['paths'][f'/collections/{n}/items/{{itemId}}'] = {
+            'get': {
+                'tags': [f'collection{n % 5}'], 'summary': f'Get item from collection {n}',
+                'description': 'Returns the item. ' * 10, 'x-rate-limit': 100,
+                'parameters': [{'name': 'itemId', 'in': 'path', 'required': True, 'schema': {'type': 'string'}}],
+                'responses': {'200': dict(description='OK', **body(item)), '404': dict(description='No', **body(error))},
+            },
+            'put': {
+                'tags': [f'collection{n % 5}'], 'summary': 'Replace item',
+                'requestBody': dict(required=True, **body(item)),
+                'responses': {'200': dict(description='OK', **body(item))},
+            },
+        }
+    return json.dumps(spec, indent=2)
+
+
+def synthetic_markdown(chars=500000):
+    sections = []
+    n = 0
+    while sum(len(s) for s in sections) < chars:
+        n += 1
+        sections.append(
+            f"## Endpoint group {n}\n\n"
+            f"### GET /v1/resource{n}\nReturns resource {n}. Supports `limit` and `cursor`.\n\n"
+            "```json\n{\"id\": \"abc\", \"value\": 42, \"nested\": {\"a\": [1, 2, 3]}}\n```\n\n"
+            + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20 + "\n\n"
+        )
+    return ''.join(sections)
+
+
+def synthetic_screenshot(seed=0, size=(2560, 1600)):
+    """PNG bytes that look enough like a UI: header, cards, text lines."""
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', size, (246, 247, 251))
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    draw.rectangle([0, 0, width, 120], fill=(40 + seed * 30 % 200, 70, 160))
+    for card in range(6):
+        x = 80 + (card % 3) * (width // 3)
+        y = 220 + (card // 3) * (height // 3)
+        draw.rectangle([x, y, x + width // 3 - 140, y + height // 3 - 100],
+                       fill=(255, 255, 255), outline=(220, 220, 230))
+        for line in range(8):
+            draw.text((x + 30, y + 30 + line * 28), f"Card {card} line {line} seed {seed}", fill=(60, 60, 70))
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+SYNTHETIC_CODE = '\n'.join(
+    f"def view_{n}(request):\n    data = load(request.args['id'])\n    return render('page.html', data=data)\n"
+    for n in range(150)
+)
+
+
+def default_workload(scenario):
+    if scenario in ('doc2app', 'doc2app-planned'):
+        return [{'documentation': synthetic_openapi()}]
+    if scenario == 'doc2app-chunked':
+        return [{'documentation': synthetic_markdown()}]
+    if scenario == 'image':
+        return [{'image': synthetic_screenshot(seed)} for seed in range(3)]
+    if scenario == 'multi':
+        shots = [synthetic_screenshot(seed) for seed in range(4)]
+        return [{'images': shots + [shots[0], shots[1]]}]   # two duplicates to skip
+    if scenario == 'refactor':
+        return [{'code': SYNTHETIC_CODE, 'image': synthetic_screenshot(7)}]
+    raise ValueError(scenario)
+
+
+def load_workload(path):
+    """{scenario: [request, ...]} from a recorded JSONL workload."""
+    base = os.path.dirname(os.path.abspath(path))
+
+    def read(rel, binary=False):
+        with open(os.path.join(base, rel), 'rb' if binary else 'r') as f:
+            return f.read()
+
+    requests = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            raw = json.loads(line)
+            scenario = raw.pop('scenario')
+            if 'doc_path' in raw:
+                raw['documentation'] = read(raw.pop('doc_path'))
+            if 'code_path' in raw:
+                raw['code'] = read(raw.pop('code_path'))
+            if 'image_path' in raw:
+                raw['image'] = read(raw.pop('image_path'), binary=True)
+            if 'image_paths' in raw:
+                raw['images'] = [read(p, binary=True) for p in raw.pop('image_paths')]
+            requests.setdefault(scenario, []).append(raw)
+    return requests
+
+
+# === Scenario pipelines (mirror the apps, minus Streamlit) ===
+
+class NullPlaceholder:
+    """Stands in for st.empty() - counts redraws instead of rendering."""
+
+    def __init__(self):
+        self.redraws = 0
+
+    def code(self, text, language=None):
+        self.redraws += 1
+
+    def markdown(self, text):
+        self.redraws += 1
+
+
+def run_doc2app(request, chunked=False, planned=False):
+    from app_planner import assemble, generate_files, make_plan
+    from doc2app_prompts import APP_TYPES, GENERATION_CONFIG, MODEL_NAME, SYSTEM_INSTRUCTION, build_prompt
+    from doc_chunker import build_condensed_documentation, extract_contracts, split_documentation
+    from gemini_client import generate, get_model
+    from preflight import compact_text
+    from spec_compactor import compact_spec
+    from streaming import StreamResult, stream_to_placeholder
+
+    started = time.perf_counter()
+    documentation = request['documentation']
+    spec = compact_spec(documentation)
+    if spec is not None:
+        documentation = spec.text
+    documentation = compact_text(documentation)
+    options = {k: request[k] for k in ('app_type', 'complexity') if k in request}
+    if chunked:
+        chunks = split_documentation(documentation)
+        contracts = [None] * len(chunks)
+        for idx, contract, _, _ in extract_contracts(get_model('fake', MODEL_NAME), chunks, session_id=SESSION_ID):
+            contracts[idx] = contract
+        documentation = build_condensed_documentation(chunks, contracts)
+    model = get_model('fake', MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+    if planned:
+        app_type = options.pop('app_type', APP_TYPES[0])
+        plan = make_plan(model, documentation, app_type, session_id=SESSION_ID, **options)
+        contents = [None] * len(plan.files)
+        first = None
+        for idx, content, _, _, _ in generate_files(model, plan, documentation, app_type, GENERATION_CONFIG,
+                                                    session_id=SESSION_ID):
+            contents[idx] = content
+            first = first or time.perf_counter() - started
+        return StreamResult(assemble(plan, contents), first, time.perf_counter() - started, len(plan.files))
+    response = generate(model, build_prompt(documentation, **options), generation_config=GENERATION_CONFIG,
+                        stream=True, session_id=SESSION_ID)
+    return stream_to_placeholder(response, NullPlaceholder(), started, language='python')
+
+
+def run_image(request):
+    from codevision_prompts import MODEL_NAME, PROMPT_TYPES, build_image_prompt, code_language
+    from gemini_client import generate, get_model
+    from image_cache import decode
+    from image_prep import preprocess_image
+    from streaming import stream_to_placeholder
+
+    started = time.perf_counter()
+    framework = request.get('framework', 'HTML/CSS/JS')
+    decoded = decode(request['image'])
+    prepared = preprocess_image(request['image'], decoded=decoded.image)
+    prompt = build_image_prompt(request.get('prompt_type', PROMPT_TYPES[0]), framework)
+    response = generate(get_model('fake', MODEL_NAME), [prompt, prepared.as_part()], stream=True,
+                        session_id=SESSION_ID)
+    return stream_to_placeholder(response, NullPlaceholder(), started, language=code_language(framework))
+
+
+def run_multi(request):
+    from codevision_prompts import MODEL_NAME
+    from gemini_client import generate, get_model
+    from image_cache import decode
+    from image_dedup import group_duplicates
+    from image_prep import preprocess_image
+    from multi_image import analyze_screens, build_reduce_prompt
+    from streaming import stream_to_placeholder
+
+    started = time.perf_counter()
+    entries = [decode(data) for data in request['images']]
+    groups = group_duplicates([entry.fingerprint for entry in entries])
+    keep = [group.representative for group in groups]
+    prepared = [preprocess_image(request['images'][i], decoded=entries[i].image) for i in keep]
+    model = get_model('fake', MODEL_NAME)
+    summaries = [None] * len(prepared)
+    for idx, summary, _, _ in analyze_screens(model, [p.as_part() for p in prepared], session_id=SESSION_ID):
+        summaries[idx] = summary
+    prompt = build_reduce_prompt(summaries, request.get('generation_type', 'Complete multi-page application'))
+    response = generate(model, [prompt], stream=True, session_id=SESSION_ID)
+    return stream_to_placeholder(response, NullPlaceholder(), started, language='python')
+
+
+def run_refactor(request):
+    from codevision_prompts import MODEL_NAME
+    from gemini_client import generate, get_model
+    from image_prep import preprocess_image
+    from streaming import stream_to_placeholder
+
+    started = time.perf_counter()
+    contents = [f"Refactor this code with the following goals: Improve code quality\n\n"
+                f"CURRENT CODE:\n{request['code']}"]
+    if request.get('image'):
+        contents.append(preprocess_image(request['image']).as_part())
+    response = generate(get_model('fake', MODEL_NAME), contents, stream=True, session_id=SESSION_ID)
+    return stream_to_placeholder(response, NullPlaceholder(), started, markdown=True)
+
+
+RUNNERS = {
+    'doc2app': run_doc2app,
+    'doc2app-chunked': lambda request: run_doc2app(request, chunked=True),
+    'doc2app-planned': lambda request: run_doc2app(request, planned=True),
+    'image': run_image,
+    'multi': run_multi,
+    'refactor': run_refactor,
+}
+
+
+# === Measurement ===
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario(scenario, requests, count, concurrency, fake, limiter):
+    """Child-process entry point. Returns the stats dict for one scenario."""
+    if not limiter:
+        os.environ['GEMINI_RPM'] = '0'
+    import gemini_client
+    from fake_gemini import FakeSettings
+    gemini_client.set_model_factory(FakeSettings(**fake).factory())
+
+    runner = RUNNERS[scenario]
+    runner(requests[0])                      # warm-up: imports, model cache
+
+    latencies, ttfts, errors = [], [], []
+
+    def one(index):
+        started = time.perf_counter()
+        try:
+            result = runner(requests[index % len(requests)])
+            latencies.append(time.perf_counter() - started)
+            ttfts.append(result.ttft)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        list(pool.map(one, range(count)))
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    stats = {
+        'scenario': scenario,
+        'requests': count,
+        'errors': len(errors),
+        'wall_s': wall,
+        'throughput_rps': len(latencies) / wall if wall else 0.0,
+        'cpu_ms_per_request': cpu * 1000 / count,
+        'cpu_pct': cpu / wall * 100 if wall else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'sample_errors': errors[:3],
+    }
+    if latencies:
+        for pct in (50, 95, 99):
+            stats[f'p{pct}_s'] = percentile(latencies, pct)
+        stats['ttft_p50_s'] = percentile(ttfts, 50)
+    return stats
+
+
+def _child(queue, *args):
+    try:
+        queue.put(run_scenario(*args))
+    except Exception as e:
+        queue.put({'scenario': args[0], 'failed': f"{type(e).__name__}: {e}"})
+
+
+def run_isolated(*args):
+    # Fresh process per scenario - peak RSS is per process and can't be reset
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(queue,) + args)
+    process.start()
+    stats = queue.get()
+    process.join()
+    return stats
+
+
+# === Reporting ===
+
+def _fmt(value, spec):
+    return '-' if value is None else format(value, spec)
+
+
+def print_table(results):
+    header = f"{'scenario':<16} {'n':>4} {'err':>4} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} " \
+             f"{'ttft s':>7} {'req/s':>7} {'cpu ms/req':>10} {'cpu %':>6} {'rss MB':>7}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        if 'failed' in r:
+            print(f"{r['scenario']:<16} FAILED: {r['failed']}")
+            continue
+        print(f"{r['scenario']:<16} {r['requests']:>4} {r['errors']:>4} "
+              f"{_fmt(r.get('p50_s'), '7.2f')} {_fmt(r.get('p95_s'), '7.2f')} {_fmt(r.get('p99_s'), '7.2f')} "
+              f"{_fmt(r.get('ttft_p50_s'), '7.2f')} {r['throughput_rps']:>7.2f} {r['cpu_ms_per_request']:>10.1f} "
+              f"{r['cpu_pct']:>6.1f} {_fmt(r['peak_rss_mb'], '7.0f')}")
+        for error in r['sample_errors']:
+            print(f"{'':<16} ! {error}")
+
+
+COMPARED = ('p95_s', 'cpu_ms_per_request', 'peak_rss_mb')
+
+
+def compare(results, baseline_path, max_regression):
+    """Print deltas against a saved run. Returns True when nothing regressed."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['scenario']: r for r in json.load(f)['results']}
+    ok = True
+    print(f"\nCompared with {baseline_path} (fail above +{max_regression:.0f}%):")
+    for r in results:
+        before = baseline.get(r['scenario'])
+        if before is None or 'failed' in r or 'failed' in before:
+            continue
+        for metric in COMPARED:
+            old, new = before.get(metric), r.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            flag = ''
+            if change > max_regression:
+                flag = '  <-- REGRESSION'
+                ok = False
+            print(f"  {r['scenario']:<16} {metric:<20} {old:>9.2f} → {new:>9.2f} ({change:+.0f}%){flag}")
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Doc2App / CodeVision benchmarks")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('-n', '--requests', type=int, default=20, help="Requests per scenario (default: %(default)s)")
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help="Requests in flight (default: %(default)s)")
+    parser.add_argument('--workload', help="Recorded workload JSONL (default: synthetic inputs)")
+    parser.add_argument('--ttft', type=float, default=0.3, help="Fake time to first token, s")
+    parser.add_argument('--tokens-per-second', type=float, default=2000.0)
+    parser.add_argument('--chunk-seconds', type=float, default=0.05, help="Fake stream cadence, s")
+    parser.add_argument('--output-tokens', type=int, default=1500)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of attempts that fail (0-1)")
+    parser.add_argument('--with-limiter', action='store_true', help="Keep the shared RPM/TPM limiter on")
+    parser.add_argument('--json', help="Write results to this file")
+    parser.add_argument('--compare', help="Baseline JSON from an earlier --json run")
+    parser.add_argument('--max-regression', type=float, default=20.0, help="Allowed %% increase (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fake = {
+        'ttft': args.ttft,
+        'tokens_per_second': args.tokens_per_second,
+        'chunk_seconds': args.chunk_seconds,
+        'output_tokens': args.output_tokens,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+    }
+    recorded = load_workload(args.workload) if args.workload else {}
+
+    results = []
+    for scenario in args.scenarios:
+        requests = recorded.get(scenario) if args.workload else default_workload(scenario)
+        if not requests:
+            print(f"(no recorded requests for {scenario}, skipped)")
+            continue
+        print(f"Running {scenario}: {args.requests} requests, {args.concurrency} at a time...", flush=True)
+        results.append(run_isolated(scenario, requests, args.requests, args.concurrency, fake, args.with_limiter))
+
+    print()
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': dict(fake, requests=args.requests, concurrency=args.concurrency),
+                       'results': results}, f, indent=2)
+        print(f"\nSaved to {args.json}")
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
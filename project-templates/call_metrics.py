@@ -0,0 +1,307 @@
+"""
+Per-call instrumentation for every Gemini request the apps make.
+
+Each call site opens a CallRecord (start_call) and hands it to generate()
+and to the code that consumes the response. Once finished it lands in the
+process-wide CallMetrics with:
+
+- feature (tab / pipeline step), streamed or not, final status
+- time to first token, total latency, time spent queued for quota
+- prompt / output tokens from usage_metadata, image bytes sent, retries
+- cache hits, recorded as calls that never reached the API
+- shared calls, that followed an identical request in flight (single_flight.py)
+
+From there it's exported three ways:
+
+- per-feature latency / TTFT histograms and counters in the Prometheus
+  text format (prometheus_text), optionally served on GEMINI_METRICS_PORT
+- one JSON line per call in GEMINI_METRICS_LOG (default
+  .cache/metrics/calls.jsonl, empty to disable)
+- summary_rows() for the in-app stats panel
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from response_cache import DEFAULT_CACHE_DIR
+
+
+METRICS_LOG = os.getenv('GEMINI_METRICS_LOG', os.path.join(DEFAULT_CACHE_DIR, 'metrics', 'calls.jsonl'))
+METRICS_PORT = int(os.getenv('GEMINI_METRICS_PORT', '0'))   # 0 = no /metrics endpoint
+RECENT_CALLS = 1000                                          # kept in memory for percentiles
+
+# Seconds - generation calls run from sub-second cache hits to multi-minute docs
+LATENCY_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+OK = 'ok'
+CACHE = 'cache'
+SHARED = 'shared'
+
+
+def _image_bytes(contents):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    return sum(len(part['data']) for part in parts if isinstance(part, dict) and 'data' in part)
+
+
+class CallRecord:
+    """One Gemini call (or cache hit) from start to finish."""
+
+    def __init__(self, feature, contents=None, metrics=None):
+        self.feature = feature
+        self.image_bytes = _image_bytes(contents) if contents is not None else 0
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.streamed = False
+        self.retries = 0
+        self.queue_seconds = 0.0
+        self.ttft = None
+        self.latency = None
+        self.prompt_tokens = None
+        self.output_tokens = None
+        self.cached_tokens = None
+        self.status = None
+        self.shared = False         # set by single_flight when another call did the work
+        self._metrics = metrics
+
+    @property
+    def finished(self):
+        return self.status is not None
+
+    def finish(self, response=None, ttft=None, status=OK):
+        """Close the record and hand it to the metrics store (only once)."""
+        if self.finished:
+            return
+        self.latency = time.perf_counter() - self.started
+        if status == OK and self.shared:
+            status = SHARED
+        if ttft is not None:
+            self.ttft = ttft
+        elif status in (OK, CACHE, SHARED):
+            self.ttft = self.latency    # non-streamed: the first token arrives with the rest
+        usage = getattr(response, 'usage_metadata', None) if response is not None else None
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, 'prompt_token_count', None)
+            self.output_tokens = getattr(usage, 'candidates_token_count', None)
+            self.cached_tokens = getattr(usage, 'cached_content_token_count', None)
+        self.status = status
+        (self._metrics or get_metrics()).add(self)
+
+    def fail(self, kind):
+        self.finish(status=kind)
+
+    def as_dict(self):
+        return {
+            'time': round(self.started_at, 3),
+            'feature': self.feature,
+            'status': self.status,
+            'streamed': self.streamed,
+            'ttft_s': _round(self.ttft),
+            'latency_s': _round(self.latency),
+            'queue_s': _round(self.queue_seconds),
+            'prompt_tokens': self.prompt_tokens,
+            'output_tokens': self.output_tokens,
+            'cached_tokens': self.cached_tokens,
+            'image_bytes': self.image_bytes,
+            'retries': self.retries,
+        }
+
+
+def _round(value):
+    return round(value, 4) if value is not None else None
+
+
+def start_call(feature, contents=None):
+    """New CallRecord for feature; contents is what's sent (for image bytes)."""
+    return CallRecord(feature, contents)
+
+
+def record_cache_hit(feature, started=None):
+    """A request answered from the response cache - no API call made."""
+    record = CallRecord(feature)
+    if started is not None:
+        record.started = started
+    record.finish(status=CACHE)
+    return record
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class _FeatureStats:
+    def __init__(self):
+        self.statuses = {}
+        self.latency = _Histogram()
+        self.ttft = _Histogram()
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.image_bytes = 0
+
+
+class CallMetrics:
+    """Thread-safe aggregate of finished CallRecords, plus the JSONL log."""
+
+    def __init__(self, log_path=METRICS_LOG, recent=RECENT_CALLS):
+        self.log_path = log_path
+        self._features = {}
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+
+    def add(self, record):
+        with self._lock:
+            stats = self._features.setdefault(record.feature, _FeatureStats())
+            stats.statuses[record.status] = stats.statuses.get(record.status, 0) + 1
+            stats.retries += record.retries
+            stats.image_bytes += record.image_bytes
+            stats.prompt_tokens += record.prompt_tokens or 0
+            stats.output_tokens += record.output_tokens or 0
+            stats.cached_tokens += record.cached_tokens or 0
+            # Cache hits and failures would skew the API latency histograms
+            if record.status == OK:
+                stats.latency.observe(record.latency)
+                stats.ttft.observe(record.ttft)
+            self._recent.append(record)
+        if self.log_path:
+            line = json.dumps(record.as_dict()) + '\n'
+            try:
+                with self._log_lock, open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError:
+                pass
+
+    def recent(self, feature=None):
+        with self._lock:
+            return [r for r in self._recent if feature is None or r.feature == feature]
+
+    def summary_rows(self):
+        """One row per feature for the stats panel (percentiles over recent calls)."""
+        with self._lock:
+            features = sorted(self._features.items())
+            recent = list(self._recent)
+        rows = []
+        for feature, stats in features:
+            api = [r for r in recent if r.feature == feature and r.status == OK]
+            latencies = [r.latency for r in api]
+            total = sum(stats.statuses.values())
+            errors = total - sum(stats.statuses.get(s, 0) for s in (OK, CACHE, SHARED))
+            rows.append({
+                'feature': feature,
+                'calls': total,
+                'cache hits': stats.statuses.get(CACHE, 0),
+                'shared': stats.statuses.get(SHARED, 0),
+                'errors': errors,
+                'retries': stats.retries,
+                'p50 s': _round(percentile(latencies, 0.5)),
+                'p95 s': _round(percentile(latencies, 0.95)),
+                'p50 TTFT s': _round(percentile([r.ttft for r in api], 0.5)),
+                'avg queue s': _round(sum(r.queue_seconds for r in api) / len(api)) if api else None,
+                'prompt tokens': stats.prompt_tokens,
+                'output tokens': stats.output_tokens,
+                'cached tokens': stats.cached_tokens,
+                'image KB': round(stats.image_bytes / 1024),
+            })
+        return rows
+
+    def jsonl(self):
+        """Recent calls as JSON lines (what's still in memory)."""
+        return ''.join(json.dumps(r.as_dict()) + '\n' for r in self.recent())
+
+    def prometheus_text(self):
+        with self._lock:
+            features = sorted(self._features.items())
+            lines = []
+            lines += ['# HELP gemini_calls_total Gemini calls by feature and final status (cache = served from cache, shared = followed an identical call).',
+                      '# TYPE gemini_calls_total counter']
+            for feature, stats in features:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'gemini_calls_total{{feature="{feature}",status="{status}"}} {count}')
+            for name, attr, help_text in (
+                ('gemini_retries_total', 'retries', 'Retried attempts.'),
+                ('gemini_prompt_tokens_total', 'prompt_tokens', 'Prompt tokens reported by usage_metadata.'),
+                ('gemini_output_tokens_total', 'output_tokens', 'Output tokens reported by usage_metadata.'),
+                ('gemini_cached_tokens_total', 'cached_tokens', 'Prompt tokens served from context caches.'),
+                ('gemini_image_bytes_total', 'image_bytes', 'Image bytes sent inline.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for feature, stats in features:
+                    lines.append(f'{name}{{feature="{feature}"}} {getattr(stats, attr)}')
+            for name, attr, help_text in (
+                ('gemini_call_latency_seconds', 'latency', 'Successful call latency, queueing and retries included.'),
+                ('gemini_call_ttft_seconds', 'ttft', 'Time to first token of successful calls.'),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for feature, stats in features:
+                    histogram = getattr(stats, attr)
+                    for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                        lines.append(f'{name}_bucket{{feature="{feature}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{feature="{feature}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{feature="{feature}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{feature="{feature}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = get_metrics().prometheus_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port):
+    """Serve /metrics on a daemon thread; returns the server."""
+    server = ThreadingHTTPServer(('', port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='gemini-metrics', daemon=True).start()
+    return server
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """The shared CallMetrics for this process (starts the endpoint once, if configured)."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = CallMetrics()
+            if METRICS_PORT:
+                try:
+                    serve_metrics(METRICS_PORT)
+                except OSError:
+                    pass   # port taken, e.g. by the other app - the JSONL log still works
+        return _metrics
@@ -0,0 +1,336 @@
+"""
+Chunked, diff-based refactoring for big files in CodeVision's Refactor tab.
+
+The plain Refactor call sends the whole file and asks for the full rewrite
+plus an explanation and a before/after comparison - roughly three times
+the input as output, and 2,000+ line files get cut off. For big inputs we:
+
+1. split the code on syntactic units - top-level functions/classes via
+   ast for Python (oversized classes by method), a brace/indentation
+   heuristic for everything else - grouped into ~DEFAULT_CHUNK_LINES pieces
+2. refactor every chunk in parallel, asking for a unified diff against that
+   chunk and a few short notes instead of a rewrite
+3. apply the hunks locally by their context (the model's line numbers are
+   ignored), and validate: the whole file must still parse for Python,
+   brace balance must be unchanged otherwise. A chunk whose patch doesn't
+   apply or breaks validation keeps its original code.
+
+Chunks always cover the file line for line, so reassembly is a join.
+"""
+
+import ast
+import difflib
+import re
+
+from call_metrics import start_call
+from fan_out import fan_out
+from gemini_client import generate
+
+
+DEFAULT_CHUNK_LINES = 150
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CHUNK_THRESHOLD = 300        # files longer than this (lines) default to chunked mode
+
+DIFF_CONFIG = {
+    'temperature': 0.2,
+    'max_output_tokens': 8192,
+}
+
+CHUNK_PROMPT = """You are refactoring ONE part ({number} of {total}) of a larger {language} file.
+Other parts are refactored separately, so keep every name that other parts may use
+(functions, classes, methods, globals) and keep this part's indentation.
+
+GOALS: {goals}
+
+FILE OUTLINE (all parts):
+{outline}
+
+THIS PART (lines {start}-{end}):
+```
+{code}
+```
+
+Answer in exactly this format:
+NOTES:
+- <one line per change>
+
+```diff
+<unified diff against THIS PART only: @@ hunk headers, ' ' context, '-' removed and '+' added lines,
+at least 3 unchanged context lines around every change>
+```
+
+Only include hunks for lines you change - never rewrite the whole part.
+If nothing needs to change, answer "NO CHANGES"."""
+
+# Fences only count at the start of a line - diffs of markdown contain '+```python' etc.
+DIFF_BLOCK_RE = re.compile(r'^```(?:diff|patch)?[^\n]*\n(.*?)^```[ \t]*$', re.DOTALL | re.MULTILINE)
+COMMENT_PREFIXES = ('#', '//', '/*', '* ', '--')
+NOTES_RE = re.compile(r'NOTES:\s*\n(.*?)(?:```|\Z)', re.DOTALL)
+BOUNDARY_RE = re.compile(r'^(?:export\s+|public\s+|private\s+|protected\s+|static\s+|async\s+|@)*'
+                         r'(?:function|class|def|fn|func|interface|struct|enum|impl|type|const|let|var|'
+                         r'module|namespace|[A-Za-z_$][\w$<>\[\], ]*\s+[A-Za-z_$][\w$]*\s*\()')
+
+
+class CodeChunk:
+    """Lines start..end (1-based, inclusive) of the source."""
+
+    def __init__(self, start, end, text, names=()):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.names = list(names)
+
+    def __len__(self):
+        return self.end - self.start + 1
+
+    @property
+    def title(self):
+        return ', '.join(self.names[:4]) + (' ...' if len(self.names) > 4 else '') if self.names else f"lines {self.start}-{self.end}"
+
+
+# === Splitting ===
+
+def is_python(code):
+    try:
+        ast.parse(code)
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def _node_start(node):
+    decorators = getattr(node, 'decorator_list', None) or []
+    return min([node.lineno] + [d.lineno for d in decorators])
+
+
+def _python_units(nodes, first_line, last_line, max_lines):
+    """(start line, name) for every unit boundary; big classes are split by member."""
+    units = []
+    for node in nodes:
+        start = _node_start(node)
+        name = getattr(node, 'name', None)
+        units.append((start, name))
+        end = getattr(node, 'end_lineno', start)
+        if isinstance(node, ast.ClassDef) and end - start + 1 > max_lines and len(node.body) > 1:
+            # Header + leading members stay with the class line, later members start new units
+            for member in node.body[1:]:
+                units.append((_node_start(member), f"{name}.{getattr(member, 'name', '')}".rstrip('.')))
+    if not units or units[0][0] != first_line:
+        units.insert(0, (first_line, None))
+    return [(line, name) for line, name in units if first_line <= line <= last_line]
+
+
+def _brace_units(lines):
+    """Boundaries where a top-level block starts (depth 0, after a blank line or a closed block)."""
+    units = [(1, None)]
+    depth = 0
+    previous_blank = False
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if depth == 0 and number > 1 and stripped and (previous_blank or BOUNDARY_RE.match(stripped)):
+            match = re.search(r'(?:function|class|def|fn|func|interface|struct|enum)\s+([A-Za-z_$][\w$]*)', stripped)
+            units.append((number, match.group(1) if match else None))
+        depth = max(0, depth + _brace_delta(line))
+        previous_blank = not stripped
+    return units
+
+
+def _brace_delta(line):
+    # Rough - strings and comments aren't parsed, which is fine for picking split points
+    line = re.sub(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$', '', line)
+    return line.count('{') + line.count('(') + line.count('[') - line.count('}') - line.count(')') - line.count(']')
+
+
+def split_code(code, max_lines=DEFAULT_CHUNK_LINES):
+    """Cover code with CodeChunks of about max_lines, cut only at unit boundaries."""
+    lines = code.split('\n')
+    if is_python(code):
+        units = _python_units(ast.parse(code).body, 1, len(lines), max_lines)
+    else:
+        units = _brace_units(lines)
+    names = {}
+    starts = set()
+    for line, name in units:
+        # Comments right above a unit belong to it
+        while line > 1 and lines[line - 2].strip().startswith(COMMENT_PREFIXES) and line - 1 not in starts:
+            line -= 1
+        starts.add(line)
+        if name:
+            names.setdefault(line, []).append(name)
+    starts = sorted(starts)
+
+    chunks = []
+    chunk_start = 1
+    chunk_names = []
+    for index, start in enumerate(starts):
+        end = (starts[index + 1] - 1) if index + 1 < len(starts) else len(lines)
+        if start > chunk_start and end - chunk_start + 1 > max_lines:
+            chunks.append(_chunk(lines, chunk_start, start - 1, chunk_names))
+            chunk_start, chunk_names = start, []
+        chunk_names.extend(names.get(start, []))
+    chunks.append(_chunk(lines, chunk_start, len(lines), chunk_names))
+    return chunks
+
+
+def _chunk(lines, start, end, names):
+    return CodeChunk(start, end, '\n'.join(lines[start - 1:end]), names)
+
+
+def outline(chunks):
+    return '\n'.join(f"- part {i + 1} (lines {c.start}-{c.end}): {c.title}" for i, c in enumerate(chunks))
+
+
+# === Diffs ===
+
+class Hunk:
+    def __init__(self):
+        self.before = []
+        self.after = []
+
+    @property
+    def changes(self):
+        return self.before != self.after
+
+
+def parse_answer(text):
+    """(notes, hunks) from one chunk's answer. "NO CHANGES" -> no hunks."""
+    notes_match = NOTES_RE.search(text)
+    notes = notes_match.group(1).strip() if notes_match else ''
+    blocks = DIFF_BLOCK_RE.findall(text)
+    diff = '\n'.join(blocks) if blocks else ('' if 'NO CHANGES' in text else text)
+    return notes, parse_hunks(diff)
+
+
+def parse_hunks(diff):
+    hunks = []
+    hunk = None
+    for line in diff.split('\n'):
+        if line.startswith('@@'):
+            hunk = Hunk()
+            hunks.append(hunk)
+        elif hunk is None or line.startswith(('--- ', '+++ ')) and not hunk.before and not hunk.after:
+            continue        # file headers / text before the first hunk
+        elif line.startswith('-'):
+            hunk.before.append(line[1:])
+        elif line.startswith('+'):
+            hunk.after.append(line[1:])
+        elif line.startswith('\\'):
+            continue        # "\ No newline at end of file"
+        else:
+            # Context - models often drop the leading space on blank lines
+            context = line[1:] if line.startswith(' ') else line
+            hunk.before.append(context)
+            hunk.after.append(context)
+    for hunk in hunks:
+        while hunk.before and hunk.after and not hunk.before[-1].strip() and not hunk.after[-1].strip():
+            hunk.before.pop()
+            hunk.after.pop()
+    return [h for h in hunks if h.changes]
+
+
+def _find(lines, needle, start):
+    """Index of needle in lines from start - exact first, then ignoring surrounding whitespace."""
+    size = len(needle)
+    for same in (lambda a, b: a == b, lambda a, b: a.strip() == b.strip()):
+        for i in range(start, len(lines) - size + 1):
+            if all(same(lines[i + j], needle[j]) for j in range(size)):
+                return i
+    return -1
+
+
+def apply_hunks(text, hunks):
+    """(patched text, applied, rejected) - hunks are located by content, not line numbers."""
+    lines = text.split('\n')
+    applied = rejected = 0
+    position = 0
+    for hunk in hunks:
+        if not hunk.before:
+            rejected += 1       # pure insertion without context - nowhere to anchor it
+            continue
+        index = _find(lines, hunk.before, position)
+        if index < 0:
+            index = _find(lines, hunk.before, 0)
+        if index < 0:
+            rejected += 1
+            continue
+        lines[index:index + len(hunk.before)] = hunk.after
+        position = index + len(hunk.after)
+        applied += 1
+    return '\n'.join(lines), applied, rejected
+
+
+def _balance(text):
+    return sum(_brace_delta(line) for line in text.split('\n'))
+
+
+# === Refactor ===
+
+class ChunkResult:
+    def __init__(self, chunk, text, notes='', applied=0, rejected=0):
+        self.chunk = chunk
+        self.text = text            # patched chunk (the original if nothing applied)
+        self.notes = notes
+        self.applied = applied
+        self.rejected = rejected
+        self.reverted = False       # patch applied but broke validation
+
+
+def refactor_chunks(model, chunks, goals, language, extra_parts=(), max_workers=DEFAULT_MAX_WORKERS,
+                    session_id=None, feature=None):
+    """Ask for a diff per chunk, concurrently, and apply it to that chunk.
+
+    Yields (index, ChunkResult, seconds, error) in completion order, like
+    doc_chunker.extract_contracts. extra_parts (e.g. a reference image) go
+    with every chunk's prompt.
+    """
+    total = len(chunks)
+    file_outline = outline(chunks)
+
+    def refactor(index):
+        chunk = chunks[index]
+        prompt = CHUNK_PROMPT.format(
+            number=index + 1, total=total, language=language, goals=goals, outline=file_outline,
+            start=chunk.start, end=chunk.end, code=chunk.text
+        )
+        contents = [prompt] + list(extra_parts) if extra_parts else prompt
+        record = start_call(feature, contents) if feature else None
+        response = generate(model, contents, generation_config=DIFF_CONFIG,
+                            session_id=session_id, record=record)
+        if record is not None:
+            record.finish(response)
+        notes, hunks = parse_answer(response.text)
+        text, applied, rejected = apply_hunks(chunk.text, hunks)
+        return ChunkResult(chunk, text, notes, applied, rejected)
+
+    return fan_out(refactor, total, max_workers)
+
+
+def assemble(chunks, results):
+    """Validated file from the chunk results (None = failed chunk, kept as is).
+
+    Python: patches are kept one by one only while the whole file still
+    parses. Other languages: a patch must not change its chunk's brace
+    balance. Reverted results get .reverted = True.
+    """
+    texts = [c.text for c in chunks]
+    python = is_python('\n'.join(texts))
+    for index, result in enumerate(results):
+        if result is None or result.text == chunks[index].text:
+            continue
+        if python:
+            candidate = texts[:index] + [result.text] + texts[index + 1:]
+            ok = is_python('\n'.join(candidate))
+        else:
+            ok = _balance(result.text) == _balance(chunks[index].text)
+        if ok:
+            texts[index] = result.text
+        else:
+            result.reverted = True
+    return '\n'.join(texts)
+
+
+def unified_diff(before, after, name='code'):
+    return ''.join(difflib.unified_diff(
+        before.splitlines(keepends=True), after.splitlines(keepends=True),
+        fromfile=f"a/{name}", tofile=f"b/{name}"
+    ))
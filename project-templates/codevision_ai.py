@@ -14,18 +14,58 @@ The multimodal capabilities are honestly impressive!
 """
 
 import streamlit as st
-import google.generativeai as genai
 from dotenv import load_dotenv
-from PIL import Image
 import os
 import io
+import time
+import uuid
+
+from call_metrics import get_metrics, record_cache_hit, start_call
+from chunked_refactor import (DEFAULT_CHUNK_LINES, DEFAULT_CHUNK_THRESHOLD, assemble, is_python,
+                              refactor_chunks, split_code, unified_diff)
+from codevision_prompts import (FRAMEWORKS, MODEL_NAME, PROMPT_TYPES, build_image_prompt,
+                                code_language, file_extension)
+from file_registry import get_file_registry
+from gemini_client import GeminiError, configure, generate, get_model
+from image_cache import ImageCache
+from image_dedup import DEFAULT_THRESHOLD, MAX_THRESHOLD, group_duplicates
+from image_prep import (DEFAULT_MAX_EDGE, DEFAULT_QUALITY, OUTPUT_FORMATS,
+                        passthrough_image, preprocess_image)
+from incremental import option_delta, patch_previous, previous_result
+from multi_framework import framework_folder, generate_all
+from multi_image import DEFAULT_MAX_WORKERS, analyze_screens, build_reduce_prompt
+from preflight import Estimate, choose_max_edge, image_tokens_after_resize, rough_token_count
+from project_files import FILE_FORMAT_INSTRUCTION, ProjectBuilder, bundle, parse_project
+from rate_limiter import get_limiter
+from response_cache import ResponseCache, make_key
+from result_store import ResultHistory
+from single_flight import generate_shared, get_single_flight
+from streaming import StreamResult, finish_blocking, stream_to_placeholder
 
 
 # Initialize everything
 load_dotenv()
 API_KEY = os.getenv('GEMINI_API_KEY', '')
 if API_KEY:
-    genai.configure(api_key=API_KEY)
+    configure(API_KEY)   # only re-configures when the key changes
+
+
+@st.cache_resource
+def get_response_cache():
+    # One cache per process, shared by every session (memory LRU + SQLite)
+    return ResponseCache()
+
+
+@st.cache_resource
+def get_image_cache():
+    # Decoded uploads + preview thumbnails, shared by every session (LRU, memory-capped)
+    return ImageCache()
+
+
+def cached_image(uploaded):
+    # Reruns hit this for every upload - only the first one pays for decoding
+    return get_image_cache().get(uploaded.getvalue())
+
 
 # Page config - the eye emoji is perfect for a vision-based tool!
 st.set_page_config(
@@ -34,6 +74,16 @@ st.set_page_config(
     layout="wide"  # Wide layout gives us more room for side-by-side comparisons
 )
 
+# Stable id per browser session - the shared rate limiter queues fairly per session
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+SESSION_ID = st.session_state.session_id
+
+# Past generations for this session - they survive reruns (and the download click)
+if 'history' not in st.session_state:
+    st.session_state.history = ResultHistory(SESSION_ID)
+history = st.session_state.history
+
 # === STYLING SECTION ===
 # This gradient took forever to get right but looks amazing
 # The hover effects really make the UI feel premium
@@ -100,8 +150,70 @@ with st.sidebar:
     # Let users override the env variable if needed
     api_key = st.text_input("Gemini API Key", type="password", value=API_KEY)
     if api_key:
-        genai.configure(api_key=api_key)
+        configure(api_key)
         st.success("✅ Connected")
+
+    # Shared quota across every session in this process (see rate_limiter.py)
+    limiter = get_limiter()
+    if limiter is not None:
+        quota = limiter.snapshot()
+        st.caption(
+            f"📶 Shared quota: {quota['requests_available']}/{quota['rpm']} requests, "
+            f"{quota['tokens_available']:,}/{quota['tpm']:,} tokens available • {quota['queued']} queued"
+        )
+    
+    st.divider()
+    
+    # Response cache - same image + same options = no new API call
+    st.markdown("### ⚡ Response Cache")
+    use_cache = st.checkbox("Reuse cached responses", value=True)
+    cache_stats = get_response_cache().stats()
+    st.caption(
+        f"Hits: {cache_stats['hits']} (memory {cache_stats['memory_hits']}, disk {cache_stats['disk_hits']}) • "
+        f"Misses: {cache_stats['misses']} • Hit rate: {cache_stats['hit_rate']:.0%}"
+    )
+    st.caption(f"Stored: {cache_stats['disk_entries']} responses, {cache_stats['disk_bytes'] / 1024:.1f} KB")
+    flight_stats = get_single_flight().stats()
+    if flight_stats['shared']:
+        st.caption(f"🔗 {flight_stats['shared']} identical request(s) shared an in-flight call")
+    if st.button("🗑️ Clear cache"):
+        get_response_cache().clear()
+        st.rerun()
+    
+    # Stream code into the page as it's generated (shows first lines in ~1-2s)
+    stream_output = st.checkbox("Stream output while generating", value=True)
+    
+    # Only "responsive" / "animations" changed since the last result - patch it instead
+    incremental_updates = st.checkbox("Patch the last result when only options change", value=True)
+    
+    st.divider()
+    
+    # Image preprocessing - 4K screenshots are way more than the model needs
+    st.markdown("### 🗜️ Image Preprocessing")
+    preprocess_images = st.checkbox("Shrink images before sending", value=True)
+    with st.expander("Preprocessing settings"):
+        max_edge = st.slider("Max edge (px)", 512, 3072, DEFAULT_MAX_EDGE, step=128)
+        image_quality = st.slider("Quality", 50, 95, DEFAULT_QUALITY)
+        image_format = st.selectbox("Output format", OUTPUT_FORMATS)
+    
+    image_stats = get_image_cache().stats()
+    st.caption(
+        f"🖼️ Decoded images: {image_stats['images']} cached, "
+        f"{image_stats['bytes'] / (1024 * 1024):.0f} / {image_stats['max_bytes'] / (1024 * 1024):.0f} MB"
+    )
+    
+    # Files API - each image is uploaded once, later calls only send a reference
+    upload_images = st.checkbox("Upload images once (Files API)", value=True)
+    if upload_images:
+        upload_stats = get_file_registry().stats()
+        st.caption(
+            f"📤 Uploaded: {upload_stats['files']} images • reused {upload_stats['reuses']}x, "
+            f"{upload_stats['bytes_saved'] / (1024 * 1024):.1f} MB not re-sent"
+        )
+    
+    # Pre-flight budget - images get downscaled further when they don't fit
+    auto_trim_images = st.checkbox("Auto-downscale to fit token budget", value=True)
+    image_budget = st.number_input("Image token budget per request", 1000, 500000, 20000, step=1000)
     
     st.divider()
     
@@ -126,6 +238,281 @@ with st.sidebar:
     - 💎 High-fidelity recreation
     """)
 
+
+def show_retry(area):
+    # on_retry callback for generate() - tells the user we're backing off
+    return lambda n, kind, delay: area.caption(f"🔁 Retry {n} after {kind.replace('_', ' ')} - waiting {delay:.1f}s")
+
+
+def show_queue(area):
+    # on_queue callback for generate() - position in the shared fair queue
+    return lambda position, wait: area.info(f"⏳ Waiting for shared Gemini quota - #{position} in queue, ~{wait:.0f}s")
+
+
+def show_error(e):
+    # Classified API errors get a friendly message, everything else the raw text
+    if isinstance(e, GeminiError):
+        st.error(f"{e.user_message} ({e.kind}, {e.attempts} attempt(s))")
+    else:
+        st.error(f"Error: {str(e)}")
+
+
+def prepare_for_model(uploaded, edge=None):
+    # Everything sent to Gemini goes through here (see image_prep.py)
+    # edge overrides max_edge when the pre-flight budget needs smaller images
+    data = uploaded.getvalue()
+    if preprocess_images or edge is not None:
+        return preprocess_image(data, max_edge=edge or max_edge, quality=image_quality, output_format=image_format,
+                                decoded=cached_image(uploaded).image)
+    return passthrough_image(data)
+
+
+def patch_from_history(feature, base, options, status_area):
+    # Same inputs, different options: ask for a diff against the last result (None = regenerate)
+    previous = previous_result(history.entries(feature), base, options)
+    if previous is None:
+        return None
+    delta = option_delta(previous.inputs['options'], options)
+    status_area.info(f"🩹 Only {', '.join(name for name, _, _ in delta)} changed - patching the last result...")
+    patched = patch_previous(get_model(api_key, MODEL_NAME), previous.text, delta, session_id=SESSION_ID,
+                             feature=f"{feature}.patch", on_retry=show_retry(status_area),
+                             on_queue=show_queue(status_area))
+    if patched is None:
+        st.caption("↩️ Patching didn't work out - regenerating in full")
+    return patched
+
+
+def image_part(prepared, wait=False):
+    # Inline blob on first use (uploaded in the background), a file reference after that
+    # wait=True uploads first - for when several calls are about to send the same image
+    if upload_images and api_key:
+        return get_file_registry().part(api_key, prepared.data, prepared.mime_type, wait=wait)
+    return prepared.as_part()
+
+
+def plan_images(files, text_tokens, output_tokens):
+    """Pre-flight for a set of uploads: (edge override or None, Estimate).
+
+    Only reads image headers, so it's cheap enough to run on every rerun.
+    """
+    sizes = [cached_image(f).size for f in files]
+    edge = max_edge if preprocess_images else max(max(size) for size in sizes)
+    override = None
+    if auto_trim_images:
+        fitted = choose_max_edge(sizes, image_budget, edge)
+        if fitted < edge:
+            override = edge = fitted
+    image_tokens = sum(image_tokens_after_resize(size, edge) for size in sizes)
+    return override, Estimate(image_tokens + text_tokens, output_tokens)
+
+
+def show_preflight(estimate, override):
+    st.caption(estimate.caption())
+    if override:
+        st.caption(f"✂️ Downscaling to {override}px max edge to fit the {image_budget:,}-token image budget")
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def project_for(text, default_name):
+    # Every click in the file browser reruns the script - parse each answer once
+    return parse_project(text, default_name)
+
+
+def show_project(project, key, default_name):
+    # Multi-file answers: pick a file to view, or take the whole tree as a real ZIP
+    st.caption(f"📦 {len(project)} files • {project.total_bytes / 1024:.1f} KB")
+    paths = [f.path for f in project.files]
+    picked = st.selectbox("File", paths, key=f"file-{key}")
+    st.code(project.read(picked), language=project.files[paths.index(picked)].language)
+    st.download_button(
+        "📦 Download ZIP", project.zip_data,
+        file_name=default_name.rsplit('.', 1)[0] + ".zip",
+        mime="application/zip", key=f"zip-{key}"
+    )
+
+
+def show_saved_result(entry, download_label="📥 Download Code"):
+    # Re-render a generation from the session history (no API call)
+    text = entry.text
+    if text is None:
+        st.warning("⚠️ This result is no longer available")
+        return
+    timing = entry.timing_caption()
+    st.caption(f"🕘 {entry.label()}" + (f" • {timing}" if timing else ""))
+    project = project_for(text, entry.file_name) if entry.file_name else None
+    if entry.language == "markdown":
+        st.markdown(text)
+    elif project is not None and len(project) > 1:
+        show_project(project, entry.id, entry.file_name)
+        with st.expander("📄 Full response"):
+            st.code(text, language=entry.language)
+    else:
+        st.code(text, language=entry.language)
+    if entry.file_name:
+        st.download_button(download_label, text, file_name=entry.file_name, mime="text/plain",
+                           key=f"download-{entry.id}")
+
+
+def show_history(feature, clicked, download_label="📥 Download Code"):
+    # Latest result stays on screen across reruns; older ones on demand (loaded lazily)
+    entries = history.entries(feature)
+    if entries and not clicked:
+        show_saved_result(entries[0], download_label)
+    if len(entries) > 1:
+        with st.expander(f"🕘 Earlier results this session ({len(entries) - 1})"):
+            picked = st.selectbox("Result", entries[1:], format_func=lambda e: e.label(),
+                                  key=f"history-{feature}")
+            show_saved_result(picked, download_label)
+
+
+def generate_frameworks(prepared, frameworks, prompt_type, **prompt_options):
+    # One image, several targets at once - each framework streams into its own tab
+    prompts = [build_image_prompt(prompt_type, fw, **prompt_options) for fw in frameworks]
+    languages = [code_language(fw) for fw in frameworks]
+    cache = get_response_cache()
+    cache_keys = [make_key(MODEL_NAME, p, prepared.data) for p in prompts]
+    started = time.perf_counter()
+    texts = [cache.get(key) if use_cache else None for key in cache_keys]
+    results = [None] * len(frameworks)
+    
+    framework_tabs = st.tabs(frameworks)
+    status_areas = []
+    output_areas = []
+    for tab in framework_tabs:
+        with tab:
+            status_areas.append(st.empty())
+            output_areas.append(st.empty())
+    for i, text in enumerate(texts):
+        if text is not None:
+            record_cache_hit('image', started)
+            status_areas[i].success("⚡ Served from cache")
+            output_areas[i].code(text, language=languages[i])
+    
+    todo = [i for i, text in enumerate(texts) if text is None]
+    if todo:
+        model = get_model(api_key, MODEL_NAME)
+        # Upload once up front, otherwise every concurrent call sends the image inline
+        jobs = [[prompts[i], image_part(prepared, wait=len(todo) > 1)] for i in todo]
+        for kind, n, payload in generate_all(
+            model, jobs, stream=stream_output, session_id=SESSION_ID, feature='image',
+            keys=[cache_keys[i] for i in todo] if use_cache else None,
+            stores=[lambda text, key=cache_keys[i]: cache.put(key, text) for i in todo]
+        ):
+            i = todo[n]
+            if kind == 'text':
+                output_areas[i].code(payload, language=languages[i])
+            elif kind == 'retry':
+                show_retry(status_areas[i])(*payload)
+            elif kind == 'queue':
+                show_queue(status_areas[i])(*payload)
+            elif kind == 'error':
+                status_areas[i].empty()
+                with framework_tabs[i]:
+                    show_error(payload)
+            else:
+                results[i] = payload
+                texts[i] = payload.text
+                output_areas[i].code(payload.text, language=languages[i])
+                status_areas[i].success(f"✅ {frameworks[i]} generated!")
+                with framework_tabs[i]:
+                    st.caption(payload.timing_caption())
+    
+    projects = []
+    entry = None
+    for i, framework in enumerate(frameworks):
+        if texts[i] is None:
+            continue
+        file_name = f"generated_code.{file_extension(framework)}"
+        entry = history.add(
+            'image', texts[i], title=f"{framework} • {prompt_type}",
+            inputs={'framework': framework, 'prompt_type': prompt_type, 'image_bytes': len(prepared.data)},
+            result=results[i], source='api' if results[i] else 'cache',
+            language=languages[i], file_name=file_name
+        )
+        project = project_for(texts[i], file_name)
+        projects.append((framework_folder(framework), project))
+        with framework_tabs[i]:
+            st.download_button("📥 Download Code", texts[i], file_name=file_name, mime="text/plain",
+                               key=f"download-{entry.id}")
+            if len(project) > 1:
+                show_project(project, entry.id, file_name)
+    
+    timings = [r.total for r in results if r is not None]
+    if len(timings) > 1:
+        st.caption(f"🧵 {len(timings)} frameworks in {time.perf_counter() - started:.1f}s - "
+                   f"slowest {max(timings):.1f}s, one after another ~{sum(timings):.1f}s")
+    if projects:
+        st.download_button("📦 Download all frameworks (ZIP)", bundle(projects),
+                           file_name="generated_code_all.zip", mime="application/zip",
+                           key=f"zip-all-{entry.id}")
+
+
+def refactor_chunked(code, goals_text, ref_image, edge_override, chunk_lines, max_workers):
+    # Split on functions/classes, get a diff per chunk in parallel, patch and validate locally
+    python = is_python(code)
+    chunks = split_code(code, chunk_lines)
+    extra_parts = ()
+    if ref_image:
+        prepared = prepare_for_model(ref_image, edge_override)
+        st.caption(prepared.summary())
+        extra_parts = (image_part(prepared, wait=len(chunks) > 1),)
+    
+    model = get_model(api_key, MODEL_NAME)
+    started = time.perf_counter()
+    progress = st.progress(0.0, text=f"Refactoring {len(chunks)} chunks...")
+    chunk_lines_shown = [st.empty() for _ in chunks]
+    for line_idx, chunk in enumerate(chunks):
+        chunk_lines_shown[line_idx].caption(f"⏳ Lines {chunk.start}-{chunk.end}: waiting")
+    results = [None] * len(chunks)
+    done = 0
+    for idx, result, seconds, error in refactor_chunks(
+        model, chunks, goals_text, "Python" if python else "source code", extra_parts=extra_parts,
+        max_workers=max_workers, session_id=SESSION_ID, feature='refactor.chunk'
+    ):
+        done += 1
+        results[idx] = result
+        label = f"Lines {chunks[idx].start}-{chunks[idx].end} ({chunks[idx].title})"
+        if error:
+            chunk_lines_shown[idx].caption(f"⚠️ {label}: failed ({error}) - kept as is")
+        else:
+            rejected = f", {result.rejected} rejected" if result.rejected else ""
+            chunk_lines_shown[idx].caption(f"✅ {label}: {result.applied} hunk(s) applied{rejected} in {seconds:.1f}s")
+        progress.progress(done / len(chunks), text=f"Refactored {done}/{len(chunks)} chunks")
+    
+    refactored = assemble(chunks, results)
+    total = time.perf_counter() - started
+    reverted = sum(1 for r in results if r is not None and r.reverted)
+    progress.progress(1.0, text=f"All chunks done in {total:.1f}s")
+    if reverted:
+        st.warning(f"↩️ {reverted} chunk(s) kept their original code - the patch broke "
+                   f"{'parsing' if python else 'bracket balance'}")
+    
+    language = "python" if python else None
+    diff = unified_diff(code, refactored, "code.py" if python else "code")
+    notes = [f"**Lines {r.chunk.start}-{r.chunk.end}**\n{r.notes}" for r in results
+             if r is not None and r.notes and not r.reverted and r.text != r.chunk.text]
+    st.success("✅ Code refactored!" if diff else "✅ Nothing to change")
+    st.code(refactored, language=language)
+    with st.expander("🧾 Diff"):
+        st.code(diff or "(no changes)", language="diff")
+    if notes:
+        with st.expander("📝 Changes"):
+            st.markdown("\n\n".join(notes))
+    
+    # History keeps one markdown answer, like the plain refactor
+    text = ("### Changes\n\n" + "\n\n".join(notes) + "\n\n" if notes else "") + \
+        f"### Refactored code\n\n```{language or ''}\n{refactored}\n```\n\n### Diff\n\n```diff\n{diff}```\n"
+    entry = history.add(
+        'refactor', text, title=(goals_text or "Refactor") + f" • {len(chunks)} chunks",
+        inputs={'goals': goals_text, 'code_chars': len(code), 'chunks': len(chunks),
+                'reference_image': bool(ref_image)},
+        result=StreamResult(text, total, total), language="markdown"
+    )
+    st.download_button("📥 Download refactored code", refactored,
+                       file_name="refactored.py" if python else "refactored.txt",
+                       mime="text/plain", key=f"download-{entry.id}")
+
+
 # === MAIN CONTENT TABS ===
 # Four tabs: single image, multi-image, refactoring, and examples
 # Tried to order them by most common use case first
@@ -148,21 +535,13 @@ with tab1:
         )
         
         if uploaded_file:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Image", use_container_width=True)
+            st.image(cached_image(uploaded_file).thumbnail, caption="Uploaded Image", use_container_width=True)
         
         st.divider()
         
         prompt_type = st.selectbox(
             "What do you want to generate?",
-            [
-                "Recreate this UI exactly",
-                "Convert to React component",
-                "Convert to HTML/CSS",
-                "Extract and implement logic",
-                "Generate from wireframe",
-                "Custom prompt..."
-            ]
+            PROMPT_TYPES
         )
         
         if prompt_type == "Custom prompt...":
@@ -170,10 +549,14 @@ with tab1:
         else:
             custom_prompt = None
         
-        framework = st.selectbox(
-            "Target Framework",
-            ["HTML/CSS/JS", "React", "Vue", "Streamlit", "Flutter", "SwiftUI"]
-        )
+        # Several targets are generated concurrently - about as long as the slowest one
+        several_frameworks = st.checkbox("Generate several frameworks at once", value=False)
+        if several_frameworks:
+            frameworks = st.multiselect("Target Frameworks", FRAMEWORKS, default=FRAMEWORKS[:2])
+            framework = frameworks[0] if frameworks else FRAMEWORKS[0]
+        else:
+            framework = st.selectbox("Target Framework", FRAMEWORKS)
+            frameworks = [framework]
         
         include_responsive = st.checkbox("Make it responsive", value=True)
         include_animations = st.checkbox("Add animations", value=False)
@@ -181,88 +564,131 @@ with tab1:
     with col2:
         st.subheader("✨ Generated Code")
         
-        if st.button("🚀 Generate Code", disabled=not uploaded_file or not api_key):
+        # Pre-flight estimate (prompt text is ~200 tokens, output ~3k)
+        edge_override = None
+        if uploaded_file:
+            edge_override, estimate = plan_images([uploaded_file], 200, 3000)
+            show_preflight(estimate, edge_override)
+        
+        generate_clicked = st.button("🚀 Generate Code", disabled=not uploaded_file or not api_key or not frameworks)
+        if generate_clicked:
             if not api_key:
                 st.error("Configure API key in sidebar")
             elif not uploaded_file:
                 st.error("Upload an image first")
+            elif len(frameworks) > 1:
+                with st.spinner(f"🎨 Generating {len(frameworks)} frameworks at once..."):
+                    try:
+                        prepared = prepare_for_model(uploaded_file, edge_override)
+                        st.caption(prepared.summary())
+                        generate_frameworks(
+                            prepared, frameworks, prompt_type,
+                            include_responsive=include_responsive,
+                            include_animations=include_animations,
+                            custom_prompt=custom_prompt
+                        )
+                    except Exception as e:
+                        show_error(e)
             else:
                 with st.spinner("🎨 Analyzing image and generating code..."):
                     try:
-                        # Different prompt templates for different conversion types
-                        # These prompts were refined through A/B testing
-                        base_prompts = {
-                            "Recreate this UI exactly": "Analyze this image and recreate the user interface exactly as shown. Pay attention to layout, colors, fonts, spacing, and all visual details.",
-                            "Convert to React component": "Convert this UI to a React component with proper props, state management, and modern React patterns.",
-                            "Convert to HTML/CSS": "Generate clean HTML and CSS that recreates this interface. Use semantic HTML and modern CSS.",
-                            "Extract and implement logic": "Analyze this diagram/flowchart and implement the logic shown in clean, well-documented code.",
-                            "Generate from wireframe": "This is a wireframe. Create a fully-styled, production-ready implementation with modern design.",
-                        }
-                        
-                        selected_prompt = custom_prompt if custom_prompt else base_prompts.get(prompt_type, base_prompts["Recreate this UI exactly"])
-                        
-                        full_prompt = f"""{selected_prompt}
-
-TARGET FRAMEWORK: {framework}
-REQUIREMENTS:
-- Write clean, production-ready code
-- Include all necessary imports and dependencies
-- Add helpful comments
-{"- Make the design responsive for mobile, tablet, and desktop" if include_responsive else ""}
-{"- Add smooth animations and transitions" if include_animations else ""}
-- Follow best practices for {framework}
-- Ensure the code is ready to run
-
-Provide complete, working code that can be directly used.
-"""
-                        
-                        # Initialize GEMINI 2.5 FLASH with multimodal support! 🎯
-                        # Fast, excellent free tier, perfect for image-to-code generation
-                        model = genai.GenerativeModel('models/gemini-2.5-flash')
+                        full_prompt = build_image_prompt(
+                            prompt_type, framework,
+                            include_responsive=include_responsive,
+                            include_animations=include_animations,
+                            custom_prompt=custom_prompt
+                        )
+                        code_lang = code_language(framework)
                         
-                        # Call the API with image + prompt
-                        # The multimodal input is really the magic here
-                        response = model.generate_content([full_prompt, image])
+                        prepared = prepare_for_model(uploaded_file, edge_override)
+                        st.caption(prepared.summary())
                         
-                        # Show success message
-                        st.success("✅ Code generated!")
+                        # Cache key = image bytes actually sent + exact prompt + model
+                        cache = get_response_cache()
+                        cache_key = make_key(MODEL_NAME, full_prompt, prepared.data)
+                        # Everything but the options - results with the same base can be patched
+                        base_key = make_key(MODEL_NAME, prompt_type, custom_prompt, framework, prepared.data)
+                        options = {'Make it responsive': include_responsive, 'Add animations': include_animations}
+                        started = time.perf_counter()
+                        generated_code = cache.get(cache_key) if use_cache else None
                         
-                        # Map framework to syntax highlighting language
-                        # (because 'React' isn't a valid highlight lang)
-                        lang_map = {
-                            "HTML/CSS/JS": "html",
-                            "React": "jsx",
-                            "Vue": "vue",
-                            "Streamlit": "python",
-                            "Flutter": "dart",
-                            "SwiftUI": "swift"
-                        }
+                        status_area = st.empty()
+                        output_area = st.empty()
                         
-                        code_lang = lang_map.get(framework, "python")
+                        file_ext = file_extension(framework)
+                        builder = ProjectBuilder(f"generated_code.{file_ext}")
+                        result = None
+                        patched = None
+                        if generated_code is None and incremental_updates:
+                            patched = patch_from_history('image', base_key, options, status_area)
+                        if generated_code is not None:
+                            record_cache_hit('image', started)
+                            builder.feed(generated_code)
+                            status_area.success("✅ Code generated!")
+                            st.caption(f"⚡ Served from cache in {(time.perf_counter() - started) * 1000:.0f} ms")
+                            output_area.code(generated_code, language=code_lang)
+                        elif patched is not None:
+                            result = patched
+                            generated_code = patched.text
+                            builder.feed(generated_code)
+                            output_area.code(generated_code, language=code_lang)
+                            status_area.success("✅ Code updated!")
+                            st.caption(result.timing_caption())
+                        else:
+                            # Initialize GEMINI 2.5 FLASH with multimodal support! 🎯
+                            # Fast, excellent free tier, perfect for image-to-code generation
+                            model = get_model(api_key, MODEL_NAME)
+                            
+                            # Call the API with image + prompt
+                            # The multimodal input is really the magic here
+                            contents = [full_prompt, image_part(prepared)]
+                            record = start_call('image', contents)
+                            # Identical requests already in flight (same cache key) share that call
+                            response = generate_shared(
+                                cache_key if use_cache else None, model, contents,
+                                store=lambda text: cache.put(cache_key, text),
+                                stream=stream_output, on_retry=show_retry(status_area),
+                                session_id=SESSION_ID, on_queue=show_queue(status_area), record=record
+                            )
+                            if stream_output:
+                                result = stream_to_placeholder(response, output_area, started, language=code_lang,
+                                                               record=record, sink=builder)
+                            else:
+                                result = finish_blocking(response, started, record)
+                                output_area.code(result.text, language=code_lang)
+                                builder.feed(result.text)
+                            generated_code = result.text
+                            
+                            # Show success message
+                            status_area.success("✅ Code generated!")
+                            st.caption(result.timing_caption())
                         
-                        st.code(response.text, language=code_lang)
+                        entry = history.add(
+                            'image', generated_code, title=f"{framework} • {prompt_type}",
+                            inputs={'framework': framework, 'prompt_type': prompt_type,
+                                    'image_bytes': len(prepared.data), 'base': base_key, 'options': options},
+                            result=result, source='patch' if patched else 'api' if result else 'cache',
+                            language=code_lang, file_name=f"generated_code.{file_ext}"
+                        )
                         
                         # Download button
-                        file_extensions = {
-                            "HTML/CSS/JS": "html",
-                            "React": "jsx",
-                            "Vue": "vue",
-                            "Streamlit": "py",
-                            "Flutter": "dart",
-                            "SwiftUI": "swift"
-                        }
-                        
-                        file_ext = file_extensions.get(framework, "txt")
-                        
                         st.download_button(
                             "📥 Download Code",
-                            response.text,
+                            generated_code,
                             file_name=f"generated_code.{file_ext}",
-                            mime="text/plain"
+                            mime="text/plain",
+                            key=f"download-{entry.id}"
                         )
                         
+                        # Component + stylesheet answers etc. also get a file browser / ZIP
+                        project = builder.close()
+                        if len(project) > 1:
+                            show_project(project, entry.id, entry.file_name)
+                        
                     except Exception as e:
-                        st.error(f"Error: {str(e)}")
+                        show_error(e)
+        
+        show_history('image', generate_clicked)
 
 # TAB 2: Multiple Images (Advanced Feature)
 # This is cool - you can upload different screens and it generates a complete app
@@ -280,14 +706,37 @@ with tab2:
     if uploaded_files:
         st.subheader(f"📸 {len(uploaded_files)} Images Uploaded")
         
-        cols = st.columns(min(3, len(uploaded_files)))
-        images = []
+        # Near-identical screens (hover states, re-exports) only get sent once
+        dedupe_col, threshold_col = st.columns([1, 2])
+        with dedupe_col:
+            skip_duplicates = st.checkbox("Skip near-duplicate screens", value=True)
+        with threshold_col:
+            dup_threshold = st.slider(
+                "Similarity threshold (differing bits out of 64)", 0, MAX_THRESHOLD, DEFAULT_THRESHOLD,
+                disabled=not skip_duplicates,
+                help="Higher groups more aggressively. 0 only matches visually identical images"
+            )
+        hashes = [cached_image(f).fingerprint for f in uploaded_files]
+        groups = group_duplicates(hashes, dup_threshold if skip_duplicates else -1)
+        # Upload indices that actually get sent, in upload order
+        send_indices = [group.representative for group in groups]
+        send_files = [uploaded_files[i] for i in send_indices]
+        skipped = len(uploaded_files) - len(send_files)
+        if skipped:
+            st.caption(f"🧬 {skipped} near-duplicate image(s) skipped - sending {len(send_files)} of {len(uploaded_files)}")
+        
+        # Preview grid: one cell per group - the image we send, its duplicates folded under it
+        cols = st.columns(min(3, len(groups)))
         
-        for idx, file in enumerate(uploaded_files):
-            img = Image.open(file)
-            images.append(img)
-            with cols[idx % 3]:
-                st.image(img, caption=f"Image {idx+1}", use_container_width=True)
+        for pos, group in enumerate(groups):
+            with cols[pos % 3]:
+                st.image(cached_image(uploaded_files[group.representative]).thumbnail,
+                         caption=f"Image {group.representative+1}", use_container_width=True)
+                if group.duplicates:
+                    with st.expander(f"+{len(group.duplicates)} near-duplicate(s), not sent"):
+                        for idx, distance in group.duplicates.items():
+                            st.image(cached_image(uploaded_files[idx]).thumbnail, use_container_width=True,
+                                     caption=f"Image {idx+1} (distance {distance})")
         
         st.divider()
         
@@ -303,12 +752,27 @@ with tab2:
                     "Mobile app (Flutter/SwiftUI)",
                 ]
             )
+            
+            # Map-reduce: analyze each screen in parallel, then one small text-only call
+            multi_mode = st.radio(
+                "Generation mode",
+                ["Single request (all images at once)", "Parallel screen analysis + assembly"],
+                index=1 if len(send_files) > 3 else 0,
+                help="Parallel mode scales with the slowest screen instead of the number of screens"
+            )
+            parallel_mode = multi_mode.startswith("Parallel")
+            if parallel_mode:
+                max_workers = st.slider("Screens analyzed at once", 1, 8, DEFAULT_MAX_WORKERS)
         
         with col2:
-            if st.button("🎯 Generate Complete App"):
+            edge_override, estimate = plan_images(send_files, 300, 8000)
+            show_preflight(estimate, edge_override)
+            
+            multi_clicked = st.button("🎯 Generate Complete App")
+            if multi_clicked:
                 with st.spinner("🔮 Analyzing all images and generating application..."):
                     try:
-                        prompt = f"""Analyze these {len(uploaded_files)} images which show different parts/pages of an application.
+                        prompt = f"""Analyze these {len(send_files)} images which show different parts/pages of an application.
 
 Create a complete {generation_type} that includes:
 1. All pages/screens shown in the images
@@ -319,23 +783,96 @@ Create a complete {generation_type} that includes:
 6. README with setup instructions
 
 Make it production-ready and well-organized.
-"""
+""" + FILE_FORMAT_INSTRUCTION
+                        
+                        prepared_images = [prepare_for_model(file, edge_override) for file in send_files]
+                        saved = sum(p.bytes_saved for p in prepared_images)
+                        tokens_saved = sum(p.tokens_saved for p in prepared_images)
+                        with st.expander(f"🗜️ Preprocessing saved {saved / 1024:.0f} KB, ~{tokens_saved:,} image tokens"):
+                            for idx, p in zip(send_indices, prepared_images):
+                                st.caption(f"Image {idx+1}: {p.summary()}")
                         
-                        model = genai.GenerativeModel('models/gemini-2.5-flash')
-                        response = model.generate_content([prompt] + images)
+                        model = get_model(api_key, MODEL_NAME)
                         
-                        st.success("✅ Complete application generated!")
-                        st.code(response.text, language="python")
+                        if parallel_mode:
+                            # Map step - per-screen summaries, progress updated as each one lands
+                            map_started = time.perf_counter()
+                            progress = st.progress(0.0, text="Analyzing screens...")
+                            screen_lines = [st.empty() for _ in prepared_images]
+                            for line_idx, line in enumerate(screen_lines):
+                                line.caption(f"⏳ Image {send_indices[line_idx]+1}: waiting")
+                            summaries = [None] * len(prepared_images)
+                            done = 0
+                            for idx, summary, seconds, error in analyze_screens(
+                                model, [image_part(p) for p in prepared_images], max_workers=max_workers,
+                                session_id=SESSION_ID, feature='multi.screen'
+                            ):
+                                done += 1
+                                summaries[idx] = summary
+                                label = f"Image {send_indices[idx]+1}"
+                                if error:
+                                    screen_lines[idx].caption(f"⚠️ {label}: failed ({error}) - skipped")
+                                else:
+                                    screen_lines[idx].caption(f"✅ {label}: analyzed in {seconds:.1f}s")
+                                progress.progress(done / len(prepared_images), text=f"Analyzed {done}/{len(prepared_images)} screens")
+                            
+                            if not any(summaries):
+                                raise RuntimeError("Every screen analysis failed")
+                            progress.progress(1.0, text=f"All screens analyzed in {time.perf_counter() - map_started:.1f}s - assembling app...")
+                            with st.expander("🧩 Screen summaries"):
+                                for idx, summary in zip(send_indices, summaries):
+                                    if summary:
+                                        st.markdown(f"**Image {idx+1}**")
+                                        st.text(summary)
+                            
+                            # Reduce step - text only, much smaller than N images
+                            contents = [build_reduce_prompt(summaries, generation_type)]
+                        else:
+                            contents = [prompt] + [image_part(p) for p in prepared_images]
                         
+                        status_area = st.empty()
+                        output_area = st.empty()
+                        started = time.perf_counter()
+                        record = start_call('multi', contents)
+                        builder = ProjectBuilder("complete_app.md")
+                        response = generate(
+                            model, contents, stream=stream_output, on_retry=show_retry(status_area),
+                            session_id=SESSION_ID, on_queue=show_queue(status_area), record=record
+                        )
+                        if stream_output:
+                            result = stream_to_placeholder(response, output_area, started, language="python",
+                                                           record=record, sink=builder)
+                        else:
+                            result = finish_blocking(response, started, record)
+                            output_area.code(result.text, language="python")
+                            builder.feed(result.text)
+                        project = builder.close()
+                        
+                        status_area.success("✅ Complete application generated!")
+                        st.caption(result.timing_caption())
+                        
+                        entry = history.add(
+                            'multi', result.text, title=f"{generation_type} • {len(send_files)} images",
+                            inputs={'generation_type': generation_type, 'images': len(send_files),
+                                    'parallel': parallel_mode},
+                            result=result, language="python", file_name="complete_app.md"
+                        )
+                        
+                        show_project(project, entry.id, entry.file_name)
                         st.download_button(
-                            "📥 Download Complete App",
-                            response.text,
-                            file_name="complete_app.zip",
-                            mime="text/plain"
+                            "📥 Download Full Response",
+                            result.text,
+                            file_name="complete_app.md",
+                            mime="text/markdown",
+                            key=f"download-{entry.id}"
                         )
                         
                     except Exception as e:
-                        st.error(f"Error: {str(e)}")
+                        show_error(e)
+    else:
+        multi_clicked = False
+    
+    show_history('multi', multi_clicked, "📥 Download Full Response")
 
 # TAB 3: Code Refactoring (Bonus Feature)
 # Sometimes you have code but want to modernize it with a reference design
@@ -361,7 +898,7 @@ with tab3:
         )
         
         if ref_image:
-            st.image(Image.open(ref_image), use_container_width=True)
+            st.image(cached_image(ref_image).thumbnail, use_container_width=True)
     
     refactor_goal = st.multiselect(
         "Refactoring goals",
@@ -377,7 +914,41 @@ with tab3:
         default=["Improve code quality"]
     )
     
-    if st.button("✨ Refactor Code", disabled=not current_code):
+    # Big files: refactor syntactic chunks in parallel and only get diffs back
+    code_lines = current_code.count('\n') + 1 if current_code else 0
+    chunk_col, size_col, workers_col = st.columns([2, 1, 1])
+    with chunk_col:
+        chunked_mode = st.checkbox(
+            "Chunked diff mode (large files)", value=code_lines > DEFAULT_CHUNK_THRESHOLD,
+            help="Splits on functions/classes, refactors the parts in parallel as unified diffs and patches locally"
+        )
+    with size_col:
+        chunk_lines = st.number_input("Lines per chunk", 40, 1000, DEFAULT_CHUNK_LINES, step=10,
+                                      disabled=not chunked_mode)
+    with workers_col:
+        refactor_workers = st.slider("Parallel chunks", 1, 8, DEFAULT_MAX_WORKERS, disabled=not chunked_mode,
+                                     key="refactor_workers")
+    
+    edge_override = None
+    if current_code:
+        code_tokens = rough_token_count(current_code)
+        # Refactored code + explanation is roughly twice the input; diffs a fraction of it
+        output_tokens = code_tokens // 3 if chunked_mode else code_tokens * 2
+        if ref_image:
+            edge_override, estimate = plan_images([ref_image], code_tokens + 100, output_tokens)
+        else:
+            estimate = Estimate(code_tokens + 100, output_tokens)
+        show_preflight(estimate, edge_override)
+    
+    refactor_clicked = st.button("✨ Refactor Code", disabled=not current_code)
+    if refactor_clicked and chunked_mode:
+        with st.spinner("Refactoring in chunks..."):
+            try:
+                refactor_chunked(current_code, ", ".join(refactor_goal), ref_image, edge_override,
+                                 int(chunk_lines), refactor_workers)
+            except Exception as e:
+                show_error(e)
+    elif refactor_clicked:
         with st.spinner("Refactoring..."):
             try:
                 goals_text = ", ".join(refactor_goal)
@@ -392,20 +963,44 @@ Provide:
 3. Before/after comparison
 """
                 
-                model = genai.GenerativeModel('models/gemini-2.5-flash')
+                status_area = st.empty()
+                output_area = st.empty()
+                started = time.perf_counter()
+                
+                model = get_model(api_key, MODEL_NAME)
                 
                 if ref_image:
-                    img = Image.open(ref_image)
+                    prepared = prepare_for_model(ref_image, edge_override)
+                    st.caption(prepared.summary())
                     prompt += "\n\nVISUAL REFERENCE: Use this as design inspiration"
-                    response = model.generate_content([prompt, img])
+                    contents = [prompt, image_part(prepared)]
                 else:
-                    response = model.generate_content(prompt)
+                    contents = prompt
+                record = start_call('refactor', contents)
+                response = generate(
+                    model, contents, stream=stream_output, on_retry=show_retry(status_area),
+                    session_id=SESSION_ID, on_queue=show_queue(status_area), record=record
+                )
                 
-                st.success("✅ Code refactored!")
-                st.markdown(response.text)
+                if stream_output:
+                    result = stream_to_placeholder(response, output_area, started, markdown=True, record=record)
+                else:
+                    result = finish_blocking(response, started, record)
+                    output_area.markdown(result.text)
+                
+                status_area.success("✅ Code refactored!")
+                st.caption(result.timing_caption())
+                history.add(
+                    'refactor', result.text, title=", ".join(refactor_goal) or "Refactor",
+                    inputs={'goals': refactor_goal, 'code_chars': len(current_code),
+                            'reference_image': bool(ref_image)},
+                    result=result, language="markdown"
+                )
                 
             except Exception as e:
-                st.error(f"Error: {str(e)}")
+                show_error(e)
+    
+    show_history('refactor', refactor_clicked)
 
 # TAB 4: Examples (Show what's possible)
 # Real-world examples help users understand the value
@@ -477,8 +1072,21 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Call metrics - drawn last so the panel already includes this run's calls
+with st.sidebar:
+    with st.expander("📈 Call metrics"):
+        metrics = get_metrics()
+        rows = metrics.summary_rows()
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+            st.download_button("Prometheus metrics", metrics.prometheus_text(),
+                               file_name="gemini_metrics.prom", mime="text/plain")
+            st.download_button("Recent calls (JSONL)", metrics.jsonl(),
+                               file_name="gemini_calls.jsonl", mime="application/json")
+        else:
+            st.caption("No Gemini calls in this process yet")
+        if metrics.log_path:
+            st.caption(f"Every call is also logged to `{metrics.log_path}`")
+
 # Developer notes:
 # - Test with more edge cases (hand-drawn sketches, low-res images)
-# - Maybe add image preprocessing options?
-# - Consider caching responses for the same image
-# - Add analytics to track which features get used most
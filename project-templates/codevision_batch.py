@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CodeVision batch mode - convert a whole folder of design exports, no UI.
+
+Same prompts, preprocessing, cache and Gemini client as the Streamlit app,
+but driven from the command line with bounded parallelism. Runs are
+resumable: an image whose output file already exists is skipped, so a
+nightly job can just be re-run after a crash or a quota cut-off.
+
+Examples:
+    python codevision_batch.py designs/ --framework React --out generated/
+    python codevision_batch.py "exports/**/*.png" --framework Flutter -j 8
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from codevision_prompts import (FRAMEWORKS, MODEL_NAME, PROMPT_TYPES, build_image_prompt,
+                                file_extension, strip_code_fence)
+from gemini_client import GeminiError, configure, generate, get_model
+from image_prep import DEFAULT_MAX_EDGE, DEFAULT_QUALITY, passthrough_image, preprocess_image
+from response_cache import ResponseCache, make_key
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+def find_images(inputs):
+    """Expand folders (recursively) and globs into (path, base_dir) pairs."""
+    found = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        found.append((os.path.join(root, name), item))
+        else:
+            base = os.path.dirname(item.split('*')[0]) or '.'
+            for path in sorted(glob.glob(item, recursive=True)):
+                if path.lower().endswith(IMAGE_EXTENSIONS):
+                    found.append((path, base))
+    # Same file given twice (folder + glob) is only converted once
+    seen = set()
+    unique = []
+    for path, base in found:
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append((path, base))
+    return unique
+
+
+def output_path(image_path, base_dir, out_dir, framework):
+    """Mirror the input layout under out_dir with the framework's extension."""
+    relative = os.path.relpath(image_path, base_dir)
+    stem = os.path.splitext(relative)[0]
+    return os.path.join(out_dir, f"{stem}.{file_extension(framework)}")
+
+
+def write_atomic(path, text):
+    # Write to a temp file first so an interrupted run never leaves a
+    # half-written file that the next run would skip as "done"
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.part'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def convert_one(model, cache, image_path, dest, args, prompt):
+    """Generate code for one image. Returns (source, seconds)."""
+    started = time.perf_counter()
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    if args.no_preprocess:
+        prepared = passthrough_image(data)
+    else:
+        prepared = preprocess_image(data, max_edge=args.max_edge, quality=args.quality)
+
+    cache_key = make_key(MODEL_NAME, prompt, prepared.data)
+    text = cache.get(cache_key) if cache is not None else None
+    source = 'cache'
+    if text is None:
+        response = generate(model, [prompt, prepared.as_part()], session_id='codevision-batch')
+        text = response.text
+        source = 'api'
+        if cache is not None:
+            cache.put(cache_key, text)
+
+    write_atomic(dest, strip_code_fence(text) if args.strip_fences else text)
+    return source, time.perf_counter() - started
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch image-to-code conversion with CodeVision")
+    parser.add_argument('inputs', nargs='+', help="Image folders and/or glob patterns")
+    parser.add_argument('--out', default='codevision_output', help="Output folder (default: %(default)s)")
+    parser.add_argument('--framework', choices=FRAMEWORKS, default="HTML/CSS/JS")
+    parser.add_argument('--prompt-type', choices=PROMPT_TYPES[:-1], default=PROMPT_TYPES[0])
+    parser.add_argument('--custom-prompt', help="Custom instructions (overrides --prompt-type)")
+    parser.add_argument('--no-responsive', action='store_true', help="Don't ask for a responsive layout")
+    parser.add_argument('--animations', action='store_true', help="Ask for animations and transitions")
+    parser.add_argument('-j', '--concurrency', type=int, default=4, help="Parallel requests (default: %(default)s)")
+    parser.add_argument('--max-edge', type=int, default=DEFAULT_MAX_EDGE)
+    parser.add_argument('--quality', type=int, default=DEFAULT_QUALITY)
+    parser.add_argument('--no-preprocess', action='store_true', help="Send images untouched")
+    parser.add_argument('--no-cache', action='store_true', help="Skip the shared response cache")
+    parser.add_argument('--force', action='store_true', help="Regenerate outputs that already exist")
+    parser.add_argument('--strip-fences', action='store_true',
+                        help="Write bare code when the answer is a single ``` block")
+    parser.add_argument('--api-key', default=None, help="Defaults to GEMINI_API_KEY")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+
+    api_key = args.api_key or os.getenv('GEMINI_API_KEY', '')
+    if not api_key:
+        print("No API key - set GEMINI_API_KEY or pass --api-key", file=sys.stderr)
+        return 2
+    configure(api_key)
+    model = get_model(api_key, MODEL_NAME)
+    cache = None if args.no_cache else ResponseCache()
+
+    prompt = build_image_prompt(
+        args.prompt_type, args.framework,
+        include_responsive=not args.no_responsive,
+        include_animations=args.animations,
+        custom_prompt=args.custom_prompt
+    )
+
+    jobs = []
+    skipped = 0
+    taken = set()
+    for image_path, base_dir in find_images(args.inputs):
+        dest = output_path(image_path, base_dir, args.out, args.framework)
+        if dest in taken:
+            # home.png and home.jpg side by side - keep the source extension too
+            stem, ext = os.path.splitext(dest)
+            dest = f"{stem}{os.path.splitext(image_path)[1]}{ext}"
+        taken.add(dest)
+        if not args.force and os.path.exists(dest) and os.path.getsize(dest) > 0:
+            skipped += 1
+            continue
+        jobs.append((image_path, dest))
+
+    print(f"{len(jobs)} image(s) to convert, {skipped} already done → {args.out}")
+    if not jobs:
+        return 0
+
+    failures = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = {
+            pool.submit(convert_one, model, cache, image_path, dest, args, prompt): (image_path, dest)
+            for image_path, dest in jobs
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            image_path, dest = futures[future]
+            try:
+                source, seconds = future.result()
+                print(f"[{done}/{len(jobs)}] ok    {image_path} → {dest} ({seconds:.1f}s, {source})")
+            except GeminiError as e:
+                failures += 1
+                print(f"[{done}/{len(jobs)}] FAIL  {image_path}: {e.kind} - {e.original}", file=sys.stderr)
+            except Exception as e:
+                failures += 1
+                print(f"[{done}/{len(jobs)}] FAIL  {image_path}: {e}", file=sys.stderr)
+
+    print(f"Done in {time.perf_counter() - started:.0f}s - {len(jobs) - failures} converted, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+CodeVision prompt construction, shared by the Streamlit app and the
+batch CLI (codevision_batch.py).
+"""
+
+import re
+
+
+MODEL_NAME = 'models/gemini-2.5-flash'
+
+PROMPT_TYPES = [
+    "Recreate this UI exactly",
+    "Convert to React component",
+    "Convert to HTML/CSS",
+    "Extract and implement logic",
+    "Generate from wireframe",
+    "Custom prompt...",
+]
+
+FRAMEWORKS = ["HTML/CSS/JS", "React", "Vue", "Streamlit", "Flutter", "SwiftUI"]
+
+# Different prompt templates for different conversion types
+# These prompts were refined through A/B testing
+BASE_PROMPTS = {
+    "Recreate this UI exactly": "Analyze this image and recreate the user interface exactly as shown. Pay attention to layout, colors, fonts, spacing, and all visual details.",
+    "Convert to React component": "Convert this UI to a React component with proper props, state management, and modern React patterns.",
+    "Convert to HTML/CSS": "Generate clean HTML and CSS that recreates this interface. Use semantic HTML and modern CSS.",
+    "Extract and implement logic": "Analyze this diagram/flowchart and implement the logic shown in clean, well-documented code.",
+    "Generate from wireframe": "This is a wireframe. Create a fully-styled, production-ready implementation with modern design.",
+}
+
+# Map framework to syntax highlighting language
+# (because 'React' isn't a valid highlight lang)
+LANG_MAP = {
+    "HTML/CSS/JS": "html",
+    "React": "jsx",
+    "Vue": "vue",
+    "Streamlit": "python",
+    "Flutter": "dart",
+    "SwiftUI": "swift"
+}
+
+FILE_EXTENSIONS = {
+    "HTML/CSS/JS": "html",
+    "React": "jsx",
+    "Vue": "vue",
+    "Streamlit": "py",
+    "Flutter": "dart",
+    "SwiftUI": "swift"
+}
+
+FENCE_RE = re.compile(r'```[^\n`]*\n(.*?)```', re.DOTALL)
+
+
+def build_image_prompt(prompt_type, framework, include_responsive=True,
+                       include_animations=False, custom_prompt=None):
+    """The single-image prompt, exactly as the app sends it."""
+    selected_prompt = custom_prompt if custom_prompt else BASE_PROMPTS.get(prompt_type, BASE_PROMPTS["Recreate this UI exactly"])
+
+    return f"""{selected_prompt}
+
+TARGET FRAMEWORK: {framework}
+REQUIREMENTS:
+- Write clean, production-ready code
+- Include all necessary imports and dependencies
+- Add helpful comments
+{"- Make the design responsive for mobile, tablet, and desktop" if include_responsive else ""}
+{"- Add smooth animations and transitions" if include_animations else ""}
+- Follow best practices for {framework}
+- Ensure the code is ready to run
+
+Provide complete, working code that can be directly used.
+"""
+
+
+def code_language(framework):
+    return LANG_MAP.get(framework, "python")
+
+
+def file_extension(framework):
+    return FILE_EXTENSIONS.get(framework, "txt")
+
+
+def strip_code_fence(text):
+    """Bare code when the answer is a single fenced block, otherwise the text as is."""
+    blocks = FENCE_RE.findall(text)
+    if len(blocks) == 1:
+        return blocks[0].rstrip() + '\n'
+    return text
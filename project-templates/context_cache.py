@@ -0,0 +1,344 @@
+"""
+Server-side caching of big documentation for Doc2App (Gemini context caching).
+
+People generate from the same large spec several times - another app
+type, tests on, higher complexity - and every click re-sent and re-processed
+the whole document. For docs above MIN_CACHE_TOKENS we now upload the
+documentation once as cached content. Later calls only send the options,
+and cached input tokens are billed at a fraction of the normal rate.
+
+ContextCacheRegistry is the local side of that:
+
+- maps (api key, model, system instruction, documentation hash) to the
+  cache handle, persisted in .cache/context_caches.json so restarts reuse
+  caches that are still alive (and paid for)
+- TTL per cache; a hit in the last quarter of the TTL extends it
+- at most MAX_CACHES live caches, least recently used deleted first
+- failed creations (doc too small for the model, unsupported model...) are
+  remembered for a while instead of retried on every click
+
+Backends: GeminiContextBackend talks to the API; LocalContextBackend is
+the stand-in used with the fake model (tests, GEMINI_FAKE=1)
+and just prepends the cached contents to every call.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+import google.generativeai as genai
+
+from gemini_client import configure, get_model, using_stand_in
+from response_cache import DEFAULT_CACHE_DIR
+
+
+DEFAULT_TTL = int(os.getenv('DOC2APP_CONTEXT_CACHE_TTL', '3600'))       # seconds
+MIN_CACHE_TOKENS = int(os.getenv('DOC2APP_CONTEXT_CACHE_MIN_TOKENS', '32768'))
+MAX_CACHES = int(os.getenv('DOC2APP_CONTEXT_CACHE_MAX', '8'))
+FAILURE_BACKOFF = 600          # seconds before retrying a key whose creation failed
+REGISTRY_PATH = os.path.join(DEFAULT_CACHE_DIR, 'context_caches.json')
+
+DOCUMENTATION_HEADER = "DOCUMENTATION:\n"
+# Goes where the documentation used to be in the prompts once it's cached
+CACHED_DOCUMENTATION = "(the DOCUMENTATION provided above in the cached context)"
+
+
+def documentation_key(api_key, model_name, system_instruction, documentation):
+    digest = hashlib.sha256()
+    for part in (api_key or '', model_name, system_instruction or '', documentation):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class CachedDocumentation:
+    """A live cache handle plus a model that answers on top of it."""
+
+    def __init__(self, key, name, expires_at, tokens, created, hits=0):
+        self.key = key
+        self.name = name
+        self.expires_at = expires_at
+        self.tokens = tokens
+        self.created = created
+        self.last_used = created
+        self.hits = hits
+        self.model = None          # filled in by the registry per process
+        self.reused = False        # True when this lookup didn't have to upload
+
+    @property
+    def seconds_left(self):
+        return max(0.0, self.expires_at - time.time())
+
+    def caption(self):
+        action = "Reusing" if self.reused else "Cached"
+        return (f"🧠 {action} {self.tokens:,} documentation tokens on Gemini • "
+                f"expires in {self.seconds_left / 60:.0f} min • only the options are re-sent")
+
+    def as_dict(self):
+        return {'name': self.name, 'expires_at': self.expires_at, 'tokens': self.tokens,
+                'created': self.created, 'hits': self.hits}
+
+
+# === Backends ===
+
+class GeminiContextBackend:
+    """google.generativeai.caching."""
+
+    def __init__(self):
+        self._handles = {}
+
+    def create(self, api_key, model_name, system_instruction, documentation, ttl):
+        configure(api_key)
+        kwargs = {'system_instruction': system_instruction} if system_instruction else {}
+        cache = genai.caching.CachedContent.create(
+            model=model_name, display_name='doc2app-documentation',
+            contents=[DOCUMENTATION_HEADER + documentation],
+            ttl=datetime.timedelta(seconds=ttl), **kwargs
+        )
+        self._handles[cache.name] = cache
+        return cache.name
+
+    def _handle(self, api_key, name):
+        if name not in self._handles:
+            configure(api_key)
+            self._handles[name] = genai.caching.CachedContent.get(name)
+        return self._handles[name]
+
+    def refresh(self, api_key, name, ttl):
+        self._handle(api_key, name).update(ttl=datetime.timedelta(seconds=ttl))
+
+    def delete(self, api_key, name):
+        handle = self._handles.pop(name, None)
+        configure(api_key)
+        (handle or genai.caching.CachedContent.get(name)).delete()
+
+    def model(self, api_key, name):
+        return genai.GenerativeModel.from_cached_content(cached_content=self._handle(api_key, name))
+
+
+class PrefixedModel:
+    """Stand-in for a cached-content model: prepends the cached parts to every call."""
+
+    def __init__(self, model, prefix):
+        self._model = model
+        self._prefix = prefix
+
+    def _contents(self, contents):
+        return self._prefix + (list(contents) if isinstance(contents, (list, tuple)) else [contents])
+
+    def generate_content(self, contents, **kwargs):
+        return self._model.generate_content(self._contents(contents), **kwargs)
+
+    async def generate_content_async(self, contents, **kwargs):
+        return await self._model.generate_content_async(self._contents(contents), **kwargs)
+
+    def count_tokens(self, contents, **kwargs):
+        # Like the API, the cached prefix isn't part of what we send
+        return self._model.count_tokens(contents, **kwargs)
+
+    async def count_tokens_async(self, contents, **kwargs):
+        return await self._model.count_tokens_async(contents, **kwargs)
+
+
+class LocalContextBackend:
+    """In-process stand-in - no API, same registry behaviour."""
+
+    def __init__(self):
+        self._caches = {}
+        self.created = 0
+
+    def create(self, api_key, model_name, system_instruction, documentation, ttl):
+        self.created += 1
+        name = f"cachedContents/local-{self.created}"
+        self._caches[name] = (model_name, system_instruction, [DOCUMENTATION_HEADER + documentation])
+        return name
+
+    def refresh(self, api_key, name, ttl):
+        if name not in self._caches:
+            raise KeyError(name)
+
+    def delete(self, api_key, name):
+        self._caches.pop(name, None)
+
+    def model(self, api_key, name):
+        model_name, system_instruction, prefix = self._caches[name]
+        return PrefixedModel(get_model(api_key, model_name, system_instruction), prefix)
+
+
+# === Registry ===
+
+class ContextCacheRegistry:
+    """documentation hash -> live cache handle, with TTL, refresh and eviction."""
+
+    def __init__(self, backend, path=REGISTRY_PATH, ttl=DEFAULT_TTL, max_caches=MAX_CACHES,
+                 min_tokens=MIN_CACHE_TOKENS):
+        self.backend = backend
+        self.path = path
+        self.ttl = ttl
+        self.max_caches = max_caches
+        self.min_tokens = min_tokens
+        self._entries = {}
+        self._owners = {}          # key -> api_key, needed to delete on eviction
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.uploads = 0
+        self.reuses = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, raw in data.items():
+            if raw.get('expires_at', 0) > now:
+                entry = CachedDocumentation(key, raw['name'], raw['expires_at'], raw.get('tokens', 0),
+                                            raw.get('created', now), raw.get('hits', 0))
+                self._entries[key] = entry
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + '.part'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({key: e.as_dict() for key, e in self._entries.items()}, f)
+        os.replace(tmp, self.path)
+
+    def get(self, api_key, model_name, system_instruction, documentation, tokens, ttl=None):
+        """Live CachedDocumentation with .model, or None to send the docs inline.
+
+        None means the doc is under min_tokens, or that creating the cache
+        failed (recently). Callers just fall back to the normal prompt.
+        """
+        if tokens < self.min_tokens:
+            return None
+        ttl = ttl or self.ttl
+        key = documentation_key(api_key, model_name, system_instruction, documentation)
+        with self._lock:
+            if time.time() < self._failures.get(key, 0):
+                return None
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # One upload per document even when several sessions click at once
+        with key_lock:
+            entry = self._live(key, api_key, ttl)
+            if entry is not None:
+                try:
+                    entry.model = self.backend.model(api_key, entry.name)
+                    return entry
+                except Exception:
+                    # Listed locally but unusable (e.g. deleted on the server) - upload again
+                    self._forget(key)
+            entry = self._create(key, api_key, model_name, system_instruction, documentation, tokens, ttl)
+            if entry is None:
+                return None
+            try:
+                entry.model = self.backend.model(api_key, entry.name)
+            except Exception:
+                self._forget(key)
+                return None
+            return entry
+
+    def _live(self, key, api_key, ttl):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.seconds_left < 30:
+            # About to expire server-side - a fresh upload is safer than a refresh race
+            self._forget(key)
+            return None
+        if entry.seconds_left < ttl / 4:
+            try:
+                self.backend.refresh(api_key, entry.name, ttl)
+                entry.expires_at = time.time() + ttl
+            except Exception:
+                # Gone on the server (deleted, expired early) - upload again
+                self._forget(key)
+                return None
+        with self._lock:
+            entry.hits += 1
+            entry.last_used = time.time()
+            entry.reused = True
+            self._owners.setdefault(key, api_key)
+            self.reuses += 1
+            self._save()
+        return entry
+
+    def _create(self, key, api_key, model_name, system_instruction, documentation, tokens, ttl):
+        try:
+            name = self.backend.create(api_key, model_name, system_instruction, documentation, ttl)
+        except Exception:
+            with self._lock:
+                self._failures[key] = time.time() + FAILURE_BACKOFF
+            return None
+        now = time.time()
+        entry = CachedDocumentation(key, name, now + ttl, tokens, now)
+        with self._lock:
+            self._entries[key] = entry
+            self._owners[key] = api_key
+            self.uploads += 1
+            evicted = self._over_cap()
+            self._save()
+        for old_key, old in evicted:
+            self._delete_remote(old_key, old)
+        return entry
+
+    def _over_cap(self):
+        now = time.time()
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        victims = [(k, self._entries.pop(k)) for k in expired]
+        while len(self._entries) > self.max_caches:
+            oldest = min(self._entries, key=lambda k: self._entries[k].last_used)
+            victims.append((oldest, self._entries.pop(oldest)))
+        return victims
+
+    def _delete_remote(self, key, entry):
+        api_key = self._owners.pop(key, None)
+        if api_key is None or entry.seconds_left <= 0:
+            return      # unknown owner (from a previous run) or already gone - let the TTL handle it
+        try:
+            self.backend.delete(api_key, entry.name)
+        except Exception:
+            pass
+
+    def _forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._owners.pop(key, None)
+            self._save()
+
+    def stats(self):
+        with self._lock:
+            live = [e for e in self._entries.values() if e.seconds_left > 0]
+            return {
+                'caches': len(live),
+                'tokens': sum(e.tokens for e in live),
+                'uploads': self.uploads,
+                'reuses': self.reuses,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_context_registry():
+    """The shared registry for this process (local stand-in with the fake model)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            if using_stand_in():
+                _registry = ContextCacheRegistry(LocalContextBackend(), path=None)
+            else:
+                _registry = ContextCacheRegistry(GeminiContextBackend())
+        return _registry
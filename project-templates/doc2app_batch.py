@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Doc2App batch mode - generate apps for many API specs at once, no UI.
+
+Same prompt template, system instruction and cache as the Streamlit app,
+driven through generate_content_async with a concurrency limit. Results go
+to a JSONL file (one line per spec, with latency and token usage). Runs are
+resumable: ids already written with status "ok" are skipped.
+
+Input is either a folder of spec files (the file name is the id and the
+CLI options apply to all of them) or a JSONL file with one object per line:
+
+    {"id": "billing", "path": "specs/billing.yaml", "app_type": "REST API (FastAPI)", "complexity": 4}
+    {"id": "todo", "documentation": "GET /todos ...", "include_tests": false}
+
+Examples:
+    python doc2app_batch.py specs/ --app-type "CLI Tool" --out results.jsonl
+    python doc2app_batch.py jobs.jsonl -j 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from doc2app_prompts import (APP_TYPES, CACHE_FILE, CACHE_MAX_BYTES, GENERATION_CONFIG, MODEL_NAME,
+                             SYSTEM_INSTRUCTION, build_prompt)
+from gemini_client import GeminiError, configure, generate_async, get_model
+from response_cache import DEFAULT_CACHE_DIR, ResponseCache, make_request_key
+from spec_compactor import compact_spec
+
+
+SPEC_EXTENSIONS = ('.yaml', '.yml', '.json', '.md', '.markdown', '.txt', '.rst')
+PROMPT_OPTIONS = ('app_type', 'complexity', 'include_tests', 'include_docs', 'include_error_handling')
+
+
+def load_items(source, defaults):
+    """Spec items from a folder or a JSONL file, with CLI options as defaults."""
+    items = []
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(SPEC_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    item_id = os.path.splitext(os.path.relpath(path, source))[0]
+                    items.append(dict(defaults, id=item_id, path=path))
+    else:
+        base = os.path.dirname(source)
+        with open(source, encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                raw = json.loads(line)
+                if 'documentation' not in raw and 'path' not in raw:
+                    raise ValueError(f"{source}:{line_no}: needs 'documentation' or 'path'")
+                item = dict(defaults, **raw)
+                if 'path' in item:
+                    item['path'] = os.path.join(base, item['path'])
+                item.setdefault('id', os.path.splitext(os.path.basename(item['path']))[0]
+                                if 'path' in item else f"line-{line_no}")
+                items.append(item)
+
+    ids = [item['id'] for item in items]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate ids: {', '.join(duplicates)}")
+    return items
+
+
+def completed_ids(out_path):
+    """Ids with a successful result already in the output file."""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # half-written line from a killed run
+            if record.get('status') == 'ok':
+                done.add(record.get('id'))
+    return done
+
+
+def usage_of(response):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return {}
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_token_count', None),
+        'output_tokens': getattr(usage, 'candidates_token_count', None),
+        'total_tokens': getattr(usage, 'total_token_count', None),
+    }
+
+
+async def run_item(model, cache, item, semaphore, compact=True):
+    """Generate one app. Always returns a result record, never raises."""
+    record = {'id': item['id'], 'app_type': item['app_type'], 'complexity': item['complexity']}
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            documentation = item.get('documentation')
+            if documentation is None:
+                with open(item['path'], encoding='utf-8') as f:
+                    documentation = f.read()
+            spec = compact_spec(documentation) if compact else None
+            if spec is not None:
+                documentation = spec.text
+                record['spec_tokens'] = [spec.original_tokens, spec.tokens]
+            prompt = build_prompt(documentation, **{k: item[k] for k in PROMPT_OPTIONS})
+
+            cache_key = make_request_key(MODEL_NAME, prompt, SYSTEM_INSTRUCTION, GENERATION_CONFIG)
+            # SQLite reads and writes stay off the event loop so other items keep streaming
+            text = await asyncio.to_thread(cache.get, cache_key) if cache is not None else None
+            if text is not None:
+                record.update(status='ok', source='cache')
+            else:
+                response = await generate_async(
+                    model, prompt,
+                    generation_config=GENERATION_CONFIG,
+                    session_id='doc2app-batch'
+                )
+                text = response.text
+                record.update(status='ok', source='api', **usage_of(response))
+                if cache is not None:
+                    await asyncio.to_thread(cache.add_sample, cache_key, text)
+            record['text'] = text
+        except GeminiError as e:
+            record.update(status='error', error=f"{e.kind}: {e.original}")
+        except Exception as e:
+            record.update(status='error', error=str(e))
+        record['latency_s'] = round(time.perf_counter() - started, 3)
+    return record
+
+
+async def run_batch(model, cache, items, concurrency, out_path, compact=True):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [asyncio.ensure_future(run_item(model, cache, item, semaphore, compact)) for item in items]
+    failures = 0
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    # Appending one flushed line per result keeps finished work if we get killed
+    with open(out_path, 'a', encoding='utf-8') as out:
+        for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+            record = await task
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            if record['status'] == 'ok':
+                tokens = record.get('total_tokens')
+                usage = f", {tokens:,} tokens" if tokens else ""
+                print(f"[{done}/{len(items)}] ok    {record['id']} "
+                      f"({record['latency_s']:.1f}s, {record['source']}{usage})")
+            else:
+                failures += 1
+                print(f"[{done}/{len(items)}] FAIL  {record['id']}: {record['error']}", file=sys.stderr)
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch application generation with Doc2App")
+    parser.add_argument('source', help="Folder of spec files or a JSONL file of items")
+    parser.add_argument('--out', default='doc2app_results.jsonl', help="Result JSONL (default: %(default)s)")
+    parser.add_argument('--app-type', choices=APP_TYPES, default=APP_TYPES[0],
+                        help="Default app type for items that don't set one")
+    parser.add_argument('--complexity', type=int, choices=range(1, 6), default=3)
+    parser.add_argument('--no-tests', action='store_true')
+    parser.add_argument('--no-docs', action='store_true')
+    parser.add_argument('--no-error-handling', action='store_true')
+    parser.add_argument('-j', '--concurrency', type=int, default=4, help="Parallel requests (default: %(default)s)")
+    parser.add_argument('--no-compact', action='store_true', help="Send OpenAPI specs as-is instead of compacted")
+    parser.add_argument('--no-cache', action='store_true', help="Skip the shared response cache")
+    parser.add_argument('--force', action='store_true', help="Regenerate ids that already succeeded")
+    parser.add_argument('--api-key', default=None, help="Defaults to GEMINI_API_KEY")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+
+    api_key = args.api_key or os.getenv('GEMINI_API_KEY', '')
+    if not api_key:
+        print("No API key - set GEMINI_API_KEY or pass --api-key", file=sys.stderr)
+        return 2
+    configure(api_key)
+    model = get_model(api_key, MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(path=os.path.join(DEFAULT_CACHE_DIR, CACHE_FILE), max_disk_bytes=CACHE_MAX_BYTES)
+
+    defaults = {
+        'app_type': args.app_type,
+        'complexity': args.complexity,
+        'include_tests': not args.no_tests,
+        'include_docs': not args.no_docs,
+        'include_error_handling': not args.no_error_handling,
+    }
+    try:
+        items = load_items(args.source, defaults)
+    except (OSError, ValueError) as e:
+        print(f"Can't read {args.source}: {e}", file=sys.stderr)
+        return 2
+
+    done = set() if args.force else completed_ids(args.out)
+    jobs = [item for item in items if item['id'] not in done]
+    print(f"{len(jobs)} spec(s) to generate, {len(items) - len(jobs)} already done → {args.out}")
+    if not jobs:
+        return 0
+
+    started = time.perf_counter()
+    failures = asyncio.run(run_batch(model, cache, jobs, args.concurrency, args.out,
+                                        compact=not args.no_compact))
+    print(f"Done in {time.perf_counter() - started:.0f}s - {len(jobs) - failures} generated, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,18 +13,62 @@ API docs into actual working code. Pretty cool stuff!
 """
 
 import streamlit as st
-import google.generativeai as genai
 from dotenv import load_dotenv
 import os
 import time
+import uuid
+
+from app_planner import DEFAULT_MAX_WORKERS as PLAN_WORKERS, assemble, generate_files, make_plan
+from call_metrics import get_metrics, record_cache_hit, start_call
+from context_cache import CACHED_DOCUMENTATION, DEFAULT_TTL, MIN_CACHE_TOKENS, get_context_registry
+from doc2app_prompts import (APP_TYPES, CACHE_FILE, CACHE_MAX_BYTES, GENERATION_CONFIG, MODEL_NAME,
+                             PROMPT_TEMPLATE, SYSTEM_INSTRUCTION, build_prompt)
+from doc_chunker import (DEFAULT_CHUNK_CHARS, DEFAULT_CHUNK_THRESHOLD, DEFAULT_MAX_WORKERS,
+                         build_condensed_documentation, extract_contracts, split_documentation)
+from gemini_client import GeminiError, configure, get_model
+from incremental import option_delta, patch_previous, previous_result
+from preflight import CONTEXT_LIMIT, compact_text, estimate_request, fit_text_to_budget, rough_token_count
+from project_files import ProjectBuilder, parse_project
+from rate_limiter import get_limiter
+from response_cache import DEFAULT_CACHE_DIR, ResponseCache, make_key, make_request_key
+from result_store import ResultHistory
+from single_flight import generate_shared, get_single_flight
+from spec_compactor import compact_spec
+from streaming import StreamResult, finish_blocking, stream_to_placeholder
 
 # Load environment variables first thing
 load_dotenv()
 
 # Configure Gemini API - had to do this early or get weird errors
+# (configure() is a no-op when the key hasn't changed since the last rerun)
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    configure(GEMINI_API_KEY)
+
+# Typical output size - used for the latency/cost estimate before generating
+EXPECTED_OUTPUT_TOKENS = 6000
+
+
+@st.cache_data(ttl=600, show_spinner=False, max_entries=32)
+def exact_estimate(text, _api_key):
+    # count_tokens is a network call - only redo it when the text changes
+    model = get_model(_api_key, MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+    return estimate_request(text, EXPECTED_OUTPUT_TOKENS, model=model)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def compacted_spec(text):
+    # Parsing a multi-MB spec on every rerun adds up - only redo it when the text changes
+    return compact_spec(text)
+
+
+@st.cache_resource
+def get_response_cache():
+    # Shared by all sessions, survives restarts (SQLite under .cache/)
+    return ResponseCache(
+        path=os.path.join(DEFAULT_CACHE_DIR, CACHE_FILE),
+        max_disk_bytes=CACHE_MAX_BYTES
+    )
 
 # TODO: Maybe add more page config options later?
 st.set_page_config(
@@ -33,6 +77,16 @@ st.set_page_config(
     layout="wide"  # wide layout works better for code display
 )
 
+# Stable id per browser session - the shared rate limiter queues fairly per session
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+SESSION_ID = st.session_state.session_id
+
+# Past generations for this session - they survive reruns (and the download click)
+if 'history' not in st.session_state:
+    st.session_state.history = ResultHistory(SESSION_ID)
+history = st.session_state.history
+
 # CSS Styling - spent way too much time on this gradient lol
 # But it looks nice so worth it!
 st.markdown("""
@@ -92,10 +146,101 @@ with st.sidebar:
     )
     
     if api_key:
-        genai.configure(api_key=api_key)
+        configure(api_key)
         st.success("✅ API Key configured")
     else:
         st.warning("⚠️ Please enter your Gemini API key")
+
+    # Shared quota across every session in this process (see rate_limiter.py)
+    limiter = get_limiter()
+    if limiter is not None:
+        quota = limiter.snapshot()
+        st.caption(
+            f"📶 Shared quota: {quota['requests_available']}/{quota['rpm']} requests, "
+            f"{quota['tokens_available']:,}/{quota['tpm']:,} tokens available • {quota['queued']} queued"
+        )
+    
+    st.divider()
+    
+    # Cache controls - same docs + same options can skip the API entirely
+    st.header("⚡ Response Cache")
+    cache_mode = st.radio(
+        "When this exact request was generated before",
+        ["Reuse cached result", "Force fresh generation"],
+        help="Force fresh still stores the new result as an extra variant"
+    )
+    cache_stats = get_response_cache().stats()
+    st.caption(
+        f"Hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits / {cache_stats['misses']} misses) • "
+        f"{cache_stats['disk_keys']} prompts, {cache_stats['disk_entries']} variants, "
+        f"{cache_stats['disk_bytes'] / (1024 * 1024):.1f} / {CACHE_MAX_BYTES / (1024 * 1024):.0f} MB"
+    )
+    flight_stats = get_single_flight().stats()
+    if flight_stats['shared']:
+        st.caption(f"🔗 {flight_stats['shared']} identical request(s) shared an in-flight call")
+    
+    # Streaming shows code as it's written instead of after a 30-60s spinner
+    stream_output = st.checkbox("Stream output while generating", value=True)
+    
+    # Only tests / docs / error handling / complexity changed - patch the last app instead
+    incremental_updates = st.checkbox(
+        "Patch the last result when only options change", value=True,
+        help="Asks for a diff against the previous app for the same docs and app type; "
+             "regenerates in full when it doesn't apply"
+    )
+    
+    # Plan mode: one call lists the files, then each file is its own call - no
+    # more Full Stack apps cut off at the 8192-token output cap
+    plan_mode = st.checkbox(
+        "Plan first, then write files in parallel", value=False,
+        help="Beats the per-call output limit for big apps. Every file call re-sends the docs, "
+             "and files are shown when done instead of streamed"
+    )
+    plan_workers = st.slider("Files written at once", 1, 8, PLAN_WORKERS, disabled=not plan_mode)
+    
+    st.divider()
+    
+    # Big docs get split on their structure and condensed in parallel first
+    st.header("📚 Large Documents")
+    chunk_mode = st.selectbox(
+        "Chunked processing",
+        [f"Auto (over {DEFAULT_CHUNK_THRESHOLD // 1000}k chars)", "Always", "Never"]
+    )
+    with st.expander("Chunking settings"):
+        chunk_chars = st.slider("Chunk size (chars)", 10000, 200000, DEFAULT_CHUNK_CHARS, step=10000)
+        chunk_workers = st.slider("Chunks processed at once", 1, 8, DEFAULT_MAX_WORKERS)
+    
+    # Same big doc, different options: upload it once, then only send the options
+    context_caching = st.checkbox(
+        f"Cache big docs on Gemini (over {MIN_CACHE_TOKENS // 1000}k tokens)", value=True,
+        help="Gemini context caching - later variations reuse the uploaded docs at a fraction of the input cost"
+    )
+    context_ttl = st.slider("Doc cache lifetime (min)", 5, 240, DEFAULT_TTL // 60, step=5, disabled=not context_caching)
+    context_stats = get_context_registry().stats()
+    if context_stats['caches']:
+        st.caption(
+            f"🧠 {context_stats['caches']} cached docs ({context_stats['tokens']:,} tokens) • "
+            f"{context_stats['uploads']} uploads, {context_stats['reuses']} reuses"
+        )
+    
+    def wants_chunking(text):
+        return chunk_mode == "Always" or (chunk_mode.startswith("Auto") and len(text) > DEFAULT_CHUNK_THRESHOLD)
+    
+    st.divider()
+    
+    # Pre-flight: know the size (and cost) before waiting a minute for an error
+    st.header("📏 Pre-flight")
+    token_budget = st.number_input(
+        "Input token budget", min_value=10000, max_value=CONTEXT_LIMIT,
+        value=900000, step=10000,
+        help="Inputs above this are compacted (whitespace/boilerplate) and then truncated"
+    )
+    compact_specs = st.checkbox(
+        "Compact OpenAPI specs", value=True,
+        help="Rewrites JSON/YAML OpenAPI specs as a terse listing: shared schemas once, no examples or x-* fields"
+    )
+    auto_trim = st.checkbox("Auto-trim input to fit the budget", value=True)
+    exact_counts = st.checkbox("Exact token counts (count_tokens API)", value=False)
     
     st.divider()
     
@@ -113,6 +258,122 @@ with st.sidebar:
     - Learning new frameworks
     """)
 
+@st.cache_data(show_spinner=False, max_entries=16)
+def project_for(text, default_name):
+    # Every click in the file browser reruns the script - parse each answer once
+    return parse_project(text, default_name)
+
+
+def show_project(project, key):
+    # The generated files one at a time, and the whole tree as a real ZIP
+    st.caption(f"📦 {len(project)} files • {project.total_bytes / 1024:.1f} KB")
+    paths = [f.path for f in project.files]
+    picked = st.selectbox("File", paths, key=f"file-{key}")
+    st.code(project.read(picked), language=project.files[paths.index(picked)].language)
+    st.download_button(
+        label="📦 Download Project (ZIP)",
+        data=project.zip_data,
+        file_name="generated_app.zip",
+        mime="application/zip",
+        key=f"zip-{key}"
+    )
+
+
+def generate_planned(model, documentation, prompt_options, started, output_area, retry_area):
+    # Plan mode (see app_planner.py): manifest first, then every file concurrently
+    plan = make_plan(
+        model, documentation, session_id=SESSION_ID, feature='doc2app.plan',
+        on_retry=lambda n, kind, delay: retry_area.caption(
+            f"🔁 Planning retry {n} after {kind.replace('_', ' ')} - waiting {delay:.1f}s"
+        ),
+        **prompt_options
+    )
+    with st.expander(f"🧩 Plan: {len(plan.files)} files (ready after {time.perf_counter() - started:.1f}s)"):
+        st.markdown(plan.summary)
+        st.dataframe([{'file': f.path, 'purpose': f.purpose} for f in plan.files],
+                     hide_index=True, use_container_width=True)
+    
+    total = len(plan.files)
+    progress = st.progress(0.0, text=f"Writing {total} files...")
+    contents = [None] * total
+    first_done = None
+    failed = []
+    continued = 0
+    for done, (idx, content, seconds, continuations, error) in enumerate(
+        generate_files(model, plan, documentation, prompt_options['app_type'], GENERATION_CONFIG,
+                       max_workers=plan_workers, session_id=SESSION_ID, feature='doc2app.file'),
+        start=1
+    ):
+        path = plan.files[idx].path
+        if error is not None:
+            failed.append(path)
+        else:
+            contents[idx] = content
+            continued += continuations
+            if first_done is None:
+                first_done = time.perf_counter() - started
+        progress.progress(done / total, text=f"Wrote {done}/{total} files (last: {path})")
+    if len(failed) == total:
+        raise RuntimeError("Could not generate any of the planned files")
+    if failed or continued:
+        st.caption(
+            (f"⚠️ Failed, skipped: {', '.join(failed)}" if failed else "") +
+            (" • " if failed and continued else "") +
+            (f"➕ {continued} continuation call(s) for files that hit the output limit" if continued else "")
+        )
+    
+    text = assemble(plan, contents)
+    output_area.code(text, language="markdown")
+    return StreamResult(text, first_done, time.perf_counter() - started, chunks=total - len(failed))
+
+
+def patch_from_history(base, options, status_area, retry_area):
+    # Same docs and app type, different options: a diff against the last app (None = regenerate)
+    previous = previous_result(history.entries('doc2app'), base, options)
+    if previous is None:
+        return None
+    delta = option_delta(previous.inputs['options'], options)
+    status_area.info(f"🩹 Only {', '.join(name for name, _, _ in delta)} changed - patching the last result...")
+    patched = patch_previous(
+        get_model(api_key, MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION), previous.text, delta,
+        session_id=SESSION_ID, feature='doc2app.patch',
+        on_retry=lambda n, kind, delay: retry_area.caption(
+            f"🔁 Retry {n} after {kind.replace('_', ' ')} - waiting {delay:.1f}s"
+        ),
+        on_queue=lambda position, wait: retry_area.info(
+            f"⏳ Waiting for shared Gemini quota - #{position} in queue, ~{wait:.0f}s"
+        )
+    )
+    retry_area.empty()
+    if patched is None:
+        st.caption("↩️ Patching didn't work out - regenerating in full")
+    return patched
+
+
+def show_saved_result(entry):
+    # Re-render a generation from the session history (no API call)
+    text = entry.text
+    if text is None:
+        st.warning("⚠️ This result is no longer available")
+        return
+    timing = entry.timing_caption()
+    st.caption(f"🕘 {entry.label()}" + (f" • {timing}" if timing else ""))
+    project = project_for(text, "generated_app.py")
+    if len(project) > 1:
+        show_project(project, entry.id)
+        with st.expander("📄 Full response"):
+            st.code(text, language=entry.language or "python")
+    else:
+        st.code(text, language=entry.language or "python")
+    st.download_button(
+        label="📥 Download Generated Code" if len(project) == 1 else "📄 Download Full Response",
+        data=text,
+        file_name=entry.file_name or "generated_app.py",
+        mime="text/plain",
+        key=f"download-{entry.id}"
+    )
+
+
 # Main content area - using tabs for better organization
 tab1, tab2, tab3 = st.tabs(["📝 Generate App", "🎯 Examples", "📚 How It Works"])
 
@@ -138,7 +399,7 @@ with tab1:
         # Framework selection - might add more later
         app_type = st.selectbox(
             "Application Type",
-            ["Web App (Streamlit)", "REST API (FastAPI)", "CLI Tool", "Full Stack (React + FastAPI)"]
+            APP_TYPES
         )
         
         # Feature toggles
@@ -152,7 +413,22 @@ with tab1:
         complexity = st.slider("Complexity Level", 1, 5, 3)
     
     # Generate button - disabled if no API key or docs
-    if st.button("🚀 Generate Application", disabled=not api_key or not documentation):
+    # Size/latency/cost estimate right next to the button
+    if documentation:
+        spec = compacted_spec(documentation) if compact_specs else None
+        if spec is not None:
+            st.caption(spec.caption())
+        preview_text = PROMPT_TEMPLATE + (spec.text if spec is not None else documentation)
+        if exact_counts and api_key:
+            preflight = exact_estimate(preview_text, api_key)
+        else:
+            preflight = estimate_request(preview_text, EXPECTED_OUTPUT_TOKENS)
+        st.caption(preflight.caption())
+        if preflight.input_tokens > token_budget:
+            st.caption("✂️ Over budget - will be trimmed" if auto_trim else "⚠️ Over budget - enable auto-trim or chunking")
+    
+    generate_clicked = st.button("🚀 Generate Application", disabled=not api_key or not documentation)
+    if generate_clicked:
         if not api_key:
             st.error("Please configure your Gemini API key in the sidebar")
         elif not documentation:
@@ -162,69 +438,212 @@ with tab1:
             with st.spinner("✨ Gemini 3 Pro is analyzing and generating your application..."):
                 try:
                     # Build the prompt - this took some iteration to get right
-                    prompt = f"""You are an expert full-stack developer. Analyze the following documentation and generate a complete, production-ready application.
-
-DOCUMENTATION:
-{documentation}
-
-REQUIREMENTS:
-- Application Type: {app_type}
-- Include comprehensive tests: {include_tests}
-- Include detailed documentation: {include_docs}
-- Include robust error handling: {include_error_handling}
-- Complexity Level: {complexity}/5
-
-Generate a complete application with:
-1. Well-structured, clean code
-2. Proper file organization
-3. Requirements/dependencies file
-4. README with setup instructions
-5. Example usage
-6. Comments explaining key logic
-
-Make it production-ready, following best practices for the chosen framework.
-Provide the complete code for each file clearly labeled.
-"""
-                    
-                    # Initialize the model
-                    # Using GEMINI 2.5 FLASH - Fast and excellent free tier quotas! 🎯
-                    # Perfect for development and has great code generation capabilities
-                    model = genai.GenerativeModel(
-                        'models/gemini-2.5-flash',
-                        system_instruction="You are an expert software developer who creates production-ready, well-documented code. Focus on quality, best practices, and user experience."
-                    )
-                    
-                    # Generate the code
-                    # Temperature at 0.7 gives good balance between creativity and consistency
-                    response = model.generate_content(
-                        prompt,
-                        generation_config={
-                            'temperature': 0.7,
-                            'max_output_tokens': 8192,
-                        }
+                    prompt_options = dict(
+                        app_type=app_type,
+                        include_tests=include_tests,
+                        include_docs=include_docs,
+                        include_error_handling=include_error_handling,
+                        complexity=complexity
                     )
+                    if compact_specs:
+                        spec = compacted_spec(documentation)
+                        if spec is not None:
+                            documentation = spec.text
+                    if auto_trim:
+                        # Whitespace/boilerplate always go; truncation only when chunking
+                        # isn't going to condense the docs anyway
+                        original_chars = len(documentation)
+                        documentation = compact_text(documentation)
+                        if not wants_chunking(documentation):
+                            documentation, _ = fit_text_to_budget(
+                                documentation, token_budget,
+                                reserved_tokens=estimate_request(PROMPT_TEMPLATE, 0).input_tokens
+                            )
+                        if len(documentation) < original_chars:
+                            st.caption(f"✂️ Trimmed input from {original_chars:,} to {len(documentation):,} chars")
+                    use_chunking = wants_chunking(documentation)
+                    prompt = build_prompt(documentation, **prompt_options)
                     
-                    # Display the results
-                    st.success("✅ Application generated successfully!")
+                    cache = get_response_cache()
+                    cache_key = make_request_key(MODEL_NAME, prompt, SYSTEM_INSTRUCTION, GENERATION_CONFIG)
+                    if use_chunking:
+                        # Condensed output differs from a full-context run, keep them apart
+                        cache_key = make_key(cache_key, f"chunked:{chunk_chars}")
+                    if plan_mode:
+                        cache_key = make_key(cache_key, "planned")
+                    # Everything but the option toggles - results with the same base can be patched
+                    base_key = make_key(MODEL_NAME, app_type, documentation, str(use_chunking), str(plan_mode))
+                    options = {
+                        'Include Tests': include_tests,
+                        'Include Documentation': include_docs,
+                        'Error Handling': include_error_handling,
+                        'Complexity Level': complexity,
+                    }
+                    started = time.perf_counter()
+                    samples = cache.get_samples(cache_key) if cache_mode == "Reuse cached result" else []
                     
+                    status_area = st.empty()
                     st.markdown("### 📦 Generated Application")
-                    st.code(response.text, language="python")
+                    output_area = st.empty()
+                    
+                    # Files land in the ZIP as their code blocks close, while the answer streams
+                    builder = ProjectBuilder("generated_app.py")
+                    patched = None
+                    # Force fresh means a full run - a patch would still build on the old answer
+                    if not samples and incremental_updates and cache_mode == "Reuse cached result":
+                        patched = patch_from_history(base_key, options, status_area, st.empty())
+                    if samples:
+                        generated_code = samples[0]
+                        result = None
+                        output_area.code(generated_code, language="python")
+                        builder.feed(generated_code)
+                        record_cache_hit('doc2app', started)
+                        status_area.success(f"⚡ Loaded from cache in {(time.perf_counter() - started) * 1000:.0f} ms")
+                    elif patched is not None:
+                        result = patched
+                        generated_code = patched.text
+                        output_area.code(generated_code, language="python")
+                        builder.feed(generated_code)
+                        status_area.success("✅ Application updated!")
+                        st.caption(result.timing_caption())
+                    else:
+                        # Initialize the model (reused across reruns and sessions)
+                        # Perfect for development and has great code generation capabilities
+                        model = get_model(api_key, MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION)
+                        retry_area = st.empty()
+                        doc_context = documentation
+                        
+                        if use_chunking:
+                            # Huge docs: condense each structural chunk in parallel first
+                            chunks = split_documentation(documentation, max_chars=chunk_chars)
+                            progress = st.progress(0.0, text=f"Condensing {len(chunks)} documentation chunks...")
+                            contracts = [None] * len(chunks)
+                            failed = 0
+                            for done, (idx, contract, seconds, error) in enumerate(
+                                extract_contracts(get_model(api_key, MODEL_NAME), chunks, max_workers=chunk_workers,
+                                                  session_id=SESSION_ID, feature='doc2app.condense'),
+                                start=1
+                            ):
+                                contracts[idx] = contract
+                                failed += error is not None
+                                progress.progress(done / len(chunks), text=f"Condensed {done}/{len(chunks)} chunks")
+                            if failed == len(chunks):
+                                raise RuntimeError("Could not condense any documentation chunk")
+                            condensed = build_condensed_documentation(chunks, contracts)
+                            st.caption(
+                                f"📚 {len(documentation):,} chars → {len(condensed):,} chars of contracts "
+                                f"from {len(chunks)} chunks" + (f" ({failed} failed, skipped)" if failed else "")
+                            )
+                            prompt = build_prompt(condensed, **prompt_options)
+                            doc_context = condensed
+                        
+                        if context_caching:
+                            cached_docs = get_context_registry().get(
+                                api_key, MODEL_NAME, SYSTEM_INSTRUCTION, doc_context,
+                                rough_token_count(doc_context), ttl=context_ttl * 60
+                            )
+                            if cached_docs is not None:
+                                # The docs live server-side now - prompts only carry the options
+                                model = cached_docs.model
+                                doc_context = CACHED_DOCUMENTATION
+                                prompt = build_prompt(doc_context, **prompt_options)
+                                st.caption(cached_docs.caption())
+                        
+                        if plan_mode:
+                            result = generate_planned(model, doc_context, prompt_options, started,
+                                                      output_area, retry_area)
+                            builder.feed(result.text)
+                            # Keep it as another variant for this prompt
+                            cache.add_sample(cache_key, result.text)
+                        else:
+                            # Generate the code - streamed so the first lines show up right away
+                            # Sessions sending the same request meanwhile follow this call, and it
+                            # lands in the cache once (as another variant for this prompt)
+                            record = start_call('doc2app', prompt)
+                            response = generate_shared(
+                                cache_key if cache_mode == "Reuse cached result" else None,
+                                model,
+                                prompt,
+                                store=lambda text: cache.add_sample(cache_key, text),
+                                generation_config=GENERATION_CONFIG,
+                                stream=stream_output,
+                                on_retry=lambda n, kind, delay: retry_area.caption(
+                                    f"🔁 Retry {n} after {kind.replace('_', ' ')} - waiting {delay:.1f}s"
+                                ),
+                                session_id=SESSION_ID,
+                                on_queue=lambda position, wait: retry_area.info(
+                                    f"⏳ Waiting for shared Gemini quota - #{position} in queue, ~{wait:.0f}s"
+                                ),
+                                record=record
+                            )
+                            retry_area.empty()
+                            if stream_output:
+                                result = stream_to_placeholder(response, output_area, started, language="python",
+                                                               record=record, sink=builder)
+                            else:
+                                result = finish_blocking(response, started, record)
+                                output_area.code(result.text, language="python")
+                                builder.feed(result.text)
+                        generated_code = result.text
+                        
+                        # Display the results
+                        status_area.success("✅ Application generated successfully!")
+                        st.caption(result.timing_caption())
+                    
+                    project = builder.close()
+                    # Multi-file answers download as a ZIP; the raw text is then markdown, not .py
+                    file_name = "generated_app.md" if len(project) > 1 else "generated_app.py"
+                    entry = history.add(
+                        'doc2app', generated_code,
+                        title=f"{app_type} • complexity {complexity}",
+                        inputs=dict(prompt_options, documentation_chars=len(documentation),
+                                    base=base_key, options=options),
+                        result=result, source='cache' if samples else 'patch' if patched else 'api',
+                        language="python", file_name=file_name
+                    )
+                    
+                    if len(project) > 1:
+                        show_project(project, entry.id)
                     
                     # Download functionality - super useful
                     st.download_button(
-                        label="📥 Download Generated Code",
-                        data=response.text,
-                        file_name="generated_app.py",
-                        mime="text/plain"
+                        label="📥 Download Generated Code" if len(project) == 1 else "📄 Download Full Response",
+                        data=generated_code,
+                        file_name=file_name,
+                        mime="text/plain",
+                        key=f"download-{entry.id}"
                     )
                     
+                    # Older variants of the same request (from earlier force-fresh runs)
+                    if len(samples) > 1:
+                        with st.expander(f"🗂️ {len(samples) - 1} other cached variant(s)"):
+                            for n, variant in enumerate(samples[1:], start=2):
+                                st.markdown(f"**Variant {n}**")
+                                st.code(variant, language="python")
+                    
                     st.markdown("---")
                     st.info("💡 **Next Steps:** Copy the code, set up your environment, and run the application!")
                     
+                except GeminiError as e:
+                    st.error(f"❌ {e.user_message}")
+                    with st.expander("Error details"):
+                        st.code(f"{e.kind} after {e.attempts} attempt(s): {e.original}", language="text")
                 except Exception as e:
-                    # Error handling - catching everything for now
+                    # Anything that isn't an API error (bad input, parsing...)
                     st.error(f"❌ Error: {str(e)}")
                     st.info("Try with a smaller input or check your API key")
+    
+    # The last result stays on screen across reruns instead of vanishing
+    latest = history.latest('doc2app')
+    if latest is not None and not generate_clicked:
+        st.markdown("### 📦 Generated Application")
+        show_saved_result(latest)
+    
+    earlier = history.entries('doc2app')[1:]
+    if earlier:
+        with st.expander(f"🕘 Earlier results this session ({len(earlier)})"):
+            picked = st.selectbox("Result", earlier, format_func=lambda e: e.label(), key="history_pick")
+            show_saved_result(picked)
 
 # TAB 2: Example use cases
 with tab2:
@@ -321,5 +740,20 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Call metrics - drawn last so the panel already includes this run's calls
+with st.sidebar:
+    with st.expander("📈 Call metrics"):
+        metrics = get_metrics()
+        rows = metrics.summary_rows()
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+            st.download_button("Prometheus metrics", metrics.prometheus_text(),
+                               file_name="gemini_metrics.prom", mime="text/plain")
+            st.download_button("Recent calls (JSONL)", metrics.jsonl(),
+                               file_name="gemini_calls.jsonl", mime="application/json")
+        else:
+            st.caption("No Gemini calls in this process yet")
+        if metrics.log_path:
+            st.caption(f"Every call is also logged to `{metrics.log_path}`")
+
 # Note to self: Test with different API docs tomorrow
-# Also maybe add caching for responses? Could save API calls
@@ -0,0 +1,63 @@
+"""
+Doc2App prompt and model settings, shared by the Streamlit app and the
+batch runner (doc2app_batch.py).
+"""
+
+import os
+
+from project_files import FILE_FORMAT_INSTRUCTION
+
+
+# Model settings live up here so the cache key always matches what we send
+# Using GEMINI 2.5 FLASH - Fast and excellent free tier quotas! 🎯
+MODEL_NAME = 'models/gemini-2.5-flash'
+SYSTEM_INSTRUCTION = "You are an expert software developer who creates production-ready, well-documented code. Focus on quality, best practices, and user experience."
+# Temperature at 0.7 gives good balance between creativity and consistency
+GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'max_output_tokens': 8192,
+}
+
+# The app and the batch runner write to the same cache file, so they share
+# one disk budget - big specs produce big outputs
+CACHE_FILE = 'doc2app.sqlite3'
+CACHE_MAX_BYTES = int(os.getenv('DOC2APP_CACHE_MAX_MB', '100')) * 1024 * 1024
+
+APP_TYPES = ["Web App (Streamlit)", "REST API (FastAPI)", "CLI Tool", "Full Stack (React + FastAPI)"]
+
+PROMPT_TEMPLATE = """You are an expert full-stack developer. Analyze the following documentation and generate a complete, production-ready application.
+
+DOCUMENTATION:
+{documentation}
+
+REQUIREMENTS:
+- Application Type: {app_type}
+- Include comprehensive tests: {include_tests}
+- Include detailed documentation: {include_docs}
+- Include robust error handling: {include_error_handling}
+- Complexity Level: {complexity}/5
+
+Generate a complete application with:
+1. Well-structured, clean code
+2. Proper file organization
+3. Requirements/dependencies file
+4. README with setup instructions
+5. Example usage
+6. Comments explaining key logic
+
+Make it production-ready, following best practices for the chosen framework.
+Provide the complete code for each file clearly labeled.
+""" + FILE_FORMAT_INSTRUCTION + "\n"
+
+
+def build_prompt(documentation, app_type=APP_TYPES[0], include_tests=True, include_docs=True,
+                 include_error_handling=True, complexity=3):
+    """Fill PROMPT_TEMPLATE exactly the way the app does."""
+    return PROMPT_TEMPLATE.format(
+        documentation=documentation,
+        app_type=app_type,
+        include_tests=include_tests,
+        include_docs=include_docs,
+        include_error_handling=include_error_handling,
+        complexity=complexity
+    )
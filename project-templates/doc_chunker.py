@@ -0,0 +1,298 @@
+"""
+Chunked processing for oversized documentation in Doc2App.
+
+Multi-MB vendor docs either blow past the context window or sit at max
+latency. So for big inputs we:
+
+1. split the docs on their structure - OpenAPI specs by tag (or first path
+   segment), everything else on Markdown headings
+2. extract compact endpoint contracts from every chunk in parallel
+3. feed the condensed contract (not the raw docs) to the final generation
+
+Chunk size and concurrency are both configurable from the sidebar.
+"""
+
+import json
+import re
+
+from call_metrics import start_call
+from fan_out import fan_out
+from gemini_client import BLOCKED, GeminiError, generate
+
+try:
+    import yaml  # optional - only needed for YAML OpenAPI specs
+except ImportError:
+    yaml = None
+
+
+DEFAULT_CHUNK_CHARS = 60000          # ~15k tokens per extraction call
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_CHUNK_THRESHOLD = 400000     # docs bigger than this get chunked automatically
+
+HTTP_METHODS = ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+
+EXTRACTION_CONFIG = {
+    'temperature': 0.1,
+    'max_output_tokens': 4096,
+}
+
+EXTRACTION_PROMPT = """You are condensing one section ({number} of {total}) of a large API documentation set
+so a code generator can use it later. Do NOT write application code.
+
+Extract, as terse bullet points:
+- ENDPOINTS: METHOD /path - purpose; params (name:type, required?); request body fields; response fields; error codes
+- AUTH: how requests are authenticated (if mentioned)
+- MODELS: data types and their fields (name:type)
+- RULES: rate limits, pagination, constraints, important behaviour
+
+Skip marketing text, repeated examples and anything not needed to implement a client or server.
+If the section has nothing relevant, answer "NONE".
+
+SECTION: {title}
+{text}"""
+
+
+class Chunk:
+    """One structural piece of the docs."""
+
+    def __init__(self, title, text):
+        self.title = title
+        self.text = text
+
+    def __len__(self):
+        return len(self.text)
+
+
+# === OpenAPI ===
+
+def parse_openapi(text):
+    """Return the spec dict if text is a JSON/YAML OpenAPI (or Swagger) doc, else None."""
+    stripped = text.lstrip()
+    spec = None
+    if stripped.startswith('{'):
+        try:
+            spec = json.loads(stripped)
+        except ValueError:
+            return None
+    elif yaml is not None and re.search(r'^(openapi|swagger)\s*:', stripped, re.MULTILINE):
+        try:
+            spec = yaml.safe_load(stripped)
+        except yaml.YAMLError:
+            return None
+    if isinstance(spec, dict) and isinstance(spec.get('paths'), dict):
+        return spec
+    return None
+
+
+def _collect_refs(node, found):
+    if isinstance(node, dict):
+        ref = node.get('$ref')
+        if isinstance(ref, str) and ref.startswith('#/'):
+            found.add(ref)
+        for value in node.values():
+            _collect_refs(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_refs(value, found)
+
+
+def resolve_pointer(spec, ref):
+    """Follow a local ref like '#/components/schemas/Pet' (None if it dangles)."""
+    node = spec
+    for part in ref[2:].split('/'):
+        part = part.replace('~1', '/').replace('~0', '~')
+        if not isinstance(node, dict) or part not in node:
+            return None
+        node = node[part]
+    return node
+
+
+def referenced_components(spec, node):
+    """Everything node $ref's, transitively, as {ref: object}."""
+    resolved = {}
+    pending = set()
+    _collect_refs(node, pending)
+    while pending:
+        ref = pending.pop()
+        if ref in resolved:
+            continue
+        target = resolve_pointer(spec, ref)
+        resolved[ref] = target
+        if target is not None:
+            more = set()
+            _collect_refs(target, more)
+            pending |= more - set(resolved)
+    return resolved
+
+
+def _operation_group(path, item):
+    # First tag of the first operation, falling back to the first path segment
+    for method in HTTP_METHODS:
+        op = item.get(method) if isinstance(item, dict) else None
+        if isinstance(op, dict) and op.get('tags'):
+            return str(op['tags'][0])
+    segment = path.strip('/').split('/')[0]
+    return segment or '/'
+
+
+def _openapi_chunk(spec, title, paths):
+    refs = referenced_components(spec, paths)
+    doc = {
+        'info': {k: v for k, v in (spec.get('info') or {}).items() if k in ('title', 'version')},
+        'servers': spec.get('servers') or spec.get('host'),
+        'paths': paths,
+        'referenced': {ref: obj for ref, obj in sorted(refs.items()) if obj is not None},
+    }
+    return Chunk(title, json.dumps(doc, separators=(',', ':'), default=str))
+
+
+def split_openapi(spec, max_chars=DEFAULT_CHUNK_CHARS):
+    """Group paths by tag, then pack groups into chunks of at most ~max_chars."""
+    groups = {}
+    for path, item in spec['paths'].items():
+        groups.setdefault(_operation_group(path, item), {})[path] = item
+
+    chunks = []
+    for group, paths in groups.items():
+        chunk = _openapi_chunk(spec, f"tag: {group}", paths)
+        if len(chunk) <= max_chars or len(paths) == 1:
+            chunks.append(chunk)
+            continue
+        # Group too big - split it path by path (sizing by the paths alone,
+        # re-serializing the whole batch for every path gets quadratic)
+        batch, size, part = {}, 0, 1
+        for path, item in paths.items():
+            item_size = len(json.dumps({path: item}, separators=(',', ':'), default=str))
+            if batch and size + item_size > max_chars:
+                chunks.append(_openapi_chunk(spec, f"tag: {group} (part {part})", batch))
+                batch, size, part = {}, 0, part + 1
+            batch[path] = item
+            size += item_size
+        if batch:
+            chunks.append(_openapi_chunk(spec, f"tag: {group} (part {part})", batch))
+    return chunks
+
+
+# === Markdown / plain text ===
+
+def _markdown_sections(text):
+    """Split on headings, keeping the heading trail as the section title."""
+    sections = []
+    trail = []
+    current = []
+    title = 'Introduction'
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if line.lstrip().startswith('```'):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line.rstrip('\n'))
+        if match:
+            if current:
+                sections.append(Chunk(title, ''.join(current)))
+            level = len(match.group(1))
+            trail = trail[:level - 1] + [match.group(2)]
+            title = ' > '.join(trail)
+            current = [line]
+        else:
+            current.append(line)
+    if current:
+        sections.append(Chunk(title, ''.join(current)))
+    return sections
+
+
+def _hard_split(section, max_chars):
+    # Oversized section: break on blank lines, then hard cut as a last resort
+    pieces = []
+    buf = ''
+    for para in re.split(r'(\n\s*\n)', section.text):
+        while len(para) > max_chars:
+            if buf:
+                pieces.append(buf)
+                buf = ''
+            pieces.append(para[:max_chars])
+            para = para[max_chars:]
+        if len(buf) + len(para) > max_chars:
+            pieces.append(buf)
+            buf = ''
+        buf += para
+    if buf.strip():
+        pieces.append(buf)
+    return [Chunk(f"{section.title} (part {i + 1})", piece) for i, piece in enumerate(pieces)]
+
+
+def split_markdown(text, max_chars=DEFAULT_CHUNK_CHARS):
+    """Pack consecutive heading sections into chunks of at most max_chars."""
+    chunks = []
+    titles = []
+    buf = []
+    size = 0
+    for section in _markdown_sections(text):
+        if len(section) > max_chars:
+            if buf:
+                chunks.append(Chunk(' | '.join(titles), ''.join(buf)))
+                titles, buf, size = [], [], 0
+            chunks.extend(_hard_split(section, max_chars))
+            continue
+        if size + len(section) > max_chars and buf:
+            chunks.append(Chunk(' | '.join(titles), ''.join(buf)))
+            titles, buf, size = [], [], 0
+        titles.append(section.title)
+        buf.append(section.text)
+        size += len(section)
+    if buf:
+        chunks.append(Chunk(' | '.join(titles), ''.join(buf)))
+    return chunks
+
+
+def split_documentation(text, max_chars=DEFAULT_CHUNK_CHARS):
+    """Structure-aware split: OpenAPI by tag, otherwise Markdown headings."""
+    spec = parse_openapi(text)
+    if spec is not None:
+        return split_openapi(spec, max_chars)
+    return split_markdown(text, max_chars)
+
+
+# === Parallel extraction ===
+
+def extract_contracts(model, chunks, max_workers=DEFAULT_MAX_WORKERS, session_id=None, feature=None):
+    """Condense every chunk concurrently.
+
+    Yields (index, contract, seconds, error) in completion order so the
+    caller can drive a progress bar from the main thread. All calls queue
+    under the caller's session_id in the shared limiter. With a feature
+    name every call is also recorded in call_metrics.
+    """
+    total = len(chunks)
+
+    def extract(index):
+        chunk = chunks[index]
+        prompt = EXTRACTION_PROMPT.format(number=index + 1, total=total, title=chunk.title, text=chunk.text)
+        record = start_call(feature, prompt) if feature else None
+        response = generate(model, prompt, generation_config=EXTRACTION_CONFIG,
+                            session_id=session_id, record=record)
+        try:
+            text = response.text
+        except ValueError as e:
+            # .text of a blocked or empty answer
+            if record is not None:
+                record.fail(BLOCKED)
+            raise GeminiError(BLOCKED, e) from e
+        if record is not None:
+            record.finish(response)
+        return text
+
+    return fan_out(extract, total, max_workers)
+
+
+def build_condensed_documentation(chunks, contracts):
+    """Stitch the per-chunk contracts back together in document order."""
+    blocks = []
+    for chunk, contract in zip(chunks, contracts):
+        if contract and contract.strip().upper() != 'NONE':
+            blocks.append(f"## {chunk.title}\n{contract.strip()}")
+    return (
+        "(Condensed from the full documentation - endpoint contracts, models and rules per section)\n\n"
+        + "\n\n".join(blocks)
+    )
@@ -0,0 +1,238 @@
+"""
+Offline stand-in for the SDK's GenerativeModel.
+
+Used by benchmark.py, and by both apps when GEMINI_FAKE=1 (any non-empty
+API key then works), so the whole pipeline - prompt building, image prep,
+limiter, retries, streaming and rendering - runs without a key or quota.
+Behaviour is configurable:
+
+- time to first token and output speed, with random jitter
+- streaming chunk cadence
+- error injection: a fraction of calls fail with 429 / 503 / timeout
+  before the first token, exactly where the real API fails
+
+The output is a deterministic multi-file "application" sized to the
+requested number of tokens, so downstream parsing has something real to
+chew on. Env settings are GEMINI_FAKE_<FIELD> for each FakeSettings field.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+try:
+    from google.api_core import exceptions as api_exceptions
+except ImportError:  # pragma: no cover - ships with google-generativeai
+    api_exceptions = None
+
+
+CHARS_PER_TOKEN = 4
+ERROR_KINDS = ('rate_limit', 'server', 'timeout')
+
+
+class FakeSettings:
+    """Knobs for the fake backend (all times in seconds)."""
+
+    FIELDS = {
+        'ttft': 0.8,                # time to first token
+        'tokens_per_second': 150.0,
+        'chunk_seconds': 0.1,       # stream cadence
+        'output_tokens': 1500,      # capped by max_output_tokens
+        'jitter': 0.2,              # +/- fraction applied to every delay
+        'error_rate': 0.0,          # 0..1, per attempt
+    }
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(self.FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown fake settings: {', '.join(sorted(unknown))}")
+        for name, default in self.FIELDS.items():
+            setattr(self, name, type(default)(overrides.get(name, default)))
+
+    @classmethod
+    def from_env(cls):
+        overrides = {}
+        for name in cls.FIELDS:
+            value = os.getenv(f"GEMINI_FAKE_{name.upper()}")
+            if value:
+                overrides[name] = value
+        return cls(**overrides)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def factory(self):
+        """model factory for gemini_client.set_model_factory()."""
+        return lambda model_name, system_instruction=None: FakeModel(model_name, system_instruction, self)
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class _TokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+class FakeChunk:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class _FinishReason:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Candidate:
+    def __init__(self, capped):
+        self.finish_reason = _FinishReason('MAX_TOKENS' if capped else 'STOP')
+
+
+class FakeResponse:
+    """Non-streamed response: .text, .usage_metadata and .candidates like the SDK's."""
+
+    def __init__(self, text, usage, capped=False):
+        self.text = text
+        self.usage_metadata = usage
+        self.candidates = [_Candidate(capped)]
+
+
+class FakeStream:
+    """Streamed response: iterate for chunks, .text / .usage_metadata once consumed."""
+
+    def __init__(self, pieces, usage, chunk_delay):
+        self._pieces = pieces
+        self._delay = chunk_delay
+        self._consumed = []
+        self.usage_metadata = usage
+
+    def __iter__(self):
+        for index, piece in enumerate(self._pieces):
+            if index:
+                time.sleep(self._delay())
+            self._consumed.append(piece)
+            # Like the SDK, the final chunk carries the usage for the whole call
+            yield FakeChunk(piece, self.usage_metadata if index == len(self._pieces) - 1 else None)
+
+    @property
+    def text(self):
+        if len(self._consumed) < len(self._pieces):
+            for _ in self:
+                pass
+        return ''.join(self._pieces)
+
+
+def fake_plan(seed):
+    """JSON file manifest for response_mime_type='application/json' requests."""
+    rng = random.Random(seed)
+    names = ['app.py', 'models.py', 'services.py', 'routes.py', 'utils.py', 'tests/test_app.py',
+             'requirements.txt', 'README.md']
+    files = [{'path': name, 'purpose': f"{name} for the generated app",
+              'interfaces': f"handler_{rng.randint(1, 99)}(request)"}
+             for name in names[:rng.randint(4, len(names))]]
+    return json.dumps({'summary': 'Generated application.', 'conventions': 'PEP 8', 'files': files})
+
+
+def fake_application(seed, tokens):
+    """Deterministic multi-file answer of roughly `tokens` tokens."""
+    rng = random.Random(seed)
+    budget = max(40, tokens) * CHARS_PER_TOKEN
+    names = ['app.py', 'models.py', 'services.py', 'routes.py', 'utils.py', 'tests/test_app.py']
+    per_file = max(200, budget // len(names))
+    blocks = ["Here's the complete application, split into files.\n"]
+    for name in names:
+        lines = [f'"""{name} - generated module."""', '']
+        size = 0
+        n = 0
+        while size < per_file:
+            n += 1
+            line = (f"def handler_{n}(request):\n"
+                    f"    \"\"\"Handle case {rng.randint(1, 999)}.\"\"\"\n"
+                    f"    return {{'status': 'ok', 'id': {rng.randint(1, 99999)}}}\n")
+            lines.append(line)
+            size += len(line)
+        blocks.append(f"### `{name}`\n```python\n" + '\n'.join(lines) + "```\n")
+    blocks.append("### `requirements.txt`\n```\nstreamlit>=1.28.0\n```\n")
+    return '\n'.join(blocks)[:budget]
+
+
+class FakeModel:
+    """Just enough of genai.GenerativeModel for our call sites."""
+
+    def __init__(self, model_name, system_instruction=None, settings=None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.settings = settings or FakeSettings()
+        self._rng = random.Random()
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _jittered(self, seconds):
+        with self._lock:
+            spread = self.settings.jitter
+            return max(0.0, seconds * self._rng.uniform(1 - spread, 1 + spread))
+
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            if self._rng.random() >= self.settings.error_rate:
+                return
+            kind = self._rng.choice(ERROR_KINDS)
+        if api_exceptions is None:
+            raise (TimeoutError if kind == 'timeout' else ConnectionError)(f"fake {kind}")
+        raise {
+            'rate_limit': api_exceptions.ResourceExhausted,
+            'server': api_exceptions.ServiceUnavailable,
+            'timeout': api_exceptions.DeadlineExceeded,
+        }[kind](f"fake {kind}")
+
+    def _answer(self, contents, generation_config):
+        """(text, usage, capped) - capped when output_tokens exceeds max_output_tokens."""
+        from gemini_client import rough_token_count
+        config = generation_config or {}
+        limit = config.get('max_output_tokens') or self.settings.output_tokens
+        tokens = min(self.settings.output_tokens, limit)
+        digest = hashlib.sha256(repr(contents).encode('utf-8', 'replace')).hexdigest()
+        if config.get('response_mime_type') == 'application/json':
+            text, capped = fake_plan(digest), False
+        else:
+            text, capped = fake_application(digest, tokens), tokens < self.settings.output_tokens
+        return text, _Usage(rough_token_count(contents), len(text) // CHARS_PER_TOKEN), capped
+
+    def _generation_seconds(self, text):
+        return len(text) / CHARS_PER_TOKEN / self.settings.tokens_per_second
+
+    def generate_content(self, contents, generation_config=None, stream=False, request_options=None, **_):
+        self._maybe_fail()
+        text, usage, capped = self._answer(contents, generation_config)
+        # Like the SDK, the call itself blocks until the first chunk is ready
+        time.sleep(self._jittered(self.settings.ttft))
+        if not stream:
+            time.sleep(self._jittered(self._generation_seconds(text)))
+            return FakeResponse(text, usage, capped)
+        step = max(1, int(self.settings.chunk_seconds * self.settings.tokens_per_second * CHARS_PER_TOKEN))
+        pieces = [text[i:i + step] for i in range(0, len(text), step)] or ['']
+        return FakeStream(pieces, usage, lambda: self._jittered(self.settings.chunk_seconds))
+
+    async def generate_content_async(self, contents, generation_config=None, request_options=None, **_):
+        self._maybe_fail()
+        text, usage, capped = self._answer(contents, generation_config)
+        await asyncio.sleep(self._jittered(self.settings.ttft + self._generation_seconds(text)))
+        return FakeResponse(text, usage, capped)
+
+    def count_tokens(self, contents, request_options=None):
+        from gemini_client import rough_token_count
+        return _TokenCount(rough_token_count(contents))
+
+    async def count_tokens_async(self, contents, request_options=None):
+        return self.count_tokens(contents)
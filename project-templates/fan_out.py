@@ -0,0 +1,58 @@
+"""
+Concurrent fan-out for the features that make several Gemini calls at once.
+
+The multi-image map step, doc chunk extraction, planned files, chunked
+refactors and multi-framework generation all run one call per item on a
+thread pool. Streamlit calls aren't allowed from worker threads, so the
+outcomes are handed back to the caller's thread as they happen, in
+completion order, and the caller draws progress from there.
+"""
+
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fan_out_events(work, total, max_workers):
+    """Run work(index, emit) for every index in range(total) concurrently.
+
+    Yields (kind, index, payload) on the caller's thread: whatever the
+    worker passes to emit(kind, payload) while it runs, then ('done', index,
+    result) or ('error', index, exception) once it returns.
+    """
+    events = queue.Queue()
+
+    def run(index):
+        try:
+            result = work(index, lambda kind, payload: events.put((kind, index, payload)))
+            events.put(('done', index, result))
+        except Exception as e:
+            events.put(('error', index, e))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as pool:
+        for index in range(total):
+            pool.submit(run, index)
+        finished = 0
+        while finished < total:
+            event = events.get()
+            if event[0] in ('done', 'error'):
+                finished += 1
+            yield event
+
+
+def fan_out(work, total, max_workers):
+    """Run work(index) for every index in range(total) concurrently.
+
+    Yields (index, result, seconds, error) as the calls finish; a failed
+    call has result None and its exception as error.
+    """
+    def timed(index, emit):
+        started = time.perf_counter()
+        return work(index), time.perf_counter() - started
+
+    for kind, index, payload in fan_out_events(timed, total, max_workers):
+        if kind == 'done':
+            result, seconds = payload
+            yield index, result, seconds, None
+        else:
+            yield index, None, 0.0, payload
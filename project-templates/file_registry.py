@@ -0,0 +1,255 @@
+"""
+Upload-once registry for CodeVision images (Gemini Files API).
+
+Every call used to carry its images inline - the same screenshot was
+re-serialized and re-sent when regenerating for another framework, in the
+multi-image map step and again in the refactor tab. Now each distinct
+image (by content hash, per API key) is uploaded once and later calls just
+reference the file:
+
+- the first use still goes inline - the upload runs in the background, so
+  nobody waits for it - and later uses send a file_data part instead
+- handles are kept in .cache/uploaded_files.json, so they survive restarts
+- Files API uploads live 48 hours; entries close to expiry, or whose file
+  has disappeared (checked at most every VERIFY_SECONDS), are dropped and
+  uploaded again transparently
+- images under MIN_UPLOAD_BYTES stay inline - the handle isn't worth a
+  round trip
+
+GeminiFileBackend talks to the API; LocalFileBackend is the stand-in used
+with the fake model (tests, GEMINI_FAKE=1).
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+
+from gemini_client import configure, using_stand_in
+from image_cache import content_key
+from response_cache import DEFAULT_CACHE_DIR
+
+
+FILE_LIFETIME = 48 * 3600            # what the Files API keeps uploads for
+EXPIRY_MARGIN = 3600                 # re-upload rather than risk expiring mid-call
+VERIFY_SECONDS = 15 * 60             # how stale our "it still exists" knowledge may get
+MIN_UPLOAD_BYTES = int(os.getenv('CODEVISION_UPLOAD_MIN_KB', '32')) * 1024
+UPLOAD_WORKERS = 2
+UPLOAD_TIMEOUT = 60                  # seconds wait=True blocks before falling back to inline
+REGISTRY_PATH = os.path.join(DEFAULT_CACHE_DIR, 'uploaded_files.json')
+
+
+def _owner(api_key):
+    # Uploads belong to the key's project - never store the key itself
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+class UploadedFile:
+    def __init__(self, name, uri, mime_type, size, expires_at, verified_at=None):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        self.size = size
+        self.expires_at = expires_at
+        self.verified_at = verified_at or time.time()
+
+    def as_part(self):
+        return {'file_data': {'mime_type': self.mime_type, 'file_uri': self.uri}}
+
+    def as_dict(self):
+        return {'name': self.name, 'uri': self.uri, 'mime_type': self.mime_type, 'size': self.size,
+                'expires_at': self.expires_at, 'verified_at': self.verified_at}
+
+
+# === Backends ===
+
+class GeminiFileBackend:
+    """google.generativeai upload_file / get_file."""
+
+    def upload(self, api_key, data, mime_type):
+        configure(api_key)
+        uploaded = genai.upload_file(io.BytesIO(data), mime_type=mime_type,
+                                     display_name=f"codevision-{content_key(data)[:12]}")
+        expires = getattr(uploaded, 'expiration_time', None)
+        expires_at = expires.timestamp() if expires is not None else time.time() + FILE_LIFETIME
+        return uploaded.name, uploaded.uri, expires_at
+
+    def exists(self, api_key, name):
+        configure(api_key)
+        try:
+            return genai.get_file(name).state.name != 'FAILED'
+        except Exception:
+            return False
+
+
+class LocalFileBackend:
+    """In-process stand-in - keeps the bytes, hands out local:// URIs."""
+
+    def __init__(self):
+        self._files = {}
+
+    def upload(self, api_key, data, mime_type):
+        name = f"files/local-{content_key(data)[:16]}"
+        self._files[name] = data
+        return name, f"local://{name}", time.time() + FILE_LIFETIME
+
+    def exists(self, api_key, name):
+        return name in self._files
+
+    def delete(self, name):
+        # Tests use this to simulate the server dropping a file
+        self._files.pop(name, None)
+
+
+# === Registry ===
+
+class FileRegistry:
+    """(api key, image hash) -> uploaded file handle."""
+
+    def __init__(self, backend, path=REGISTRY_PATH, min_bytes=MIN_UPLOAD_BYTES, background=True):
+        self.backend = backend
+        self.path = path
+        self.min_bytes = min_bytes
+        self._entries = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) if background else None
+        self.uploads = 0
+        self.reuses = 0
+        self.bytes_saved = 0
+        self.failures = 0
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, raw in data.items():
+            if raw.get('expires_at', 0) - EXPIRY_MARGIN > now:
+                self._entries[key] = UploadedFile(**raw)
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + '.part'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({key: e.as_dict() for key, e in self._entries.items()}, f)
+        os.replace(tmp, self.path)
+
+    def part(self, api_key, data, mime_type, wait=False):
+        """file_data part if this image is uploaded, otherwise the inline blob (and upload it).
+
+        wait=True uploads before returning - worth it when several concurrent
+        calls are about to send the same image (see multi_framework.py).
+        """
+        if len(data) < self.min_bytes:
+            return {'mime_type': mime_type, 'data': data}
+        key = f"{_owner(api_key)}:{content_key(data)}"
+        entry = self._usable(key, api_key)
+        if entry is not None:
+            with self._lock:
+                self.reuses += 1
+                self.bytes_saved += len(data)
+            return entry.as_part()
+        self._schedule(key, api_key, data, mime_type)
+        if wait and self._wait_for(key):
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry.as_part()
+        return {'mime_type': mime_type, 'data': data}
+
+    def _usable(self, key, api_key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = time.time()
+        stale = entry.expires_at - EXPIRY_MARGIN <= now
+        if not stale and now - entry.verified_at > VERIFY_SECONDS:
+            stale = not self.backend.exists(api_key, entry.name)
+            entry.verified_at = now
+        if stale:
+            with self._lock:
+                self._entries.pop(key, None)
+                self._save()
+            return None
+        return entry
+
+    def _schedule(self, key, api_key, data, mime_type):
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        if self._pool is None:
+            self._upload(key, api_key, data, mime_type)
+        else:
+            self._pool.submit(self._upload, key, api_key, data, mime_type)
+
+    def _upload(self, key, api_key, data, mime_type):
+        try:
+            name, uri, expires_at = self.backend.upload(api_key, data, mime_type)
+        except Exception:
+            # Inline keeps working - we'll simply try again on the next use
+            with self._lock:
+                self.failures += 1
+                self._pending.discard(key)
+            return
+        with self._lock:
+            self._entries[key] = UploadedFile(name, uri, mime_type, len(data), expires_at)
+            self._pending.discard(key)
+            self.uploads += 1
+            self._save()
+
+    def _wait_for(self, key=None, timeout=UPLOAD_TIMEOUT):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                busy = key in self._pending if key is not None else bool(self._pending)
+            if not busy:
+                return True
+            time.sleep(0.02)
+        return False
+
+    def wait(self, timeout=UPLOAD_TIMEOUT):
+        """Block until queued uploads are done; False on timeout."""
+        return self._wait_for(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._entries),
+                'bytes': sum(e.size for e in self._entries.values()),
+                'uploads': self.uploads,
+                'reuses': self.reuses,
+                'bytes_saved': self.bytes_saved,
+                'pending': len(self._pending),
+                'failures': self.failures,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_file_registry():
+    """The shared registry for this process (local stand-in with the fake model)."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            if using_stand_in():
+                _registry = FileRegistry(LocalFileBackend(), path=None)
+            else:
+                _registry = FileRegistry(GeminiFileBackend())
+        return _registry
@@ -0,0 +1,392 @@
+"""
+Shared Gemini client layer for Doc2App and CodeVision.
+
+- configures the SDK only when the API key actually changes (not on every
+  Streamlit rerun)
+- caches GenerativeModel instances per (api_key, model, system_instruction)
+- applies a per-call timeout and an overall deadline
+- retries 429 / 5xx / timeouts with exponential backoff + full jitter
+- turns SDK exceptions into a GeminiError with a kind and a readable message
+- waits for the shared RPM/TPM limiter (rate_limiter.py) before every attempt
+- fills in the caller's CallRecord (call_metrics.py): retries, quota wait,
+  failures
+- GEMINI_FAKE=1 swaps the SDK for the offline stand-in in fake_gemini.py
+"""
+
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+
+import google.generativeai as genai
+
+from rate_limiter import QueueTimeout, get_limiter
+
+try:
+    from google.api_core import exceptions as api_exceptions
+except ImportError:  # pragma: no cover - ships with google-generativeai
+    api_exceptions = None
+
+try:
+    from requests import exceptions as requests_exceptions
+except ImportError:  # pragma: no cover - google-api-core depends on it
+    requests_exceptions = None
+
+
+DEFAULT_MODEL = 'models/gemini-2.5-flash'
+
+DEFAULT_TIMEOUT = 120.0       # seconds per attempt
+DEFAULT_DEADLINE = 300.0      # seconds across all attempts
+DEFAULT_MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# Error kinds - the UI maps these to friendlier hints
+RATE_LIMIT = 'rate_limit'
+SERVER = 'server'
+TIMEOUT = 'timeout'
+NETWORK = 'network'
+AUTH = 'auth'
+INVALID_REQUEST = 'invalid_request'
+BLOCKED = 'blocked'
+UNKNOWN = 'unknown'
+
+RETRYABLE_KINDS = {RATE_LIMIT, SERVER, TIMEOUT, NETWORK}
+
+# Transport failures worth retrying. Other OSErrors (a missing file, a
+# permission problem) won't go away by asking again.
+NETWORK_ERRORS = (ConnectionError, socket.gaierror, socket.herror)
+
+USER_MESSAGES = {
+    RATE_LIMIT: "Gemini quota exceeded (429) - wait a moment and try again.",
+    SERVER: "Gemini had a server error - try again shortly.",
+    TIMEOUT: "Gemini took too long to answer - try a smaller input or try again.",
+    NETWORK: "Could not reach Gemini - check your connection.",
+    AUTH: "The API key was rejected - check it in the sidebar.",
+    INVALID_REQUEST: "Gemini rejected the request - the input may be too large or malformed.",
+    BLOCKED: "The response was blocked by Gemini's safety filters.",
+    UNKNOWN: "Unexpected error while calling Gemini.",
+}
+
+
+class GeminiError(Exception):
+    """A classified Gemini failure."""
+
+    def __init__(self, kind, original, attempts=1):
+        super().__init__(f"{USER_MESSAGES[kind]} ({type(original).__name__}: {original})")
+        self.kind = kind
+        self.original = original
+        self.attempts = attempts
+
+    @property
+    def retryable(self):
+        return self.kind in RETRYABLE_KINDS
+
+    @property
+    def user_message(self):
+        return USER_MESSAGES[self.kind]
+
+
+def classify_error(exc):
+    """Map an SDK/transport exception to one of the error kinds above."""
+    if isinstance(exc, GeminiError):
+        return exc.kind
+    if api_exceptions is not None:
+        if isinstance(exc, (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)):
+            return RATE_LIMIT
+        if isinstance(exc, api_exceptions.DeadlineExceeded):
+            return TIMEOUT
+        if isinstance(exc, (api_exceptions.Unauthenticated, api_exceptions.PermissionDenied)):
+            return AUTH
+        if isinstance(exc, (api_exceptions.InternalServerError, api_exceptions.ServiceUnavailable,
+                            api_exceptions.BadGateway, api_exceptions.GatewayTimeout)):
+            return SERVER
+        if isinstance(exc, (api_exceptions.InvalidArgument, api_exceptions.BadRequest,
+                            api_exceptions.NotFound, api_exceptions.FailedPrecondition)):
+            return INVALID_REQUEST
+        if isinstance(exc, api_exceptions.GoogleAPICallError):
+            code = getattr(exc, 'code', None)
+            if code == 429:
+                return RATE_LIMIT
+            if isinstance(code, int) and code >= 500:
+                return SERVER
+    if requests_exceptions is not None:
+        # REST transport - these derive from OSError, not ConnectionError
+        if isinstance(exc, requests_exceptions.Timeout):
+            return TIMEOUT
+        if isinstance(exc, requests_exceptions.ConnectionError):
+            return NETWORK
+    if isinstance(exc, (TimeoutError,)):
+        return TIMEOUT
+    if isinstance(exc, NETWORK_ERRORS):
+        return NETWORK
+    name = type(exc).__name__
+    if 'BlockedPrompt' in name or 'StopCandidate' in name:
+        return BLOCKED
+    if 'API key' in str(exc) or 'API_KEY' in str(exc):
+        return AUTH
+    return UNKNOWN
+
+
+# === Configuration and model reuse ===
+
+_lock = threading.Lock()
+_configured_key = None
+_models = {}
+_model_factory = None
+
+
+def set_model_factory(factory):
+    """Build models with factory(model_name, system_instruction) instead of the SDK.
+
+    None restores the real SDK. Cached models are dropped either way.
+    """
+    global _model_factory
+    with _lock:
+        _model_factory = factory
+        _models.clear()
+
+
+def using_stand_in():
+    """True when models come from a factory (fake backend) rather than the SDK."""
+    return _model_factory is not None
+
+
+def configure(api_key):
+    """genai.configure(), but only when the key changes."""
+    global _configured_key
+    with _lock:
+        if api_key and api_key != _configured_key:
+            genai.configure(api_key=api_key)
+            _configured_key = api_key
+
+
+def get_model(api_key, model_name=DEFAULT_MODEL, system_instruction=None):
+    """Cached GenerativeModel for this key/model/system instruction."""
+    key = (api_key, model_name, system_instruction)
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+    if _model_factory is not None:
+        model = _model_factory(model_name, system_instruction)
+    else:
+        configure(api_key)
+        kwargs = {'system_instruction': system_instruction} if system_instruction else {}
+        model = genai.GenerativeModel(model_name, **kwargs)
+    with _lock:
+        return _models.setdefault(key, model)
+
+
+# === Token estimates ===
+
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS_GUESS = 1032     # 2x2 tiles - used when we can't read the image size
+
+
+def _image_part_tokens(part):
+    try:
+        import io
+        from PIL import Image
+        from image_prep import estimate_image_tokens
+        return estimate_image_tokens(*Image.open(io.BytesIO(part['data'])).size)
+    except Exception:
+        return IMAGE_TOKENS_GUESS
+
+
+def rough_token_count(contents):
+    """Local heuristic: ~4 chars per token for text, tile math for images."""
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = 0
+    for part in parts:
+        if isinstance(part, str):
+            total += len(part) // CHARS_PER_TOKEN + 1
+        elif isinstance(part, dict) and 'data' in part:
+            total += _image_part_tokens(part)
+        elif hasattr(part, 'size'):   # PIL image
+            from image_prep import estimate_image_tokens
+            total += estimate_image_tokens(*part.size)
+        else:
+            total += IMAGE_TOKENS_GUESS
+    return total
+
+
+def count_tokens(model, contents, timeout=10.0):
+    """Exact count via the count_tokens endpoint, heuristic if that fails."""
+    try:
+        return model.count_tokens(contents, request_options={'timeout': timeout}).total_tokens
+    except Exception:
+        return rough_token_count(contents)
+
+
+def _prompt_tokens_used(response):
+    usage = getattr(response, 'usage_metadata', None)
+    # Unset proto fields read as 0 - no real prompt is 0 tokens
+    return (getattr(usage, 'prompt_token_count', None) or None) if usage is not None else None
+
+
+class _SettledStream:
+    """A streamed response that settles the limiter once its final chunk is through."""
+
+    def __init__(self, response, limiter, estimated_tokens):
+        self._response = response
+        self._limiter = limiter
+        self._estimated_tokens = estimated_tokens
+
+    def __iter__(self):
+        last = None
+        for chunk in self._response:
+            last = chunk
+            yield chunk
+        # The final chunk carries the usage for the whole call
+        self._limiter.settle(self._estimated_tokens, _prompt_tokens_used(last))
+
+    def __getattr__(self, name):
+        # .text, .usage_metadata, .candidates... of the real response
+        return getattr(self._response, name)
+
+
+# === Calls ===
+
+def _record_wait(record, queued):
+    if record is not None:
+        record.queue_seconds += time.monotonic() - queued
+
+
+def _record_failure(record, kind, attempt):
+    if record is not None:
+        record.retries = attempt
+        record.fail(kind)
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Full-jitter exponential backoff (attempt 0 = first retry)."""
+    base = BACKOFF_BASE if base is None else base
+    cap = BACKOFF_CAP if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def generate(model, contents, generation_config=None, stream=False,
+             timeout=DEFAULT_TIMEOUT, deadline=DEFAULT_DEADLINE,
+             max_retries=DEFAULT_MAX_RETRIES, on_retry=None,
+             session_id=None, estimated_tokens=None, on_queue=None, record=None):
+    """model.generate_content() with timeouts, retries and error classification.
+
+    For streams only the initial request is retried - the SDK blocks on the
+    first chunk inside generate_content, so once we return chunks are
+    already flowing and a retry would duplicate output.
+    on_retry(attempt, kind, delay) is called before each backoff sleep.
+
+    Every attempt first waits its turn in the shared limiter, queued under
+    session_id; on_queue(position, expected_seconds) reports the wait.
+    Pass estimated_tokens if you already counted, otherwise the local
+    rough_token_count() estimate is charged - either way the bucket is
+    settled against usage_metadata once the answer is in (for streams,
+    when the final chunk has been read).
+
+    record (a call_metrics.CallRecord) gets retries and queue time, and is
+    finished here on failure. On success the caller finishes it once the
+    response has been consumed - only then are TTFT and usage known.
+    """
+    started = time.monotonic()
+    kwargs = {'stream': stream, 'request_options': {'timeout': timeout}}
+    if generation_config is not None:
+        kwargs['generation_config'] = generation_config
+
+    limiter = get_limiter()
+    if limiter is not None and estimated_tokens is None:
+        estimated_tokens = rough_token_count(contents)
+    if record is not None:
+        record.streamed = stream
+
+    attempt = 0
+    while True:
+        if limiter is not None:
+            queued = time.monotonic()
+            try:
+                limiter.acquire(session_id, estimated_tokens, on_wait=on_queue,
+                                timeout=max(0.0, deadline - (time.monotonic() - started)))
+            except QueueTimeout as e:
+                _record_wait(record, queued)
+                _record_failure(record, RATE_LIMIT, attempt)
+                raise GeminiError(RATE_LIMIT, e, attempts=attempt + 1) from e
+            _record_wait(record, queued)
+        try:
+            response = model.generate_content(contents, **kwargs)
+            if record is not None:
+                record.retries = attempt
+            if limiter is not None:
+                if stream:
+                    return _SettledStream(response, limiter, estimated_tokens)
+                limiter.settle(estimated_tokens, _prompt_tokens_used(response))
+            return response
+        except Exception as e:
+            kind = classify_error(e)
+            delay = backoff_delay(attempt)
+            out_of_time = time.monotonic() - started + delay > deadline
+            if kind not in RETRYABLE_KINDS or attempt >= max_retries or out_of_time:
+                _record_failure(record, kind, attempt)
+                raise GeminiError(kind, e, attempts=attempt + 1) from e
+            if on_retry is not None:
+                on_retry(attempt + 1, kind, delay)
+            time.sleep(delay)
+            attempt += 1
+
+
+async def generate_async(model, contents, generation_config=None,
+                         timeout=DEFAULT_TIMEOUT, deadline=DEFAULT_DEADLINE,
+                         max_retries=DEFAULT_MAX_RETRIES, session_id=None, estimated_tokens=None,
+                         record=None):
+    """Async twin of generate() built on generate_content_async (no streaming).
+
+    The limiter is thread-based, so waiting for quota happens in the default
+    executor instead of blocking the event loop. The estimate and record
+    are handled as in generate().
+    """
+    started = time.monotonic()
+    kwargs = {'request_options': {'timeout': timeout}}
+    if generation_config is not None:
+        kwargs['generation_config'] = generation_config
+
+    loop = asyncio.get_running_loop()
+    limiter = get_limiter()
+    if limiter is not None and estimated_tokens is None:
+        estimated_tokens = rough_token_count(contents)
+
+    attempt = 0
+    while True:
+        if limiter is not None:
+            remaining = max(0.0, deadline - (time.monotonic() - started))
+            queued = time.monotonic()
+            try:
+                await loop.run_in_executor(
+                    None, lambda: limiter.acquire(session_id, estimated_tokens, timeout=remaining)
+                )
+            except QueueTimeout as e:
+                _record_wait(record, queued)
+                _record_failure(record, RATE_LIMIT, attempt)
+                raise GeminiError(RATE_LIMIT, e, attempts=attempt + 1) from e
+            _record_wait(record, queued)
+        try:
+            response = await model.generate_content_async(contents, **kwargs)
+            if record is not None:
+                record.retries = attempt
+            if limiter is not None:
+                limiter.settle(estimated_tokens, _prompt_tokens_used(response))
+            return response
+        except Exception as e:
+            kind = classify_error(e)
+            delay = backoff_delay(attempt)
+            out_of_time = time.monotonic() - started + delay > deadline
+            if kind not in RETRYABLE_KINDS or attempt >= max_retries or out_of_time:
+                _record_failure(record, kind, attempt)
+                raise GeminiError(kind, e, attempts=attempt + 1) from e
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+if os.getenv('GEMINI_FAKE', '') not in ('', '0'):
+    from fake_gemini import FakeSettings
+    set_model_factory(FakeSettings.from_env().factory())
@@ -0,0 +1,130 @@
+"""
+Decoded image + preview thumbnail cache for the CodeVision UI.
+
+Streamlit reruns the whole script on every widget change, and each rerun
+used to decode every upload again and push full-resolution previews to
+the browser. With a dozen 4K screenshots that's seconds of CPU for a
+checkbox click. This keeps, per upload content hash:
+
+- the decoded image (EXIF orientation applied)
+- a small pre-encoded preview thumbnail for st.image
+- the original size and the dHash fingerprint (computed on first use)
+
+Shared by every session in the process, LRU-evicted under a memory cap
+(CODEVISION_IMAGE_CACHE_MB, default 256).
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from image_dedup import dhash_image
+from image_prep import flatten_alpha
+
+
+DEFAULT_MAX_BYTES = int(os.getenv('CODEVISION_IMAGE_CACHE_MB', '256')) * 1024 * 1024
+PREVIEW_EDGE = 640
+PREVIEW_QUALITY = 85
+
+
+def content_key(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class CachedImage:
+    """Everything the UI needs from one upload, decoded once."""
+
+    def __init__(self, key, image, size, thumbnail):
+        self.key = key
+        self.image = image          # None when it alone would blow the memory cap
+        self.size = size
+        self.thumbnail = thumbnail  # JPEG bytes, ready for st.image
+        self._fingerprint = None
+
+    @property
+    def nbytes(self):
+        decoded = 0
+        if self.image is not None:
+            decoded = self.image.width * self.image.height * len(self.image.getbands())
+        return decoded + len(self.thumbnail)
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            # The thumbnail is plenty for a 9x8 hash and already in memory
+            self._fingerprint = dhash_image(Image.open(io.BytesIO(self.thumbnail)))
+        return self._fingerprint
+
+
+def decode(data, key=None, keep_decoded=True):
+    """Build a CachedImage from raw upload bytes."""
+    img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    img.load()
+    preview = flatten_alpha(img)
+    if max(preview.size) > PREVIEW_EDGE:
+        preview = preview.copy()
+        preview.thumbnail((PREVIEW_EDGE, PREVIEW_EDGE), Image.LANCZOS)
+    buf = io.BytesIO()
+    preview.save(buf, format='JPEG', quality=PREVIEW_QUALITY)
+    return CachedImage(key or content_key(data), img if keep_decoded else None, img.size, buf.getvalue())
+
+
+class ImageCache:
+    """Thread-safe LRU of CachedImage by content hash, capped in bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, data):
+        """CachedImage for raw bytes, decoding only on a miss."""
+        key = content_key(data)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Decode outside the lock - other sessions shouldn't wait on our 4K PNG
+        entry = decode(data, key)
+        if entry.nbytes > self.max_bytes // 4:
+            # One huge image shouldn't flush everything else - keep just the thumbnail
+            entry.image = None
+
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key]
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'images': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,71 @@
+"""
+Near-duplicate detection for multi-image uploads.
+
+People drop the same screen more than once all the time - hover states,
+a page at two scroll offsets, the same export saved as PNG and JPG. Each
+of those costs a full set of image tokens and adds nothing.
+
+Every upload gets a 64-bit difference hash (dHash): shrink to 9x8 grey
+pixels and record whether each pixel is brighter than its right-hand
+neighbour. Scaling, re-encoding and small edits barely change it, so the
+Hamming distance between two hashes is a good "how similar" score. Images
+within the threshold of a group's first image join that group and only
+the first one is sent.
+"""
+
+from PIL import Image
+
+from image_prep import flatten_alpha
+
+
+HASH_SIZE = 8                # 8x8 comparisons -> 64-bit hash
+DEFAULT_THRESHOLD = 5        # out of 64 bits - catches re-exports and hover states
+MAX_THRESHOLD = 20
+
+
+def dhash_image(img, hash_size=HASH_SIZE):
+    """Difference hash of an already decoded PIL image."""
+    img = flatten_alpha(img).convert('L')
+    img = img.resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = list(img.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class DuplicateGroup:
+    """Upload indices that look the same; the first one is what gets sent."""
+
+    def __init__(self, representative, hash_value):
+        self.representative = representative
+        self.hash = hash_value
+        self.duplicates = {}     # index -> distance to the representative
+
+    @property
+    def members(self):
+        return [self.representative] + list(self.duplicates)
+
+
+def group_duplicates(hashes, threshold=DEFAULT_THRESHOLD):
+    """Greedy grouping in upload order: join the closest group within threshold."""
+    groups = []
+    for index, value in enumerate(hashes):
+        best, best_distance = None, threshold + 1
+        for group in groups:
+            distance = hamming(group.hash, value)
+            if distance < best_distance:
+                best, best_distance = group, distance
+        if best is None:
+            groups.append(DuplicateGroup(index, value))
+        else:
+            best.duplicates[index] = best_distance
+    return groups
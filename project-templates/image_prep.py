@@ -0,0 +1,155 @@
+"""
+Image preprocessing before images go to Gemini.
+
+Retina screenshots and 4K exports carry way more pixels than the model
+needs to recognise a UI, and every extra 768px tile costs tokens and
+upload time. So before each call we:
+
+1. apply the EXIF orientation (phone photos of whiteboards etc.)
+2. flatten transparency onto white
+3. downscale so the longest edge fits max_edge
+4. re-encode (WebP / JPEG / palette PNG) and keep whichever is smallest
+
+The result is passed as a raw blob so the SDK doesn't re-encode it again.
+"""
+
+import io
+import math
+
+from PIL import Image, ImageOps
+
+
+DEFAULT_MAX_EDGE = 1536     # 2x2 tiles at most - plenty for UI recognition
+DEFAULT_QUALITY = 80
+
+OUTPUT_FORMATS = ["Auto", "WebP", "JPEG", "PNG (palette)"]
+
+# Gemini bills small images as one tile, bigger ones as 768x768 tiles
+TOKENS_PER_TILE = 258
+SMALL_IMAGE_EDGE = 384
+TILE_EDGE = 768
+
+
+def estimate_image_tokens(width, height):
+    """Rough Gemini token cost of an image of the given size."""
+    if width <= SMALL_IMAGE_EDGE and height <= SMALL_IMAGE_EDGE:
+        return TOKENS_PER_TILE
+    return TOKENS_PER_TILE * math.ceil(width / TILE_EDGE) * math.ceil(height / TILE_EDGE)
+
+
+def _format_bytes(n):
+    if n >= 1024 * 1024:
+        return f"{n / (1024 * 1024):.1f} MB"
+    return f"{n / 1024:.0f} KB"
+
+
+class PreparedImage:
+    """An image ready to send, plus before/after numbers for the UI."""
+
+    def __init__(self, data, mime_type, size, original_bytes, original_size):
+        self.data = data
+        self.mime_type = mime_type
+        self.size = size
+        self.original_bytes = original_bytes
+        self.original_size = original_size
+
+    @property
+    def tokens(self):
+        return estimate_image_tokens(*self.size)
+
+    @property
+    def original_tokens(self):
+        return estimate_image_tokens(*self.original_size)
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+    @property
+    def tokens_saved(self):
+        return self.original_tokens - self.tokens
+
+    def as_part(self):
+        """Inline blob for generate_content - sent exactly as encoded here."""
+        return {'mime_type': self.mime_type, 'data': self.data}
+
+    def summary(self):
+        pct = 100 * self.bytes_saved / self.original_bytes if self.original_bytes else 0
+        return (
+            f"🗜️ {_format_bytes(self.original_bytes)} → {_format_bytes(len(self.data))} "
+            f"({-pct:+.0f}%) • {self.original_size[0]}×{self.original_size[1]} → "
+            f"{self.size[0]}×{self.size[1]} • ~{self.original_tokens:,} → {self.tokens:,} image tokens"
+        )
+
+
+def flatten_alpha(img):
+    """RGB copy with any transparency composited onto white."""
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    if img.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _encode(img, fmt, quality):
+    buf = io.BytesIO()
+    if fmt == 'WebP':
+        img.save(buf, format='WEBP', quality=quality, method=4)
+        return buf.getvalue(), 'image/webp'
+    if fmt == 'JPEG':
+        img.save(buf, format='JPEG', quality=quality, optimize=True)
+        return buf.getvalue(), 'image/jpeg'
+    # Flat UI screenshots usually have few colours - a palette PNG keeps
+    # edges and text crisp at a fraction of the size
+    img.quantize(colors=256, method=Image.MEDIANCUT).save(buf, format='PNG', optimize=True)
+    return buf.getvalue(), 'image/png'
+
+
+def preprocess_image(data, max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY, output_format="Auto",
+                     decoded=None):
+    """Shrink raw image bytes for upload. Returns a PreparedImage.
+
+    decoded is the same image already opened and EXIF-transposed (e.g. from
+    the UI's image cache) - it skips decoding and is never modified.
+    """
+    original = Image.open(io.BytesIO(data))   # lazy - only the header is read here
+    original_size = original.size
+    original_mime = Image.MIME.get(original.format, 'image/png')
+
+    img = decoded if decoded is not None else ImageOps.exif_transpose(original)
+    img = flatten_alpha(img)
+    if max(img.size) > max_edge:
+        scale = max_edge / max(img.size)
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+
+    if output_format == "Auto":
+        candidates = ["WebP", "PNG (palette)"] if img.getcolors(256) is not None else ["WebP", "JPEG"]
+    else:
+        candidates = [output_format]
+
+    best = None
+    for fmt in candidates:
+        try:
+            encoded = _encode(img, fmt, quality)
+        except (OSError, KeyError):
+            # Pillow built without WebP support - just try the next one
+            continue
+        if best is None or len(encoded[0]) < len(best[0]):
+            best = encoded
+
+    # Never make things worse: an untouched, already-small file goes as is
+    untouched = img.size == original_size and original.getexif().get(0x0112, 1) == 1
+    if best is None or (untouched and len(best[0]) >= len(data)):
+        return PreparedImage(data, original_mime, original_size, len(data), original_size)
+
+    return PreparedImage(best[0], best[1], img.size, len(data), original_size)
+
+
+def passthrough_image(data):
+    """Wrap raw bytes untouched (preprocessing switched off)."""
+    img = Image.open(io.BytesIO(data))
+    return PreparedImage(data, Image.MIME.get(img.format, 'image/png'), img.size, len(data), img.size)
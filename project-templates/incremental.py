@@ -0,0 +1,114 @@
+"""
+Incremental regeneration when only the options change.
+
+Flipping "Make it responsive" in CodeVision or "Include Tests" in Doc2App
+changes the prompt, so the response cache misses and the app regenerated
+everything from scratch - a full minute and thousands of output tokens for
+a small tweak. Now, when the session already has a result for the same
+inputs (image / documentation, framework / app type) that only differs in
+its options, the model gets the previous answer plus the option delta and
+returns a unified diff against it:
+
+- the image / documentation isn't re-sent - the previous answer already
+  reflects it, and option tweaks rarely need it again
+- hunks are applied locally by their context (chunked_refactor.apply_hunks)
+- any rejected hunk, a result that no longer parses as Python when the
+  previous one did, or a failed / blocked patch call means None - the
+  caller regenerates in full
+- patched text isn't put in the response cache: it was never generated
+  from the full prompt, so it mustn't be served for it
+"""
+
+import time
+
+from call_metrics import start_call
+from chunked_refactor import apply_hunks, is_python, parse_answer
+from gemini_client import BLOCKED, GeminiError, generate
+from streaming import StreamResult
+
+
+PATCH_CONFIG = {
+    'temperature': 0.2,
+    'max_output_tokens': 4096,
+}
+
+PATCH_PROMPT = """You generated the PREVIOUS ANSWER below. The user has now changed only these options:
+{delta}
+
+Update the answer for the new options with the smallest possible change. Return ONLY a unified diff
+against the PREVIOUS ANSWER in a ```diff block, with ' ' context, '-' removed and '+' added lines and
+at least 3 unchanged context lines around every change. New files go in the same heading + fenced block
+layout as the existing ones, added after the last lines of the answer.
+If nothing needs to change, answer "NO CHANGES".
+
+PREVIOUS ANSWER:
+{previous}
+"""
+
+
+class PatchResult(StreamResult):
+    """StreamResult of a patched answer, plus how many hunks it took."""
+
+    def __init__(self, text, total, applied, notes=''):
+        super().__init__(text, total, total)
+        self.applied = applied
+        self.notes = notes
+
+    def timing_caption(self):
+        return f"🩹 Patched the previous result ({self.applied} hunk(s)) in {self.total:.1f}s"
+
+
+def option_delta(previous, current):
+    """[(option, old, new)] for every option that changed."""
+    return [(name, previous.get(name), value) for name, value in current.items() if previous.get(name) != value]
+
+
+def previous_result(entries, base, options):
+    """Newest history entry for the same base inputs, if its options differ - else None.
+
+    Same options means the user asked for a fresh take, not a patch.
+    """
+    for entry in entries:
+        inputs = entry.inputs
+        if inputs.get('base') == base and inputs.get('options') is not None:
+            return entry if inputs['options'] != options and entry.text is not None else None
+    return None
+
+
+def _fences(text):
+    return sum(1 for line in text.split('\n') if line.lstrip().startswith(('```', '~~~')))
+
+
+def patch_previous(model, previous, delta, generation_config=None, session_id=None, feature=None,
+                   on_retry=None, on_queue=None):
+    """PatchResult for previous updated to the option delta, or None when the patch doesn't apply."""
+    started = time.perf_counter()
+    changes = '\n'.join(f"- {name}: {old} -> {new}" for name, old, new in delta)
+    prompt = PATCH_PROMPT.format(delta=changes, previous=previous)
+    record = start_call(feature, prompt) if feature else None
+    try:
+        response = generate(model, prompt, generation_config=generation_config or PATCH_CONFIG,
+                            session_id=session_id, on_retry=on_retry, on_queue=on_queue, record=record)
+        text = response.text
+    except GeminiError as e:
+        if record is not None:
+            record.fail(e.kind)     # generate() usually has already
+        return None
+    except ValueError:
+        # .text of a blocked or empty answer
+        if record is not None:
+            record.fail(BLOCKED)
+        return None
+    if record is not None:
+        record.finish(response)
+    notes, hunks = parse_answer(text)
+    if not hunks and 'NO CHANGES' not in text:
+        return None
+    patched, applied, rejected = apply_hunks(previous, hunks)
+    if rejected:
+        return None
+    if is_python(previous) and not is_python(patched):
+        return None
+    if _fences(previous) % 2 == 0 and _fences(patched) % 2:
+        return None     # an unclosed code block would swallow the rest of the answer
+    return PatchResult(patched, time.perf_counter() - started, applied, notes)
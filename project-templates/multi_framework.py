@@ -0,0 +1,71 @@
+"""
+Concurrent multi-framework generation for CodeVision's Image to Code tab.
+
+Teams that need the same screen as React, Vue and SwiftUI used to click
+Generate once per framework and wait for each answer in turn. Here every
+framework is generated at the same time from one prepared (and uploaded)
+image, so getting six targets takes about as long as the slowest one.
+
+The jobs run through fan_out.fan_out_events(), so generate_all() hands the
+workers' events to the caller on the main thread, which draws each one into
+its framework's tab:
+
+- ('text', index, text so far)      while streaming (throttled per worker)
+- ('retry', index, (attempt, kind, delay)) / ('queue', index, (position, wait))
+- ('done', index, StreamResult)
+- ('error', index, exception)
+"""
+
+import re
+import time
+
+from call_metrics import start_call
+from fan_out import fan_out_events
+from single_flight import generate_shared
+from streaming import finish_blocking, stream_to_placeholder
+
+
+DEFAULT_MAX_WORKERS = 6      # one per framework in FRAMEWORKS
+
+
+def framework_folder(framework):
+    """Folder name for a framework in the combined ZIP ("HTML/CSS/JS" -> "html-css-js")."""
+    return re.sub(r'[^a-z0-9]+', '-', framework.lower()).strip('-')
+
+
+class _Relay:
+    """Placeholder stand-in for stream_to_placeholder - forwards redraws as events."""
+
+    def __init__(self, emit):
+        self._emit = emit
+
+    def code(self, text, language=None):
+        self._emit('text', text)
+
+    def markdown(self, text):
+        self.code(text)
+
+
+def generate_all(model, jobs, stream=True, max_workers=DEFAULT_MAX_WORKERS, session_id=None, feature=None,
+                 keys=None, stores=None):
+    """Run one generation per contents in jobs concurrently, yielding events (see above).
+
+    All calls queue under the caller's session_id in the shared limiter, and
+    with a feature name each is recorded in call_metrics like a single call.
+    keys / stores (one per job) go to single_flight.generate_shared, so a
+    job identical to a request already in flight follows it.
+    """
+    def run(index, emit):
+        started = time.perf_counter()
+        record = start_call(feature, jobs[index]) if feature else None
+        response = generate_shared(
+            keys[index] if keys else None, model, jobs[index], stream=stream,
+            store=stores[index] if stores else None, session_id=session_id, record=record,
+            on_retry=lambda n, kind, delay: emit('retry', (n, kind, delay)),
+            on_queue=lambda position, wait: emit('queue', (position, wait))
+        )
+        if stream:
+            return stream_to_placeholder(response, _Relay(emit), started, record=record)
+        return finish_blocking(response, started, record)
+
+    return fan_out_events(run, len(jobs), max_workers)
@@ -0,0 +1,104 @@
+"""
+Map-reduce generation for the multi-image tab.
+
+Sending 8-15 screenshots in one request is slow and the answer often hits
+the output limit. Instead:
+
+- map: every screen is analyzed on its own, concurrently, into a compact
+  text summary (components, layout, styles, navigation hints)
+- reduce: one text-only call turns those summaries into the full app,
+  including routing and shared styles
+
+Wall time is roughly the slowest screen + the reduce call, and the final
+prompt is a few KB of text instead of a pile of images.
+"""
+
+from call_metrics import start_call
+from fan_out import fan_out
+from gemini_client import BLOCKED, GeminiError, generate
+from project_files import FILE_FORMAT_INSTRUCTION
+
+
+DEFAULT_MAX_WORKERS = 4
+
+# Summaries are meant to be short - they're an intermediate format
+SCREEN_CONFIG = {
+    'temperature': 0.2,
+    'max_output_tokens': 1024,
+}
+
+SCREEN_ANALYSIS_PROMPT = """You are analyzing ONE screen (screen #{number} of {total}) of an application.
+Do NOT write code. Return a compact structured summary in this exact format:
+
+SCREEN NAME: <short name, e.g. Login, Dashboard>
+PURPOSE: <one sentence>
+LAYOUT: <regions top to bottom / left to right>
+COMPONENTS:
+- <component>: <key props, text, states>
+NAVIGATION: <links/buttons that lead to other screens>
+STYLE: <colors (hex), fonts, spacing, radius, shadows>
+DATA: <entities and fields shown>
+
+Keep it under 300 words."""
+
+REDUCE_PROMPT = """Below are structured summaries of {total} screens of one application,
+extracted from screenshots.
+
+{summaries}
+
+Create a complete {generation_type} that includes:
+1. All pages/screens described above
+2. Navigation/routing between pages (use the NAVIGATION hints)
+3. One shared style system built from the STYLE sections (theme/tokens, not per-page copies)
+4. Proper project structure
+5. All necessary files (components, styles, etc.)
+6. README with setup instructions
+
+Make it production-ready and well-organized. Label every file clearly.
+""" + FILE_FORMAT_INSTRUCTION + "\n"
+
+
+def analyze_screens(model, image_parts, max_workers=DEFAULT_MAX_WORKERS, session_id=None, feature=None):
+    """Analyze each screen concurrently.
+
+    Yields (index, summary, seconds, error) as screens finish - in completion
+    order, not upload order - so the caller can update progress from the
+    main thread (Streamlit calls aren't allowed from worker threads).
+    All calls queue under the caller's session_id in the shared limiter.
+    With a feature name every call is also recorded in call_metrics. A
+    blocked answer comes back as a GeminiError of kind BLOCKED.
+    """
+    total = len(image_parts)
+
+    def analyze(index):
+        prompt = SCREEN_ANALYSIS_PROMPT.format(number=index + 1, total=total)
+        contents = [prompt, image_parts[index]]
+        record = start_call(feature, contents) if feature else None
+        response = generate(model, contents, generation_config=SCREEN_CONFIG,
+                            session_id=session_id, record=record)
+        try:
+            text = response.text
+        except ValueError as e:
+            # .text of a blocked or empty answer
+            if record is not None:
+                record.fail(BLOCKED)
+            raise GeminiError(BLOCKED, e) from e
+        if record is not None:
+            record.finish(response)
+        return text
+
+    return fan_out(analyze, total, max_workers)
+
+
+def build_reduce_prompt(summaries, generation_type):
+    """Final prompt from the per-screen summaries (None = screen failed, skipped)."""
+    blocks = [
+        f"=== SCREEN {i + 1} ===\n{summary.strip()}"
+        for i, summary in enumerate(summaries)
+        if summary
+    ]
+    return REDUCE_PROMPT.format(
+        total=len(blocks),
+        summaries="\n\n".join(blocks),
+        generation_type=generation_type
+    )
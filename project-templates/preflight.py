@@ -0,0 +1,155 @@
+"""
+Pre-flight checks: how big is this request before we send it?
+
+- token counts (count_tokens when asked for exact numbers, otherwise a
+  fast local heuristic that's free to run on every rerun)
+- rough latency and cost estimates for the UI
+- automatic trimming to a token budget: whitespace/boilerplate stripping
+  for text, smaller max edge for images
+
+Better to find out a request is 1.2M tokens *before* waiting a minute for
+a context-limit error.
+"""
+
+import math
+import re
+
+from gemini_client import count_tokens, rough_token_count
+from image_prep import estimate_image_tokens
+
+
+# gemini-2.5-flash - see https://ai.google.dev/pricing
+CONTEXT_LIMIT = 1048576
+INPUT_USD_PER_MILLION = 0.30
+OUTPUT_USD_PER_MILLION = 2.50
+
+# Very rough throughput numbers measured on our own calls
+BASE_LATENCY_SECONDS = 1.0
+PREFILL_TOKENS_PER_SECOND = 10000
+OUTPUT_TOKENS_PER_SECOND = 150
+
+# Max-edge ladder tried (largest first) when images don't fit the budget
+EDGE_LADDER = [3072, 2048, 1536, 1024, 768, 384]
+
+BOILERPLATE_PATTERNS = [
+    r'^\s*skip to (main )?content\s*$',
+    r'^\s*was this page helpful\??.*$',
+    r'^\s*(copyright|©|\(c\)).{0,120}$',
+    r'^\s*(all rights reserved\.?)\s*$',
+    r'^\s*(table of contents|on this page|in this article)\s*$',
+    r'^\s*(previous|next)\s*(page)?\s*[«»←→]?\s*$',
+    r'^\s*(edit this page|report an issue|give feedback)( on github)?\s*$',
+    r'^.*\b(we use cookies|accept (all )?cookies|cookie (policy|settings))\b.*$',
+]
+BOILERPLATE_RE = re.compile('|'.join(BOILERPLATE_PATTERNS), re.IGNORECASE | re.MULTILINE)
+
+TRUNCATION_NOTE = "\n\n[... {dropped:,} characters truncated to fit the token budget ...]"
+TRUNCATION_NOTE_TOKENS = 25
+
+
+class Estimate:
+    """Pre-flight numbers for one request."""
+
+    def __init__(self, input_tokens, output_tokens, exact=False):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.exact = exact
+
+    @property
+    def latency_seconds(self):
+        return (BASE_LATENCY_SECONDS
+                + self.input_tokens / PREFILL_TOKENS_PER_SECOND
+                + self.output_tokens / OUTPUT_TOKENS_PER_SECOND)
+
+    @property
+    def cost_usd(self):
+        return (self.input_tokens * INPUT_USD_PER_MILLION
+                + self.output_tokens * OUTPUT_USD_PER_MILLION) / 1_000_000
+
+    @property
+    def over_context(self):
+        return self.input_tokens > CONTEXT_LIMIT
+
+    def caption(self):
+        approx = "" if self.exact else "~"
+        text = (f"📏 {approx}{self.input_tokens:,} input tokens • ~{self.latency_seconds:.0f}s • "
+                f"~${self.cost_usd:.4f} per call")
+        if self.over_context:
+            text += f" • ⚠️ over the {CONTEXT_LIMIT:,}-token context window"
+        return text
+
+
+def estimate_request(contents, output_tokens, model=None):
+    """Estimate for contents; pass a model to use the (slower) exact count."""
+    if model is not None:
+        return Estimate(count_tokens(model, contents), output_tokens, exact=True)
+    return Estimate(rough_token_count(contents), output_tokens)
+
+
+# === Text trimming ===
+
+def compact_text(text):
+    """Strip stuff that costs tokens but tells the model nothing.
+
+    Trailing whitespace, runs of blank lines, common docs-site boilerplate
+    and repeated paragraphs (copied headers/footers, duplicated examples).
+    Indentation is left alone - it matters for YAML and code samples.
+    """
+    text = text.replace('\r\n', '\n').replace('\t', '    ')
+    text = BOILERPLATE_RE.sub('', text)
+    text = '\n'.join(line.rstrip() for line in text.split('\n'))
+
+    seen = set()
+    kept = []
+    for para in re.split(r'\n{2,}', text):
+        key = para.strip()
+        if not key:
+            continue
+        # Only long blocks - short ones like "}" or "Example:" legitimately repeat
+        if len(key) >= 80:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(para)
+    return '\n\n'.join(kept).strip()
+
+
+def fit_text_to_budget(text, budget_tokens, reserved_tokens=0):
+    """Compact text, then truncate if it still doesn't fit.
+
+    Returns (text, trimmed_chars). reserved_tokens is what the rest of the
+    prompt needs.
+    """
+    compacted = compact_text(text)
+    available = max(0, budget_tokens - reserved_tokens)
+    if rough_token_count(compacted) <= available:
+        return compacted, len(text) - len(compacted)
+
+    # Leave room for the note, so the truncated text fits the budget too
+    keep_chars = max(0, available - TRUNCATION_NOTE_TOKENS) * 4
+    cut = compacted.rfind('\n', 0, keep_chars)
+    if cut < keep_chars // 2:
+        cut = keep_chars
+    dropped = len(compacted) - cut
+    trimmed = compacted[:cut] + TRUNCATION_NOTE.format(dropped=dropped)
+    return trimmed, len(text) - len(trimmed)
+
+
+# === Images ===
+
+def resized(size, max_edge):
+    width, height = size
+    scale = min(1.0, max_edge / max(width, height))
+    return max(1, math.floor(width * scale)), max(1, math.floor(height * scale))
+
+
+def image_tokens_after_resize(size, max_edge):
+    return estimate_image_tokens(*resized(size, max_edge))
+
+
+def choose_max_edge(sizes, budget_tokens, preferred_edge):
+    """Largest max edge (<= preferred) whose total image tokens fit the budget."""
+    for edge in [preferred_edge] + [e for e in EDGE_LADDER if e < preferred_edge]:
+        if sum(image_tokens_after_resize(size, edge) for size in sizes) <= budget_tokens:
+            return edge
+    return EDGE_LADDER[-1]
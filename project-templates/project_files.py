@@ -0,0 +1,269 @@
+"""
+Split multi-file model output into a real file tree and ZIP it.
+
+Both apps ask for complete projects, and Gemini answers with a file path
+label followed by a fenced block for each file. Until now the whole answer was
+offered as one .py / "complete_app.zip" text download, and users rebuilt
+the tree by copy-paste. ProjectBuilder is fed the text as it streams in,
+line by line, and:
+
+- picks up the file name from the label before a fence (### `src/app.py`,
+  **app.py**, File: app.py ...), from the fence info string
+  (```python title="app.py"```, ```js:src/index.js```) or from a filename
+  comment on the fence's first line
+- writes each file into an in-memory ZIP as soon as its fence closes, so
+  only the file currently being streamed is held as lines - finished files
+  live compressed in the archive and are read back one at a time for the
+  file browser
+- skips unlabeled shell snippets (install / run commands aren't files)
+
+Answers without any fence become a single file named default_name.
+"""
+
+import io
+import posixpath
+import re
+import zipfile
+
+
+FENCE_RE = re.compile(r'^\s*(`{3,}|~{3,})\s*([^`]*)$')
+PATH_TOKEN = r'[\w.@+-]+(?:/[\w.@+-]+)*\.[A-Za-z0-9]{1,10}|[\w.@+-]*/?(?:Dockerfile|Makefile|Procfile)'
+PATH_RE = re.compile(rf'^(?:{PATH_TOKEN})$')
+LABEL_PATTERNS = (
+    re.compile(rf'`((?:{PATH_TOKEN}))`'),
+    re.compile(rf'\*\*((?:{PATH_TOKEN}))\*\*'),
+)
+LABEL_PREFIX_RE = re.compile(r'^(?:#{1,6}\s*|[-*]\s+|\d+\.\s+)*(?:(?:file(?:name)?|path)\s*:\s*)?', re.IGNORECASE)
+INFO_PATH_RE = re.compile(r'(?:title|file(?:name)?|path)\s*=\s*["\']?([^"\'\s]+)', re.IGNORECASE)
+FIRST_LINE_RE = re.compile(rf'^\s*(?:#|//|--|/\*|<!--)\s*(?:file(?:name)?\s*:\s*)?((?:{PATH_TOKEN}))\s*(?:\*/|-->)?\s*$',
+                           re.IGNORECASE)
+
+# Appended to prompts that ask for whole projects - the format parsed most reliably
+FILE_FORMAT_INSTRUCTION = (
+    "Put each file under its own heading line with the relative path in backticks, "
+    "e.g. ### `src/app.py`, directly followed by one fenced code block with the complete file."
+)
+
+MAX_LABEL_CHARS = 120   # longer lines are prose that happens to mention a file
+MAX_LABEL_WORDS = 2     # "Create `app.py`:" is a label, "Then run `app.py` with:" isn't
+
+EXTENSIONS = {
+    'python': 'py', 'py': 'py', 'javascript': 'js', 'js': 'js', 'jsx': 'jsx', 'typescript': 'ts',
+    'ts': 'ts', 'tsx': 'tsx', 'html': 'html', 'css': 'css', 'scss': 'scss', 'json': 'json',
+    'yaml': 'yml', 'yml': 'yml', 'toml': 'toml', 'ini': 'ini', 'markdown': 'md', 'md': 'md',
+    'dart': 'dart', 'swift': 'swift', 'kotlin': 'kt', 'java': 'java', 'go': 'go', 'rust': 'rs',
+    'sql': 'sql', 'vue': 'vue', 'svelte': 'svelte', 'xml': 'xml', 'dockerfile': 'Dockerfile',
+    'text': 'txt', 'txt': 'txt', 'env': 'env',
+}
+LANGUAGES = {
+    'py': 'python', 'js': 'javascript', 'jsx': 'jsx', 'ts': 'typescript', 'tsx': 'tsx',
+    'html': 'html', 'css': 'css', 'scss': 'scss', 'json': 'json', 'yml': 'yaml', 'yaml': 'yaml',
+    'toml': 'toml', 'md': 'markdown', 'dart': 'dart', 'swift': 'swift', 'kt': 'kotlin',
+    'java': 'java', 'go': 'go', 'rs': 'rust', 'sql': 'sql', 'vue': 'vue', 'xml': 'xml',
+    'sh': 'bash',
+}
+COMMAND_LANGUAGES = {'bash', 'sh', 'shell', 'console', 'zsh', 'powershell', 'cmd', 'bat'}
+
+
+def language_for(path):
+    """Highlight language for a path (for st.code)."""
+    name = posixpath.basename(path)
+    if name == 'Dockerfile':
+        return 'dockerfile'
+    return LANGUAGES.get(name.rsplit('.', 1)[-1].lower(), 'text') if '.' in name else 'text'
+
+
+def clean_path(path):
+    """Relative, normalized archive path - no absolute paths or '..' escapes."""
+    parts = [p for p in path.replace('\\', '/').strip().strip('`*"\'').split('/') if p not in ('', '.', '..')]
+    return '/'.join(parts)
+
+
+def find_label(line):
+    """File path a markdown line announces, or None."""
+    line = line.strip()
+    if not line or len(line) > MAX_LABEL_CHARS:
+        return None
+    for pattern in LABEL_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            rest = (line[:match.start()] + line[match.end():]).strip('#*-:() ')
+            return match.group(1) if len(rest.split()) <= MAX_LABEL_WORDS else None
+    bare = LABEL_PREFIX_RE.sub('', line.strip('*_ ')).strip('*_: ')
+    return bare if PATH_RE.match(bare) else None
+
+
+class ProjectFile:
+    """One archived file - its text stays in the ZIP until asked for."""
+
+    def __init__(self, path, language, size):
+        self.path = path
+        self.language = language
+        self.size = size
+
+
+class Project:
+    """The parsed file tree plus the finished ZIP bytes."""
+
+    def __init__(self, files, zip_data):
+        self.files = files
+        self.zip_data = zip_data
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def total_bytes(self):
+        return sum(f.size for f in self.files)
+
+    def read(self, path):
+        with zipfile.ZipFile(io.BytesIO(self.zip_data)) as archive:
+            return archive.read(path).decode('utf-8')
+
+
+class ProjectBuilder:
+    """Incremental parser: feed() text as it streams, close() for the Project."""
+
+    def __init__(self, default_name='generated_app.py'):
+        self.default_name = default_name
+        self.files = []
+        self._buffer = io.BytesIO()
+        self._zip = zipfile.ZipFile(self._buffer, 'w', zipfile.ZIP_DEFLATED)
+        self._partial = ''
+        self._label = None
+        self._fence = None       # (marker, language, path, nested depth) while inside a block
+        self._lines = []
+        self._unlabeled = 0
+        self._saw_fence = False
+        self._plain = []         # only kept until the first fence shows up
+
+    def feed(self, text):
+        """Consume the next piece of output; returns files completed by it."""
+        done = len(self.files)
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line)
+        return self.files[done:]
+
+    def close(self):
+        if self._partial:
+            self._line(self._partial)
+            self._partial = ''
+        if self._fence is not None:
+            # Output cut off mid-file - keep what we got
+            self._finish_block()
+        if not self._saw_fence and self._plain:
+            self._add(self.default_name, '\n'.join(self._plain).strip('\n') + '\n')
+            self._plain = []
+        if len(self.files) == 1 and self._unlabeled == 1:
+            # A single unlabeled block is the whole answer - give it the expected name
+            only = self.files[0]
+            data = self._zip.read(only.path)
+            self._reset_zip()
+            self._add(self.default_name, data.decode('utf-8'))
+        self._zip.close()
+        return Project(self.files, self._buffer.getvalue())
+
+    def _reset_zip(self):
+        self._zip.close()
+        self._buffer = io.BytesIO()
+        self._zip = zipfile.ZipFile(self._buffer, 'w', zipfile.ZIP_DEFLATED)
+        self.files = []
+
+    def _line(self, line):
+        if self._fence is None:
+            self._outside(line)
+        else:
+            self._inside(line)
+
+    def _outside(self, line):
+        match = FENCE_RE.match(line)
+        if match is None:
+            if not self._saw_fence:
+                self._plain.append(line)
+            label = find_label(line)
+            if label is not None:
+                self._label = label
+            elif line.strip():
+                self._label = None
+            return
+        self._saw_fence = True
+        self._plain = []
+        info = match.group(2).strip()
+        language, _, rest = info.partition(' ')
+        path = None
+        titled = INFO_PATH_RE.search(info)
+        if titled:
+            path = titled.group(1)
+        elif ':' in language and PATH_RE.match(language.split(':', 1)[1]):
+            language, path = language.split(':', 1)
+        elif PATH_RE.match(language):
+            path, language = language, language_for(language)
+        self._fence = [match.group(1), language.lower(), path or self._label, 0]
+        self._label = None
+        self._lines = []
+
+    def _inside(self, line):
+        marker, language, _, depth = self._fence
+        match = FENCE_RE.match(line)
+        if match and match.group(1)[0] == marker[0] and len(match.group(1)) >= len(marker):
+            if match.group(2).strip() and language in ('markdown', 'md'):
+                # README blocks often contain fenced examples of their own
+                self._fence[3] += 1
+            elif depth:
+                self._fence[3] -= 1
+            else:
+                self._finish_block()
+                return
+        self._lines.append(line)
+
+    def _finish_block(self):
+        _, language, path, _ = self._fence
+        lines = self._lines
+        self._fence = None
+        self._lines = []
+        if path is None and lines:
+            first = FIRST_LINE_RE.match(lines[0])
+            if first:
+                path = first.group(1)
+        if path is None:
+            if language in COMMAND_LANGUAGES or not any(l.strip() for l in lines):
+                return
+            self._unlabeled += 1
+            ext = EXTENSIONS.get(language, 'txt')
+            path = ext if ext == 'Dockerfile' else f"snippet_{self._unlabeled}.{ext}"
+        self._add(path, '\n'.join(lines).rstrip('\n') + '\n')
+
+    def _add(self, path, content):
+        path = clean_path(path) or self.default_name
+        taken = {f.path for f in self.files}
+        if path in taken:
+            stem, dot, ext = path.rpartition('.')
+            if not dot:
+                stem, ext = path, ''
+            n = 2
+            while f"{stem}_{n}{dot}{ext}" in taken:
+                n += 1
+            path = f"{stem}_{n}{dot}{ext}"
+        data = content.encode('utf-8')
+        self._zip.writestr(path, data)
+        self.files.append(ProjectFile(path, language_for(path), len(data)))
+
+
+def parse_project(text, default_name='generated_app.py'):
+    """Whole-text version of ProjectBuilder (history, non-streamed answers)."""
+    builder = ProjectBuilder(default_name)
+    builder.feed(text)
+    return builder.close()
+
+
+def bundle(projects):
+    """One ZIP with every (folder, Project) pair under its own top-level folder."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for folder, project in projects:
+            with zipfile.ZipFile(io.BytesIO(project.zip_data)) as source:
+                for f in project.files:
+                    archive.writestr(f"{clean_path(folder)}/{f.path}", source.read(f.path))
+    return buffer.getvalue()
@@ -0,0 +1,205 @@
+"""
+Process-wide rate limiting for Gemini calls.
+
+Every Streamlit session calls Gemini on its own, so without coordination a
+few heavy users trip the key's RPM/TPM quota and everyone gets 429s, then
+the app sits idle while the quota refills. This keeps us just under the
+ceiling instead:
+
+- two token buckets: requests per minute and (input) tokens per minute
+- a fair queue: waiting requests are grouped per session and served
+  round-robin, so one user's 15-screen batch can't starve a single click
+- waiters get their queue position and an expected wait for the UI
+
+Limits come from GEMINI_RPM / GEMINI_TPM (0 disables the limiter).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+# Free tier numbers for gemini-2.5-flash - raise them for paid keys
+DEFAULT_RPM = int(os.getenv('GEMINI_RPM', '10'))
+DEFAULT_TPM = int(os.getenv('GEMINI_TPM', '250000'))
+
+# Waiters re-check (and refresh their ETA) at least this often
+POLL_SECONDS = 1.0
+
+
+class QueueTimeout(Exception):
+    """Gave up waiting for quota."""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at per_minute / 60 per second."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (oversized amounts need a full bucket)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta):
+        """Charge (positive) or refund (negative) after the real usage is known."""
+        self.level = min(self.capacity, self.level - delta)
+
+
+class _Ticket:
+    __slots__ = ('tokens',)
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+
+class RateLimiter:
+    """RPM + TPM buckets behind a round-robin per-session queue."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._cond = threading.Condition()
+        # session -> deque of tickets; dict order is the round-robin order
+        self._queues = OrderedDict()
+
+    def acquire(self, session_id, tokens, on_wait=None, timeout=None):
+        """Block until this session's request may go out.
+
+        on_wait(position, expected_seconds) is called from the waiting
+        thread every time the estimate is refreshed, without the lock held
+        (it usually redraws Streamlit widgets). Raises QueueTimeout after
+        `timeout` seconds.
+        """
+        ticket = _Ticket(max(0, int(tokens)))
+        give_up = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+        reported = False
+        served = False
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    if self._is_head(session_id, ticket):
+                        wait = max(self.requests.wait_time(1, now),
+                                   self.tokens.wait_time(ticket.tokens, now))
+                        if wait <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(ticket.tokens, now)
+                            served = True
+                            return
+                    if give_up is not None and now >= give_up:
+                        raise QueueTimeout(f"No quota available after {timeout:.0f}s")
+                    if on_wait is None or reported:
+                        # Checked again after reporting, so nothing notified meanwhile is missed
+                        self._cond.wait(POLL_SECONDS)
+                        reported = False
+                        continue
+                    estimate = self._estimate(session_id, ticket, now)
+                on_wait(*estimate)
+                reported = True
+        finally:
+            with self._cond:
+                self._remove(session_id, ticket, served)
+                self._cond.notify_all()
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Correct the TPM bucket once usage_metadata tells us the real count."""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+            self._cond.notify_all()
+
+    def snapshot(self):
+        """Current state for the sidebar."""
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                'queued': sum(len(q) for q in self._queues.values()),
+                'sessions_waiting': len(self._queues),
+                'requests_available': max(0, int(self.requests.level)),
+                'tokens_available': max(0, int(self.tokens.level)),
+                'rpm': self.rpm,
+                'tpm': self.tpm,
+            }
+
+    # --- internals (caller holds the lock) ---
+
+    def _is_head(self, session_id, ticket):
+        first_session = next(iter(self._queues))
+        return first_session == session_id and self._queues[session_id][0] is ticket
+
+    def _remove(self, session_id, ticket, served):
+        queue = self._queues.get(session_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(ticket)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[session_id]
+        elif served:
+            # This session goes to the back of the rotation. A request that
+            # timed out or was interrupted wasn't served, so its session
+            # keeps its turn for the next one.
+            self._queues.move_to_end(session_id)
+
+    def _estimate(self, session_id, ticket, now):
+        """(1-based position, expected wait in seconds) in round-robin order."""
+        queues = list(self._queues.values())
+        position = 0
+        tokens_ahead = 0
+        depth = 0
+        while True:
+            for queue in queues:
+                if depth < len(queue):
+                    position += 1
+                    tokens_ahead += queue[depth].tokens
+                    if queue[depth] is ticket:
+                        request_wait = self.requests.wait_time(position, now)
+                        token_wait = self.tokens.wait_time(tokens_ahead, now)
+                        # Beyond one bucket-full we wait a full minute per extra bucket
+                        if tokens_ahead > self.tokens.capacity:
+                            token_wait += (tokens_ahead - self.tokens.capacity) / self.tokens.rate
+                        if position > self.requests.capacity:
+                            request_wait += (position - self.requests.capacity) / self.requests.rate
+                        return position, max(request_wait, token_wait)
+            depth += 1
+            if not any(depth < len(q) for q in queues):
+                return position, 0.0
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """The shared limiter for this process, or None when disabled."""
+    global _limiter
+    if DEFAULT_RPM <= 0 or DEFAULT_TPM <= 0:
+        return None
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(DEFAULT_RPM, DEFAULT_TPM)
+        return _limiter
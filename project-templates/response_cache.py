@@ -0,0 +1,232 @@
+"""
+Response cache for Gemini generations.
+
+Two tiers:
+- a small in-memory LRU for instant repeat hits within the process
+- a SQLite file on disk so results survive restarts
+
+Entries expire after a TTL and the disk tier is trimmed (oldest access
+first) whenever it grows past its byte budget. Values are zlib-compressed
+on disk since generated code compresses really well.
+
+A key can hold several samples - with temperature 0.7 two generations for
+the same prompt differ, so "force fresh" adds a variant instead of
+overwriting the one the user already liked.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+# Cache lives next to the apps unless overridden
+DEFAULT_CACHE_DIR = os.getenv(
+    'CODEGEN_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600      # a week is plenty for design iterations
+DEFAULT_MAX_DISK_BYTES = 200 * 1024 * 1024
+DEFAULT_MEMORY_ITEMS = 64
+DEFAULT_MAX_SAMPLES = 3
+
+# Bump when the table layout changes - old caches are simply dropped
+SCHEMA_VERSION = 2
+
+
+def make_key(*parts):
+    """Hash any mix of str/bytes parts into a stable cache key.
+
+    Each part is length-prefixed so ("ab", "c") and ("a", "bc") don't collide.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b''
+        elif isinstance(part, str):
+            part = part.encode('utf-8')
+        h.update(str(len(part)).encode('ascii') + b':')
+        h.update(part)
+    return h.hexdigest()
+
+
+def normalize_text(text):
+    """Normalize line endings and trailing whitespace so cosmetic edits still hit."""
+    lines = (text or '').replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def make_request_key(model_name, prompt, system_instruction=None, generation_config=None):
+    """Cache key for a text request: normalized prompt + system instruction + config."""
+    config = json.dumps(generation_config or {}, sort_keys=True, separators=(',', ':'))
+    return make_key(model_name, normalize_text(prompt), normalize_text(system_instruction), config)
+
+
+class ResponseCache:
+    """Memory LRU in front of a SQLite store, safe to share across sessions."""
+
+    def __init__(self, path=None, memory_items=DEFAULT_MEMORY_ITEMS,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, 'responses.sqlite3')
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        self.path = path
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory = OrderedDict()   # key -> [(text, created), ...] newest first
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        # Streamlit serves sessions from different threads, so one shared
+        # connection guarded by our own lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS responses")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT NOT NULL,
+                sample INTEGER NOT NULL,
+                value BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (key, sample)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+        self._db.commit()
+
+    # --- public API ---
+
+    def get(self, key):
+        """Return the newest cached text for key, or None on a miss."""
+        samples = self.get_samples(key)
+        return samples[0] if samples else None
+
+    def get_samples(self, key):
+        """Return every live sample for key (newest first), [] on a miss."""
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                live = [(text, created) for text, created in hit if now - created <= self.ttl_seconds]
+                if live:
+                    self._memory[key] = live
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return [text for text, _ in live]
+                del self._memory[key]
+
+            expired = self._db.execute(
+                "DELETE FROM responses WHERE key = ? AND created < ?",
+                (key, now - self.ttl_seconds)
+            ).rowcount
+            self._stats['evictions'] += max(expired, 0)
+            rows = self._db.execute(
+                "SELECT value, created FROM responses WHERE key = ? ORDER BY sample DESC", (key,)
+            ).fetchall()
+            if not rows:
+                self._db.commit()
+                self._stats['misses'] += 1
+                return []
+
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            live = [(zlib.decompress(value).decode('utf-8'), created) for value, created in rows]
+            self._remember(key, live)
+            self._stats['disk_hits'] += 1
+            return [text for text, _ in live]
+
+    def put(self, key, text):
+        """Store text as the only sample for key."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._insert(key, 0, text)
+
+    def add_sample(self, key, text, max_samples=DEFAULT_MAX_SAMPLES):
+        """Store text as a new sample for key, dropping the oldest past max_samples."""
+        with self._lock:
+            last = self._db.execute(
+                "SELECT MAX(sample) FROM responses WHERE key = ?", (key,)
+            ).fetchone()[0]
+            sample = 0 if last is None else last + 1
+            self._db.execute(
+                "DELETE FROM responses WHERE key = ? AND sample <= ?", (key, sample - max_samples)
+            )
+            self._insert(key, sample, text)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters plus current sizes - handy for the sidebar."""
+        with self._lock:
+            keys, entries, disk_bytes = self._db.execute(
+                "SELECT COUNT(DISTINCT key), COUNT(*), COALESCE(SUM(nbytes), 0) FROM responses"
+            ).fetchone()
+            stats = dict(self._stats)
+            memory_entries = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats.update({
+            'hits': stats['memory_hits'] + stats['disk_hits'],
+            'hit_rate': (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0,
+            'memory_entries': memory_entries,
+            'disk_keys': keys,
+            'disk_entries': entries,
+            'disk_bytes': disk_bytes,
+        })
+        return stats
+
+    # --- internals (caller holds the lock) ---
+
+    def _insert(self, key, sample, text):
+        now = time.time()
+        value = zlib.compress(text.encode('utf-8'))
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, sample, value, nbytes, created, accessed) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, sample, value, len(value), now, now)
+        )
+        # Memory copy is rebuilt from disk on the next read
+        self._memory.pop(key, None)
+        self._evict_disk(now)
+        self._db.commit()
+
+    def _remember(self, key, samples):
+        self._memory[key] = samples
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        # Expired rows go first, then least recently used until under budget
+        cur = self._db.execute(
+            "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+        )
+        self._stats['evictions'] += max(cur.rowcount, 0)
+
+        total = self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, sample, nbytes in self._db.execute(
+            "SELECT key, sample, nbytes FROM responses ORDER BY accessed ASC, sample ASC"
+        ).fetchall():
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ? AND sample = ?", (key, sample))
+            self._memory.pop(key, None)
+            total -= nbytes
+            self._stats['evictions'] += 1
@@ -0,0 +1,178 @@
+"""
+Per-session history of generated results.
+
+Generated code used to exist only inside the Generate button's `if` block,
+so the next rerun - even clicking Download - wiped it and people clicked
+Generate again, paying for another full call. Each session now keeps a
+ResultHistory in st.session_state:
+
+- every generation with its inputs, timings and source (api / cache / patch)
+- small outputs stay in memory; big ones, and the oldest ones once the
+  session is over its memory cap, go zlib-compressed to disk and are only
+  read back when shown
+- at most max_entries per session, oldest dropped first
+
+The apps own the session_state wiring.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+
+from response_cache import DEFAULT_CACHE_DIR
+
+
+RESULTS_DIR = os.path.join(DEFAULT_CACHE_DIR, 'results')
+MAX_MEMORY_BYTES = int(os.getenv('RESULT_HISTORY_MEMORY_MB', '4')) * 1024 * 1024
+MAX_ENTRIES = 30
+INLINE_CHARS = 32000             # bigger outputs go straight to disk
+STALE_SECONDS = 7 * 24 * 3600    # session folders untouched this long get removed
+
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def prune_stale(directory=RESULTS_DIR, max_age=STALE_SECONDS):
+    """Delete session folders nobody has written to in max_age seconds."""
+    global _last_prune
+    with _prune_lock:
+        # Once an hour per process is plenty
+        if time.time() - _last_prune < 3600:
+            return
+        _last_prune = time.time()
+    if not os.path.isdir(directory):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            continue
+
+
+class ResultEntry:
+    """One past generation. .text is loaded from disk on demand when spilled."""
+
+    def __init__(self, feature, text, title, inputs, ttft, total, source, language, file_name):
+        self.id = uuid.uuid4().hex[:12]
+        self.feature = feature
+        self.title = title
+        self.inputs = inputs or {}
+        self.created = time.time()
+        self.ttft = ttft
+        self.total = total
+        self.source = source
+        self.language = language
+        self.file_name = file_name
+        self.chars = len(text)
+        self._text = text
+        self._path = None
+
+    @property
+    def in_memory(self):
+        return self._text is not None
+
+    @property
+    def memory_bytes(self):
+        return len(self._text.encode('utf-8')) if self._text is not None else 0
+
+    @property
+    def text(self):
+        """The generated text, or None if its file has gone missing."""
+        if self._text is not None:
+            return self._text
+        try:
+            with open(self._path, 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except (OSError, zlib.error):
+            return None
+
+    def spill(self, directory):
+        if self._text is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.id}.z")
+        tmp = path + '.part'
+        with open(tmp, 'wb') as f:
+            f.write(zlib.compress(self._text.encode('utf-8'), 6))
+        os.replace(tmp, path)
+        self._path = path
+        self._text = None
+
+    def discard(self):
+        if self._path:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+
+    def label(self):
+        stamp = time.strftime('%H:%M:%S', time.localtime(self.created))
+        return f"{stamp} • {self.title} • {self.chars:,} chars ({self.source})"
+
+    def timing_caption(self):
+        if self.source == 'cache':
+            return "⚡ Served from cache"
+        if self.source == 'patch' and self.total is not None:
+            return f"🩹 Patched from an earlier result in {self.total:.1f}s"
+        if self.ttft is not None and self.total is not None and self.ttft < self.total:
+            return f"⏱️ First token after {self.ttft:.1f}s • done in {self.total:.1f}s"
+        if self.total is not None:
+            return f"⏱️ Generated in {self.total:.1f}s"
+        return ""
+
+
+class ResultHistory:
+    """Newest-last list of ResultEntry for one session, with a memory cap."""
+
+    def __init__(self, session_id, directory=RESULTS_DIR, max_memory_bytes=MAX_MEMORY_BYTES,
+                 max_entries=MAX_ENTRIES):
+        self.directory = os.path.join(directory, session_id)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_entries = max_entries
+        self._entries = []
+        prune_stale(directory)
+
+    def add(self, feature, text, title='', inputs=None, result=None, source='api',
+            language=None, file_name=None):
+        """Record a generation. result is the StreamResult (for timings), if any."""
+        entry = ResultEntry(
+            feature, text, title, inputs,
+            ttft=getattr(result, 'ttft', None), total=getattr(result, 'total', None),
+            source=source, language=language, file_name=file_name
+        )
+        self._entries.append(entry)
+        if len(text) > INLINE_CHARS:
+            entry.spill(self.directory)
+        self._enforce_caps()
+        return entry
+
+    def entries(self, feature=None):
+        """Newest first."""
+        return [e for e in reversed(self._entries) if feature is None or e.feature == feature]
+
+    def latest(self, feature):
+        for entry in reversed(self._entries):
+            if entry.feature == feature:
+                return entry
+        return None
+
+    def memory_bytes(self):
+        return sum(e.memory_bytes for e in self._entries)
+
+    def _enforce_caps(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.pop(0).discard()
+        # Oldest in-memory entries go to disk first
+        memory = self.memory_bytes()
+        for entry in self._entries:
+            if memory <= self.max_memory_bytes:
+                break
+            if entry.in_memory:
+                memory -= entry.memory_bytes
+                entry.spill(self.directory)
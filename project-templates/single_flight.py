@@ -0,0 +1,235 @@
+"""
+Single-flight coalescing of identical in-flight Gemini requests.
+
+In demos and workshops many sessions load the same Doc2App example or the
+same screenshot and press Generate within seconds of each other. The
+response cache only helps once the first answer is finished, so every
+press paid for its own call. Now the first request for a key (the apps'
+response cache key - canonical prompt, image bytes, model) is the leader
+and makes the call; identical requests arriving while it runs follow it:
+
+- followers get a response that behaves like the real one - iterate it for
+  the streamed chunks (from the first one, so late joiners get the whole
+  text) or read .text for the final answer
+- the leader stores the finished text exactly once (store callback, e.g.
+  into the response cache), so requests after the flight are cache hits
+- if the leader fails before its first chunk, a waiting follower takes
+  over and makes the call itself; a failure mid-stream reaches followers
+  as the same error
+- follower calls are recorded in call_metrics with status "shared"
+"""
+
+import threading
+
+from gemini_client import generate
+from streaming import chunk_text
+
+
+FOLLOW_TIMEOUT = 600        # seconds a follower waits on a silent leader
+
+
+class FlightAbandoned(RuntimeError):
+    """The leading session stopped reading its stream (rerun, closed tab)."""
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class Flight:
+    """One in-flight call: the text published so far, then its outcome."""
+
+    def __init__(self, key):
+        self.key = key
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, text):
+        with self._cond:
+            self.parts.append(text)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def wait_started(self, timeout=FOLLOW_TIMEOUT):
+        """True once there is text to follow (or a clean finish), False if the leader failed first."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.parts or self.done, timeout):
+                raise TimeoutError("Timed out waiting for an identical request in flight")
+            return bool(self.parts) or self.error is None
+
+    def chunks(self, timeout=FOLLOW_TIMEOUT):
+        index = 0
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: len(self.parts) > index or self.done, timeout):
+                    raise TimeoutError("Timed out waiting for an identical request in flight")
+                new = self.parts[index:]
+                finished, error = self.done, self.error
+            for text in new:
+                yield _Chunk(text)
+            index += len(new)
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+
+class SharedResponse:
+    """What a follower gets instead of a response - iterate it, or read .text."""
+
+    usage_metadata = None       # the tokens were paid for by the leader's call
+
+    def __init__(self, flight):
+        self._flight = flight
+
+    def __iter__(self):
+        return self._flight.chunks()
+
+    @property
+    def text(self):
+        return ''.join(chunk.text for chunk in self._flight.chunks())
+
+
+class _LeaderStream:
+    """The leader's streamed response, publishing every chunk as it passes through."""
+
+    def __init__(self, response, end):
+        self._response = response
+        self._end = end
+
+    def __iter__(self):
+        parts = []
+        completed = False
+        try:
+            for chunk in self._response:
+                text = chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    self._end.flight.publish(text)
+                yield chunk
+            completed = True
+        except Exception as e:
+            self._end(error=e)
+            raise
+        finally:
+            if completed:
+                self._end(text=''.join(parts))
+            elif not self._end.flight.done:
+                self._end(error=FlightAbandoned("The request this one was sharing stopped"))
+
+    def __getattr__(self, name):
+        # usage_metadata, candidates... of the real response
+        return getattr(self._response, name)
+
+
+class _End:
+    """Closes a flight once: store the text, unregister, wake the followers."""
+
+    def __init__(self, registry, flight, store):
+        self.registry = registry
+        self.flight = flight
+        self.store = store
+
+    def __call__(self, text=None, error=None):
+        if self.flight.done:
+            return
+        # Store before unregistering - a request arriving in between either joins or hits the cache
+        if text is not None and self.store is not None:
+            try:
+                self.store(text)
+            except Exception:
+                pass
+        self.registry._remove(self.flight)
+        self.flight.finish(error)
+
+
+class SingleFlight:
+    """key -> the Flight currently making that call."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                return flight, False
+            flight = self._flights[key] = Flight(key)
+            self.leaders += 1
+            return flight, True
+
+    def _remove(self, flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def generate(self, key, model, contents, stream=False, store=None, record=None, **kwargs):
+        """generate() shared between identical concurrent requests; see the module docstring.
+
+        key=None opts out of sharing (e.g. "force fresh"), store is still called.
+        """
+        flight = Flight(None) if key is None else None
+        while flight is None:
+            joined, leader = self._join(key)
+            if leader:
+                flight = joined
+            elif joined.wait_started():
+                with self._lock:
+                    self.shared += 1
+                if record is not None:
+                    record.streamed = stream
+                    record.shared = True
+                return SharedResponse(joined)
+            # else the leader failed before producing anything - try again, maybe as the new leader
+
+        end = _End(self, flight, store)
+        try:
+            response = generate(model, contents, stream=stream, record=record, **kwargs)
+        except Exception as e:
+            end(error=e)
+            raise
+        if stream:
+            return _LeaderStream(response, end)
+        try:
+            text = response.text
+        except Exception as e:
+            end(error=e)        # the caller reads .text too and gets the same error
+            return response
+        end.flight.publish(text)
+        end(text=text)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._flights), 'leaders': self.leaders, 'shared': self.shared}
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """The shared coalescer for this process."""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
+
+
+def generate_shared(key, model, contents, stream=False, store=None, record=None, **kwargs):
+    """generate(), but identical requests (same key) in flight share one call."""
+    return get_single_flight().generate(key, model, contents, stream=stream, store=store, record=record, **kwargs)
@@ -0,0 +1,514 @@
+"""
+OpenAPI compaction for Doc2App prompts.
+
+Pasted specs are mostly noise to the model: $ref-expanded copies of the
+same schema, examples, vendor extensions, XML hints and paragraph-long
+descriptions. When the documentation parses as an OpenAPI 3 / Swagger 2
+spec (JSON, or YAML with pyyaml installed) it's rewritten as a terse
+canonical listing instead:
+
+- one line per operation, followed by its parameters, body and responses
+- every schema written once under "Schemas" and referenced by name;
+  expanded copies of a component fold back into its name and identical
+  inline objects used more than once are hoisted and named too
+- example(s), x-* extensions, xml and externalDocs dropped, descriptions
+  cut to their first sentence, unreferenced schemas left out
+
+Anything that isn't an OpenAPI spec is left alone.
+"""
+
+import json
+import re
+from collections import Counter
+
+from doc_chunker import HTTP_METHODS, parse_openapi, resolve_pointer
+from gemini_client import rough_token_count
+
+
+DESCRIPTION_CHARS = 120
+
+# Repeated inline shapes shorter than this stay inline (small enums etc.)
+MIN_HOIST_CHARS = 120
+
+# Documentation-only keys, dropped everywhere (plus anything starting with x-)
+NOISE_KEYS = {'example', 'examples', 'externalDocs', 'xml'}
+
+# Validation keywords worth telling the model about
+CONSTRAINT_KEYS = ('default', 'minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum',
+                   'minLength', 'maxLength', 'pattern', 'minItems', 'maxItems', 'uniqueItems')
+
+SCHEMA_CHILD_KEYS = ('items', 'additionalProperties', 'not')
+SCHEMA_LIST_KEYS = (('allOf', ' & '), ('oneOf', ' | '), ('anyOf', ' | '))
+
+# Swagger 2 parameters carry their schema inline
+SWAGGER_PARAM_SCHEMA_KEYS = ('type', 'format', 'items', 'enum') + CONSTRAINT_KEYS
+
+NOTATION = "Notation: name* = required, T[] = array of T, A | B = one of, A & B = all of, map<T> = object of T"
+
+
+class CompactSpec:
+    """A compacted spec plus the numbers for the UI."""
+
+    def __init__(self, text, original_tokens, operations, schemas, dropped_schemas):
+        self.text = text
+        self.original_tokens = original_tokens
+        self.tokens = rough_token_count(text)
+        self.operations = operations
+        self.schemas = schemas
+        self.dropped_schemas = dropped_schemas
+
+    @property
+    def ratio(self):
+        return self.original_tokens / max(1, self.tokens)
+
+    def caption(self):
+        text = (f"🧩 OpenAPI spec compacted: ~{self.original_tokens:,} → ~{self.tokens:,} tokens "
+                f"({self.ratio:.1f}x fewer) • {self.operations} operations, {self.schemas} schemas")
+        if self.dropped_schemas:
+            text += f" ({self.dropped_schemas} unused dropped)"
+        return text
+
+
+def short_description(text):
+    """First sentence, whitespace collapsed, capped at DESCRIPTION_CHARS."""
+    if not text:
+        return ''
+    text = re.sub(r'\s+', ' ', str(text).replace('**', '')).strip()
+    match = re.match(r'(.+?[.!?])(\s|$)', text)
+    if match:
+        text = match.group(1)
+    if len(text) > DESCRIPTION_CHARS:
+        text = text[:DESCRIPTION_CHARS - 1].rstrip() + '…'
+    return text
+
+
+def _is_noise(key):
+    return key in NOISE_KEYS or key.startswith('x-')
+
+
+def _ref_name(ref):
+    return ref.rsplit('/', 1)[-1].replace('~1', '/').replace('~0', '~')
+
+
+def _key(schema):
+    """Canonical form used for dedupe - wording differences don't count."""
+    def strip(node):
+        if isinstance(node, dict):
+            return {k: strip(v) for k, v in node.items() if k not in ('description', 'title')}
+        if isinstance(node, list):
+            return [strip(v) for v in node]
+        return node
+    return json.dumps(strip(schema), sort_keys=True, default=str)
+
+
+def _is_structured(schema):
+    # Only fold/hoist real shapes - a bare {type: string} component would
+    # otherwise swallow every string field in the spec
+    return isinstance(schema, dict) and (
+        'properties' in schema or 'enum' in schema or any(word in schema for word, _ in SCHEMA_LIST_KEYS)
+    )
+
+
+class _SchemaIndex:
+    """Named schemas plus the folding that maps expanded copies back to them."""
+
+    def __init__(self, spec):
+        components = (spec.get('components') or {}).get('schemas') or spec.get('definitions') or {}
+        if not isinstance(components, dict):
+            components = {}
+        self.by_key = {}
+        self.hoisted = {}
+        for name, schema in components.items():
+            cleaned = self.fold(schema)
+            if _is_structured(cleaned):
+                self.by_key.setdefault(_key(cleaned), name)
+        self.named = {name: self.fold(schema, own_name=name) for name, schema in components.items()}
+
+    def fold(self, schema, own_name=None):
+        """Drop noise keys and replace known shapes with {'$ref': name}, bottom-up."""
+        if not isinstance(schema, dict):
+            return schema
+        if isinstance(schema.get('$ref'), str):
+            return {'$ref': _ref_name(schema['$ref'])}
+        out = {}
+        for key, value in schema.items():
+            if _is_noise(key):
+                continue
+            if key == 'properties' and isinstance(value, dict):
+                value = {name: self.fold(sub) for name, sub in value.items()}
+            elif key in SCHEMA_CHILD_KEYS and isinstance(value, dict):
+                value = self.fold(value)
+            elif key in dict(SCHEMA_LIST_KEYS) and isinstance(value, list):
+                value = [self.fold(sub) for sub in value]
+            out[key] = value
+        if _is_structured(out):
+            key = _key(out)
+            name = self.by_key.get(key) or self.hoisted.get(key)
+            if name is not None and name != own_name:
+                return {'$ref': name}
+        return out
+
+    def hoist(self, counts, samples):
+        """Name inline objects that appear more than once, then refold. Returns how many."""
+        used = set(self.named)
+        before = len(self.hoisted)
+        candidates = [key for key, count in counts.items() if count >= 2 and len(key) >= MIN_HOIST_CHARS]
+        for key in candidates:
+            # Innermost shapes first - the outer ones get recounted next round
+            if any(other != key and other in key for other in candidates):
+                continue
+            schema, hint = samples[key]
+            base = _camel(schema.get('title') or hint) or 'Shared'
+            name, n = base, 1
+            while name in used:
+                n += 1
+                name = f"{base}{n}"
+            used.add(name)
+            self.hoisted[key] = name
+            self.named[name] = schema
+        if len(self.hoisted) > before:
+            self.named = {name: self.fold(schema, own_name=name) for name, schema in self.named.items()}
+        return len(self.hoisted) - before
+
+    def type_of(self, schema):
+        """One-line type expression."""
+        if not isinstance(schema, dict) or not schema:
+            return 'any'
+        if '$ref' in schema:
+            return schema['$ref']
+
+        nullable = bool(schema.get('nullable'))
+        text = None
+        for word, joiner in SCHEMA_LIST_KEYS:
+            if isinstance(schema.get(word), list) and schema[word]:
+                parts = [self.type_of(sub) for sub in schema[word]]
+                text = joiner.join(parts) if len(parts) > 1 else parts[0]
+                if 'properties' in schema:
+                    text += ' & ' + self._inline_object(schema)
+                break
+        if text is None and isinstance(schema.get('enum'), list):
+            text = ' | '.join(json.dumps(value, default=str) for value in schema['enum'])
+        if text is None:
+            kind = schema.get('type')
+            if isinstance(kind, list):
+                # OpenAPI 3.1 style ["string", "null"]
+                nullable = nullable or 'null' in kind
+                kind = next((k for k in kind if k != 'null'), None)
+            if kind == 'array':
+                item = self.type_of(schema.get('items'))
+                text = f"({item})[]" if ' ' in item else f"{item}[]"
+            elif kind == 'object' or 'properties' in schema or 'additionalProperties' in schema:
+                extra = schema.get('additionalProperties')
+                if 'properties' in schema:
+                    text = self._inline_object(schema)
+                elif isinstance(extra, dict):
+                    text = f"map<{self.type_of(extra)}>"
+                else:
+                    text = 'object'
+            else:
+                text = kind or 'any'
+                if schema.get('format'):
+                    text += f"({schema['format']})"
+        if nullable:
+            text += ' | null'
+        return text
+
+    def _inline_object(self, schema):
+        required = set(schema.get('required') or [])
+        properties = schema.get('properties')
+        fields = [f"{name}{'*' if name in required else ''}: {self.type_of(sub)}"
+                  for name, sub in (properties if isinstance(properties, dict) else {}).items()]
+        return '{' + ', '.join(fields) + '}'
+
+    def field_line(self, name, schema, required):
+        line = f"{name}{'*' if required else ''}: {self.type_of(schema)}{_constraints(schema)}"
+        description = short_description(schema.get('description') if isinstance(schema, dict) else None)
+        return f"{line} - {description}" if description else line
+
+    def render(self, name):
+        """The Schemas-section entry for one named schema."""
+        schema = self.named[name]
+        description = short_description(schema.get('description')) if isinstance(schema, dict) else ''
+        header = f"{name} - {description}" if description else name
+        if isinstance(schema, dict) and isinstance(schema.get('properties'), dict) and not any(w in schema for w, _ in SCHEMA_LIST_KEYS):
+            required = set(schema.get('required') or [])
+            lines = [header]
+            for field, sub in schema['properties'].items():
+                lines.append('  ' + self.field_line(field, sub, field in required))
+            return '\n'.join(lines)
+        line = f"{name} = {self.type_of(schema)}"
+        return f"{line} - {description}" if description else line
+
+
+def _constraints(schema):
+    if not isinstance(schema, dict):
+        return ''
+    found = [f"{key}={json.dumps(schema[key], default=str)}" for key in CONSTRAINT_KEYS if key in schema]
+    if schema.get('readOnly'):
+        found.append('read-only')
+    if schema.get('writeOnly'):
+        found.append('write-only')
+    if schema.get('deprecated'):
+        found.append('deprecated')
+    return f" [{', '.join(found)}]" if found else ''
+
+
+def _resolve(spec, node):
+    # Parameters, bodies and responses can be $refs themselves (even chained)
+    seen = set()
+    while isinstance(node, dict) and isinstance(node.get('$ref'), str) and node['$ref'] not in seen:
+        seen.add(node['$ref'])
+        target = resolve_pointer(spec, node['$ref']) if node['$ref'].startswith('#/') else None
+        if target is None:
+            return node
+        node = target
+    return node if isinstance(node, dict) else {}
+
+
+def _param_schema(param):
+    if 'schema' in param:
+        return param['schema']
+    if 'content' in param:
+        return _first_media_schema(param['content'])
+    return {k: v for k, v in param.items() if k in SWAGGER_PARAM_SCHEMA_KEYS}
+
+
+def _first_media_schema(content):
+    if not isinstance(content, dict) or not content:
+        return None
+    for media, body in content.items():
+        if 'json' in media and isinstance(body, dict):
+            return body.get('schema')
+    body = next(iter(content.values()))
+    return body.get('schema') if isinstance(body, dict) else None
+
+
+class _Operation:
+    """One method + path, with its schemas already folded."""
+
+    def __init__(self, spec, index, method, path, op, path_params):
+        self.method = method.upper()
+        self.path = path
+        self.summary = short_description(op.get('summary') or op.get('description'))
+        self.operation_id = op.get('operationId')
+        self.deprecated = bool(op.get('deprecated'))
+        self.security = op.get('security')
+        tags = op.get('tags') or []
+        self.group = str(tags[0]) if tags else (path.strip('/').split('/')[0] or '/')
+
+        params = {}
+        for param in list(path_params) + list(op.get('parameters') or []):
+            param = _resolve(spec, param)
+            if param.get('name'):
+                params[(param.get('in'), param['name'])] = param
+        self.params = []
+        self.body = None
+        self.body_required = False
+        self.body_media = []
+        form_fields = {}
+        for (location, name), param in params.items():
+            schema = index.fold(_param_schema(param))
+            if location == 'body':
+                self.body, self.body_required = schema, bool(param.get('required'))
+                self.body_media = op.get('consumes') or spec.get('consumes') or []
+            elif location == 'formData':
+                form_fields[name] = (schema, bool(param.get('required')))
+            else:
+                self.params.append((location, name, schema, bool(param.get('required')),
+                                    short_description(param.get('description'))))
+        if form_fields:
+            self.body = {'type': 'object', 'properties': {n: s for n, (s, _) in form_fields.items()},
+                         'required': [n for n, (_, r) in form_fields.items() if r]}
+            self.body_media = op.get('consumes') or ['multipart/form-data']
+
+        request = _resolve(spec, op.get('requestBody'))
+        if request.get('content'):
+            self.body = index.fold(_first_media_schema(request['content']))
+            self.body_required = bool(request.get('required'))
+            self.body_media = list(request['content'])
+
+        self.responses = []
+        for status, response in (op.get('responses') or {}).items():
+            if _is_noise(str(status)):
+                continue
+            response = _resolve(spec, response)
+            schema = response.get('schema') if 'schema' in response else _first_media_schema(response.get('content'))
+            self.responses.append((str(status), index.fold(schema) if schema else None))
+
+    def schemas(self):
+        """(role, schema) pairs - the role is only used to name hoisted shapes."""
+        yield from ((name, schema) for _, name, schema, _, _ in self.params)
+        if self.body is not None:
+            yield 'body', self.body
+        yield from ((f"response {status}", schema) for status, schema in self.responses if schema is not None)
+
+    def refold(self, index):
+        self.params = [(location, name, index.fold(schema), required, description)
+                       for location, name, schema, required, description in self.params]
+        self.body = index.fold(self.body)
+        self.responses = [(status, index.fold(schema)) for status, schema in self.responses]
+
+    def render(self, index):
+        head = f"{self.method} {self.path}"
+        if self.summary:
+            head += f" - {self.summary}"
+        if self.operation_id:
+            head += f" ({self.operation_id})"
+        if self.deprecated:
+            head += " [deprecated]"
+        lines = [head]
+        if self.security is not None:
+            names = sorted({name for requirement in self.security for name in requirement})
+            lines.append(f"  auth: {', '.join(names) if names else 'none'}")
+        for location, name, schema, required, description in self.params:
+            line = f"  {location} {index.field_line(name, schema, required)}"
+            if description and ' - ' not in line:
+                line += f" - {description}"
+            lines.append(line)
+        if self.body is not None:
+            media = f" ({', '.join(self.body_media)})" if self.body_media and self.body_media != ['application/json'] else ''
+            lines.append(f"  body{'*' if self.body_required else ''}{media}: {index.type_of(self.body)}")
+        if self.responses:
+            parts = [f"{status}: {index.type_of(schema)}" if schema else status for status, schema in self.responses]
+            lines.append(f"  -> {'; '.join(parts)}")
+        return '\n'.join(lines)
+
+
+def _collect_names(node, found):
+    if isinstance(node, dict):
+        if '$ref' in node and len(node) == 1:
+            found.add(node['$ref'])
+        for value in node.values():
+            _collect_names(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_names(value, found)
+
+
+def _camel(text):
+    return ''.join(word[:1].upper() + word[1:] for word in re.split(r'[^0-9A-Za-z]+', str(text)))
+
+
+def _count_inline_objects(node, counts, samples, hint, top=True):
+    # Every structured inline schema, for hoisting repeats; hint names it
+    if isinstance(node, dict):
+        if not top and _is_structured(node) and '$ref' not in node:
+            key = _key(node)
+            counts[key] += 1
+            samples.setdefault(key, (node, hint))
+        for key, value in node.items():
+            if key == 'properties' and isinstance(value, dict):
+                for name, sub in value.items():
+                    _count_inline_objects(sub, counts, samples, name, top=False)
+            elif key in SCHEMA_CHILD_KEYS:
+                _count_inline_objects(value, counts, samples, hint, top=False)
+            elif key in dict(SCHEMA_LIST_KEYS) and isinstance(value, list):
+                for sub in value:
+                    _count_inline_objects(sub, counts, samples, hint, top=False)
+
+
+def _header(spec):
+    info = spec.get('info') or {}
+    flavour = f"OpenAPI {spec['openapi']}" if 'openapi' in spec else f"Swagger {spec.get('swagger', '')}".rstrip()
+    title = f"{info.get('title', 'API')} {info.get('version', '')}".rstrip()
+    lines = [f"# {title} ({flavour}, compacted)"]
+    description = short_description(info.get('description'))
+    if description:
+        lines.append(description)
+
+    servers = [s.get('url') for s in spec.get('servers') or [] if isinstance(s, dict) and s.get('url')]
+    if not servers and spec.get('host'):
+        schemes = spec.get('schemes') or ['https']
+        servers = [f"{schemes[0]}://{spec['host']}{spec.get('basePath', '')}"]
+    if servers:
+        lines.append(f"Base URL: {', '.join(servers)}")
+
+    schemes = (spec.get('components') or {}).get('securitySchemes') or spec.get('securityDefinitions') or {}
+    auth = []
+    for name, scheme in schemes.items():
+        scheme = _resolve(spec, scheme)
+        kind = scheme.get('type', '?')
+        if kind == 'apiKey':
+            detail = f"apiKey in {scheme.get('in')} {scheme.get('name')}"
+        elif kind == 'http':
+            detail = f"http {scheme.get('scheme', '')}".rstrip()
+        else:
+            detail = kind
+        auth.append(f"{name} ({detail})")
+    if auth:
+        lines.append(f"Auth: {'; '.join(auth)}")
+    if spec.get('security'):
+        names = sorted({name for requirement in spec['security'] for name in requirement})
+        lines.append(f"Default auth: {', '.join(names)}")
+    lines.append(NOTATION)
+    return '\n'.join(lines)
+
+
+def compact_openapi(spec):
+    """Canonical compact text for a parsed spec. Returns (text, operations, schemas, dropped)."""
+    index = _SchemaIndex(spec)
+    operations = []
+    for path, item in spec.get('paths', {}).items():
+        item = _resolve(spec, item)
+        path_params = item.get('parameters') or []
+        for method in HTTP_METHODS:
+            if isinstance(item.get(method), dict):
+                operations.append(_Operation(spec, index, method, path, item[method], path_params))
+
+    # Hoisting an inner shape changes the outer ones, so repeat until stable
+    while True:
+        counts, samples = Counter(), {}
+        for op in operations:
+            for role, schema in op.schemas():
+                _count_inline_objects(schema, counts, samples, f"{op.operation_id or op.group} {role}", top=False)
+        for name, schema in index.named.items():
+            _count_inline_objects(schema, counts, samples, name)
+        if not index.hoist(counts, samples):
+            break
+        for op in operations:
+            op.refold(index)
+
+    # Only schemas the operations actually reach (transitively)
+    pending = set()
+    for op in operations:
+        for _, schema in op.schemas():
+            _collect_names(schema, pending)
+    used = set()
+    while pending:
+        name = pending.pop()
+        if name in used or name not in index.named:
+            continue
+        used.add(name)
+        _collect_names(index.named[name], pending)
+
+    groups = {}
+    for op in operations:
+        groups.setdefault(op.group, []).append(op)
+    blocks = [_header(spec)]
+    for group, ops in groups.items():
+        blocks.append(f"## {group}\n" + '\n'.join(op.render(index) for op in ops))
+    names = [name for name in index.named if name in used]
+    if names:
+        blocks.append("## Schemas\n" + '\n'.join(index.render(name) for name in names))
+    dropped = len([name for name in index.named if name not in used and name not in index.hoisted.values()])
+    return '\n\n'.join(blocks) + '\n', len(operations), len(names), dropped
+
+
+def compact_spec(text):
+    """CompactSpec for OpenAPI documentation, None for anything else (or no gain).
+
+    A spec shaped in a way the compactor doesn't understand also gives None,
+    so the caller sends the documentation as it was pasted.
+    """
+    spec = parse_openapi(text)
+    if spec is None:
+        return None
+    try:
+        compacted, operations, schemas, dropped = compact_openapi(spec)
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        # Hand-edited specs come in every shape - better the raw text than no run
+        return None
+    result = CompactSpec(compacted, rough_token_count(text), operations, schemas, dropped)
+    if result.tokens >= result.original_tokens:
+        return None
+    return result
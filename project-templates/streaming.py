@@ -0,0 +1,98 @@
+"""
+Streaming helpers - render Gemini output while it is still being generated.
+
+generate_content(..., stream=True) gives us chunks as they arrive, so the
+user can start reading after a second or two instead of staring at a
+spinner for a whole minute. We also time the call so the apps can show
+time-to-first-token next to the total, and close the call's CallRecord
+(call_metrics.py) once the text - and with it usage_metadata - is in.
+"""
+
+import time
+
+from gemini_client import classify_error
+
+
+class StreamResult:
+    """Final text of a (streamed or not) generation plus its timings."""
+
+    def __init__(self, text, ttft, total, chunks=1):
+        self.text = text
+        self.ttft = ttft        # seconds until the first non-empty chunk
+        self.total = total      # seconds until the last chunk
+        self.chunks = chunks
+
+    def timing_caption(self):
+        if self.chunks > 1:
+            return f"⏱️ First token after {self.ttft:.1f}s • done in {self.total:.1f}s ({self.chunks} chunks)"
+        return f"⏱️ Generated in {self.total:.1f}s"
+
+
+def chunk_text(chunk):
+    """Text of one chunk - the final chunk of a stream can have no parts at all."""
+    try:
+        return chunk.text
+    except ValueError:
+        return ''
+
+
+def _draw(placeholder, text, language, markdown, cursor):
+    shown = text + (' ▌' if cursor else '')
+    if markdown:
+        placeholder.markdown(shown)
+    else:
+        placeholder.code(shown, language=language)
+
+
+def stream_to_placeholder(chunks, placeholder, started=None, language=None,
+                          markdown=False, refresh_seconds=0.15, record=None, sink=None):
+    """Consume a streamed response, redrawing placeholder as text arrives.
+
+    `started` should be taken *before* generate_content() is called, since
+    the SDK already blocks on the first chunk inside that call. Redraws are
+    throttled - re-rendering a huge st.code block per chunk gets expensive.
+    A stream that breaks half way fails the record with the error's kind.
+    sink.feed(text) (e.g. a project_files.ProjectBuilder) sees every chunk as
+    it arrives.
+    """
+    if started is None:
+        started = time.perf_counter()
+
+    parts = []
+    ttft = None
+    last_draw = 0.0
+    try:
+        for chunk in chunks:
+            text = chunk_text(chunk)
+            if not text:
+                continue
+            now = time.perf_counter()
+            if ttft is None:
+                ttft = now - started
+            parts.append(text)
+            if sink is not None:
+                sink.feed(text)
+            if now - last_draw >= refresh_seconds:
+                _draw(placeholder, ''.join(parts), language, markdown, cursor=True)
+                last_draw = now
+    except Exception as e:
+        if record is not None:
+            record.fail(classify_error(e))
+        raise
+
+    full_text = ''.join(parts)
+    total = time.perf_counter() - started
+    _draw(placeholder, full_text, language, markdown, cursor=False)
+    if record is not None:
+        # TTFT relative to when the record was opened, not to `started`
+        record.finish(chunks, ttft=None if ttft is None else started + ttft - record.started)
+    return StreamResult(full_text, ttft if ttft is not None else total, total, len(parts))
+
+
+def finish_blocking(response, started, record=None):
+    """Wrap a regular (non-streamed) response in a StreamResult for uniform timing."""
+    text = response.text
+    total = time.perf_counter() - started
+    if record is not None:
+        record.finish(response)
+    return StreamResult(text, total, total)
@@ -0,0 +1,42 @@
+"""
+Shared setup for the test suite.
+
+The modules live next to the apps rather than in a package, so their
+directory goes on sys.path. The environment is pinned before anything is
+imported: no shared rate limiter, no metrics log, caches in a throwaway
+directory.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ['GEMINI_RPM'] = '0'
+os.environ['GEMINI_METRICS_LOG'] = ''
+os.environ.setdefault('CODEGEN_CACHE_DIR', tempfile.mkdtemp(prefix='codegen-tests-'))
+os.environ.pop('GEMINI_FAKE', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini import FakeModel, FakeSettings  # noqa: E402
+from gemini_client import set_model_factory  # noqa: E402
+
+
+@pytest.fixture
+def fake_model():
+    """A fast, deterministic FakeModel - no jitter, no errors."""
+    return FakeModel('models/fake', settings=FakeSettings(
+        ttft=0.05, tokens_per_second=20000.0, chunk_seconds=0.01, output_tokens=400, jitter=0.0
+    ))
+
+
+@pytest.fixture
+def fake_backend():
+    """get_model() hands out fast FakeModels, for code that builds its own model."""
+    set_model_factory(FakeSettings(
+        ttft=0.01, tokens_per_second=50000.0, chunk_seconds=0.01, output_tokens=200, jitter=0.0
+    ).factory())
+    yield
+    set_model_factory(None)
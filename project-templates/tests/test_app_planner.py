@@ -0,0 +1,145 @@
+import threading
+
+import pytest
+
+from app_planner import (
+    MAX_CONTINUATIONS, Plan, PlannedFile, assemble, generate_files, hit_output_cap, join_continuation,
+    make_plan, parse_plan, strip_fence,
+)
+from project_files import parse_project
+
+
+F = '```'
+README = f"# Usage\n\n{F}bash\npip install x\n{F}"
+
+
+class _Reason:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Candidate:
+    def __init__(self, capped):
+        self.finish_reason = _Reason('MAX_TOKENS' if capped else 'STOP')
+
+
+class _Response:
+    usage_metadata = None
+
+    def __init__(self, text, capped=False):
+        self.text = text
+        self.candidates = [_Candidate(capped)]
+
+
+class ScriptedModel:
+    """Answers each file prompt with the next scripted (text, capped) for that path."""
+
+    def __init__(self, scripts):
+        self.scripts = {path: list(answers) for path, answers in scripts.items()}
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, **kwargs):
+        with self._lock:
+            self.prompts.append(contents)
+            path = next(p for p in self.scripts if f"contents of {p} " in contents)
+            text, capped = self.scripts[path].pop(0)
+        return _Response(text, capped)
+
+
+def _written(model, plan):
+    contents = [None] * len(plan.files)
+    continued = [0] * len(plan.files)
+    for index, content, _, continuations, error in generate_files(model, plan, 'docs', 'CLI Tool', {}):
+        assert error is None
+        contents[index], continued[index] = content, continuations
+    return contents, continued
+
+
+@pytest.mark.parametrize('text, expected', [
+    (f"{F}python\nprint(1)\n{F}\n", 'print(1)'),
+    (f"{F}python\nprint(1)", 'print(1)'),                       # cut off before the closing fence
+    (README, README),                                           # the fence closes the README's block
+    (f"{F}markdown\n{README}\n{F}", README),
+    ("print(1)\n\n", 'print(1)'),
+])
+def test_strip_fence_only_drops_a_wrapping_fence(text, expected):
+    assert strip_fence(text) == expected
+
+
+def test_continuation_closes_the_fence_an_earlier_piece_opened():
+    assert strip_fence(f"rest()\n{F}", wrapped=True) == 'rest()'
+    assert strip_fence(f"rest()\n{F}") == f"rest()\n{F}"
+
+
+def test_join_continuation_drops_the_repeated_tail():
+    previous = 'def handler(request):\n    return {"status": "ok"}\n'
+    assert join_continuation(previous, '    return {"status": "ok"}\n\nx = 1') == previous + '\nx = 1'
+    assert join_continuation('abc', 'abc') == 'abcabc'         # short overlaps are coincidence
+
+
+def test_parse_plan_tolerates_fences_and_chatter():
+    plan = parse_plan(f'{F}json\n{{"summary": "Todo app", "files": ['
+                      '{"path": "app.py", "purpose": "entry", "interfaces": ["main()", "run()"]},'
+                      '{"path": "./app.py"}, "junk", {"path": "README.md"}]}\n' + F)
+    assert [f.path for f in plan.files] == ['app.py', 'README.md']
+    assert plan.files[0].interfaces == 'main(); run()'
+    assert 'provides: main(); run()' in plan.render()
+    assert len(parse_plan('Sure! {"files": [{"path": "a.py"}, {"path": "b.py"}]} Done.', max_files=1).files) == 1
+    for text in ('no json here', '{"files": []}'):
+        with pytest.raises(ValueError):
+            parse_plan(text)
+
+
+def test_make_plan_uses_the_json_manifest(fake_model):
+    plan = make_plan(fake_model, 'GET /todos', 'CLI Tool')
+    assert plan.files and all(f.purpose for f in plan.files)
+
+
+def test_hit_output_cap():
+    assert hit_output_cap(_Response('', capped=True))
+    assert not hit_output_cap(_Response(''))
+    assert not hit_output_cap(object())
+
+
+def test_every_file_is_written_and_unwrapped():
+    plan = Plan([PlannedFile('app.py', 'entry'), PlannedFile('README.md', 'docs')])
+    model = ScriptedModel({
+        'app.py': [(f"{F}python\nprint('hi')\n{F}", False)],
+        'README.md': [(README, False)],
+    })
+    contents, continued = _written(model, plan)
+    assert contents == ["print('hi')", README]
+    assert continued == [0, 0]
+
+
+def test_cut_off_files_are_continued():
+    plan = Plan([PlannedFile('app.py'), PlannedFile('README.md')])
+    model = ScriptedModel({
+        'app.py': [(f"{F}python\ndef main():\n    step_one()\n    step_", True), (f"two()\n{F}", False)],
+        # Unwrapped and cut off mid-example: the last fence is the README's own
+        'README.md': [(f"# Usage\n\n{F}bash\npip ins", True), (f"tall x\n{F}", False)],
+    })
+    contents, continued = _written(model, plan)
+    assert contents[0] == 'def main():\n    step_one()\n    step_two()'
+    assert contents[1] == README
+    assert continued == [1, 1]
+    assert sum('cut off by the output limit' in p for p in model.prompts) == 2
+
+
+def test_continuations_stop_at_the_limit():
+    plan = Plan([PlannedFile('app.py')])
+    model = ScriptedModel({'app.py': [(f"part{n}\n", True) for n in range(MAX_CONTINUATIONS + 1)]})
+    contents, continued = _written(model, plan)
+    assert continued == [MAX_CONTINUATIONS]
+    assert contents[0].count('part') == MAX_CONTINUATIONS + 1
+
+
+def test_assembled_answer_round_trips_through_the_project_parser():
+    plan = Plan([PlannedFile('app.py'), PlannedFile('README.md'), PlannedFile('broken.py')], summary='Todo app')
+    text = assemble(plan, ["print('hi')", README, None])
+    assert text.startswith('Todo app\n\n')
+    assert '````' in text and 'broken.py' not in text
+    project = parse_project(text)
+    assert [f.path for f in project.files] == ['app.py', 'README.md']
+    assert project.read('app.py').strip() == "print('hi')" and project.read('README.md').strip() == README
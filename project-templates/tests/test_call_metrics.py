@@ -0,0 +1,85 @@
+import json
+import time
+
+from call_metrics import CACHE, OK, CallMetrics, CallRecord
+
+
+class _Usage:
+    prompt_token_count = 1200
+    candidates_token_count = 300
+    cached_content_token_count = None
+
+
+class _Response:
+    usage_metadata = _Usage()
+
+
+def _finish(metrics, feature, latency, status=OK, ttft=None):
+    record = CallRecord(feature, metrics=metrics)
+    record.started = time.perf_counter() - latency
+    if status == OK:
+        record.finish(_Response(), ttft=ttft)
+    else:
+        record.finish(status=status)
+    return record
+
+
+def _samples(text):
+    """{'name{labels}': value} for every sample line of the exposition."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_latency_buckets_are_cumulative():
+    metrics = CallMetrics(log_path=None)
+    for latency in (0.05, 3, 15, 400):
+        _finish(metrics, 'doc2app', latency)
+    samples = _samples(metrics.prometheus_text())
+
+    def bucket(le):
+        return samples[f'gemini_call_latency_seconds_bucket{{feature="doc2app",le="{le}"}}']
+
+    assert bucket('0.1') == 1
+    assert bucket('2') == 1
+    assert bucket('5') == 2
+    assert bucket('20') == 3
+    assert bucket('300') == 3
+    assert bucket('+Inf') == 4
+    assert samples['gemini_call_latency_seconds_count{feature="doc2app"}'] == 4
+    assert 418 < samples['gemini_call_latency_seconds_sum{feature="doc2app"}'] < 419
+    bounds = [value for name, value in samples.items() if name.startswith('gemini_call_ttft_seconds_bucket')]
+    assert bounds == sorted(bounds)
+
+
+def test_only_ok_calls_are_observed_as_latency():
+    metrics = CallMetrics(log_path=None)
+    _finish(metrics, 'refactor', 1.5, ttft=0.4)
+    _finish(metrics, 'refactor', 0.01, status=CACHE)
+    _finish(metrics, 'refactor', 50, status='rate_limit')
+    samples = _samples(metrics.prometheus_text())
+    assert samples['gemini_calls_total{feature="refactor",status="ok"}'] == 1
+    assert samples['gemini_calls_total{feature="refactor",status="cache"}'] == 1
+    assert samples['gemini_calls_total{feature="refactor",status="rate_limit"}'] == 1
+    assert samples['gemini_call_latency_seconds_count{feature="refactor"}'] == 1
+    assert samples['gemini_call_latency_seconds_bucket{feature="refactor",le="+Inf"}'] == 1
+    assert samples['gemini_call_ttft_seconds_bucket{feature="refactor",le="0.5"}'] == 1
+    assert samples['gemini_prompt_tokens_total{feature="refactor"}'] == 1200
+
+    row, = metrics.summary_rows()
+    assert (row['calls'], row['cache hits'], row['errors']) == (3, 1, 1)
+
+
+def test_finished_calls_are_logged_once_as_json_lines(tmp_path):
+    path = tmp_path / 'metrics' / 'calls.jsonl'
+    metrics = CallMetrics(log_path=str(path))
+    record = _finish(metrics, 'image_to_code', 2.0)
+    record.finish()
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1
+    logged = json.loads(lines[0])
+    assert logged['feature'] == 'image_to_code' and logged['status'] == OK
+    assert logged['output_tokens'] == 300
@@ -0,0 +1,125 @@
+from chunked_refactor import (
+    ChunkResult, apply_hunks, assemble, is_python, parse_answer, refactor_chunks, split_code,
+)
+
+
+PYTHON = '\n'.join(
+    ['import os', '', '']
+    + [line for n in range(40) for line in (f'# helper {n}', f'def helper_{n}(value):',
+                                            f'    total = value + {n}', '    return total', '', '')]
+    + ['class Service:', '    def run(self):', '        return helper_0(1)', '']
+)
+
+JS = '\n'.join(
+    ["import React from 'react';", '']
+    + [line for n in range(30) for line in (f'function widget{n}(props) {{', f'  const size = {n};',
+                                            '  return size * props.scale;', '}', '')]
+    + ['export default widget0;', '']
+)
+
+
+def _covers_every_line(code, chunks):
+    assert chunks[0].start == 1 and chunks[-1].end == len(code.split('\n'))
+    for before, after in zip(chunks, chunks[1:]):
+        assert after.start == before.end + 1
+    assert '\n'.join(c.text for c in chunks) == code
+
+
+def test_python_split_covers_every_line_at_unit_boundaries():
+    chunks = split_code(PYTHON, max_lines=50)
+    assert len(chunks) > 3
+    _covers_every_line(PYTHON, chunks)
+    for chunk in chunks[1:]:
+        # Cut before a function's leading comment, never inside the function
+        assert chunk.text.startswith(('# helper', 'class Service'))
+        assert is_python(chunk.text)
+    assert chunks[-1].names[-1] == 'Service'
+
+
+def test_javascript_split_covers_every_line_at_top_level_blocks():
+    chunks = split_code(JS, max_lines=40)
+    assert len(chunks) > 2
+    _covers_every_line(JS, chunks)
+    for chunk in chunks[1:]:
+        assert chunk.text.startswith(('function widget', 'export default'))
+    assert 'widget0' in chunks[0].names
+
+
+def test_small_files_stay_one_chunk():
+    chunks = split_code('x = 1\ny = 2\n', max_lines=50)
+    assert len(chunks) == 1 and chunks[0].text == 'x = 1\ny = 2\n'
+
+
+def test_hunks_apply_by_context_not_line_numbers():
+    chunk = split_code(PYTHON, max_lines=50)[1]
+    answer = (
+        "NOTES:\n- clearer name\n\n```diff\n"
+        "@@ -999,4 +999,4 @@\n"
+        " def helper_10(value):\n-    total = value + 10\n-    return total\n+    result = value + 10\n+    return result\n"
+        "```\n"
+    )
+    notes, hunks = parse_answer(answer)
+    assert notes == '- clearer name'
+    patched, applied, rejected = apply_hunks(chunk.text, hunks)
+    assert (applied, rejected) == (1, 0)
+    assert '    result = value + 10\n    return result' in patched
+    assert 'total = value + 10' not in patched
+
+
+def test_hunks_that_do_not_match_are_rejected():
+    _, hunks = parse_answer("```diff\n@@\n def nowhere():\n-    pass\n+    return 1\n```")
+    text, applied, rejected = apply_hunks(PYTHON, hunks)
+    assert (text, applied, rejected) == (PYTHON, 0, 1)
+
+
+def test_no_changes_means_no_hunks():
+    assert parse_answer("NO CHANGES") == ('', [])
+
+
+def test_chunk_that_breaks_the_file_is_reverted():
+    chunks = split_code(PYTHON, max_lines=50)
+    good = ChunkResult(chunks[0], chunks[0].text.replace('helper_0(value)', 'helper_0(value, scale=1)'))
+    broken = ChunkResult(chunks[1], chunks[1].text.replace('    return total', '    return total)', 1))
+    code = assemble(chunks, [good, broken] + [None] * (len(chunks) - 2))
+    assert is_python(code)
+    assert 'helper_0(value, scale=1)' in code
+    assert not good.reverted and broken.reverted
+    assert chunks[1].text in code
+
+
+def test_javascript_chunk_that_unbalances_braces_is_reverted():
+    chunks = split_code(JS, max_lines=40)
+    broken = ChunkResult(chunks[0], chunks[0].text.replace('}', '', 1))
+    assert assemble(chunks, [broken] + [None] * (len(chunks) - 1)) == JS
+    assert broken.reverted
+
+
+class DiffModel:
+    """Answers every chunk with a diff renaming `total` to `result`."""
+
+    class Response:
+        def __init__(self, text):
+            self.text = text
+
+    def generate_content(self, contents, **kwargs):
+        code = contents.split('```\n', 1)[1].split('\n```', 1)[0]
+        lines = code.split('\n')
+        start = next(i for i, line in enumerate(lines) if 'total = ' in line)
+        context = lines[max(0, start - 1):start]
+        diff = ['@@'] + [' ' + line for line in context] + [
+            '-' + lines[start], '+' + lines[start].replace('total', 'result'),
+            '-' + lines[start + 1], '+' + lines[start + 1].replace('total', 'result'),
+        ]
+        return self.Response("NOTES:\n- rename\n\n```diff\n" + '\n'.join(diff) + "\n```")
+
+
+def test_refactor_chunks_patches_every_chunk_concurrently():
+    chunks = split_code(PYTHON, max_lines=50)
+    results = [None] * len(chunks)
+    for index, result, seconds, error in refactor_chunks(DiffModel(), chunks, 'clarity', 'Python', max_workers=3):
+        assert error is None
+        results[index] = result
+    assert all(r.applied == 1 and r.rejected == 0 for r in results)
+    code = assemble(chunks, results)
+    assert is_python(code)
+    assert code.count('result = value + ') == len(chunks)
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+from PIL import Image
+
+import response_cache
+from codevision_batch import find_images, main, output_path
+from codevision_prompts import MODEL_NAME
+from gemini_client import get_model
+
+
+@pytest.fixture
+def designs(tmp_path):
+    folder = tmp_path / 'designs'
+    (folder / 'mobile').mkdir(parents=True)
+    for n, name in enumerate(['home.png', 'mobile/login.png', 'notes.txt']):
+        if name.endswith('.png'):
+            Image.new('RGB', (64, 48), (10 * n, 80, 160)).save(folder / name)
+        else:
+            (folder / name).write_text('not an image')
+    return folder
+
+
+def _run(designs, out, *extra):
+    return main([str(designs), '--out', str(out), '--api-key', 'fake', '--no-cache', *extra])
+
+
+def _calls():
+    return get_model('fake', MODEL_NAME).calls
+
+
+def test_folders_and_globs_are_expanded_once(designs):
+    found = find_images([str(designs), str(designs / '**' / '*.png')])
+    assert sorted(os.path.relpath(path, base) for path, base in found) == ['home.png', 'mobile/login.png']
+
+
+def test_outputs_mirror_the_input_layout():
+    assert output_path('designs/mobile/login.png', 'designs', 'out', 'React') == os.path.join('out', 'mobile', 'login.jsx')
+    assert output_path('designs/home.png', 'designs', 'out', 'HTML/CSS/JS') == os.path.join('out', 'home.html')
+
+
+def test_every_image_is_converted(fake_backend, designs, tmp_path):
+    out = tmp_path / 'out'
+    assert _run(designs, out) == 0
+    assert (out / 'home.html').read_text().strip()
+    assert (out / 'mobile' / 'login.html').read_text().strip()
+    assert not list(out.rglob('*.part'))
+    assert _calls() == 2
+
+
+def test_rerun_skips_finished_outputs_unless_forced(fake_backend, designs, tmp_path, capsys):
+    out = tmp_path / 'out'
+    _run(designs, out)
+    # An empty file is what a crash before the first byte looks like - redo it
+    (out / 'home.html').write_text('')
+    assert _run(designs, out) == 0
+    assert '1 image(s) to convert, 1 already done' in capsys.readouterr().out
+    assert _calls() == 3 and (out / 'home.html').read_text().strip()
+
+    assert _run(designs, out) == 0 and _calls() == 3
+    assert _run(designs, out, '--force') == 0 and _calls() == 5
+
+
+def test_same_stem_keeps_the_source_extension(fake_backend, designs, tmp_path):
+    Image.new('RGB', (64, 48), (200, 0, 0)).save(designs / 'home.jpg')
+    out = tmp_path / 'out'
+    assert _run(designs, out) == 0
+    # home.jpg sorts first and gets the plain name
+    assert (out / 'home.html').exists() and (out / 'home.png.html').exists()
+
+
+def test_cached_answers_are_reused(fake_backend, designs, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(response_cache, 'DEFAULT_CACHE_DIR', str(tmp_path / 'cache'))
+    args = [str(designs), '--out', str(tmp_path / 'out'), '--api-key', 'fake']
+    assert main(args) == 0
+    assert main(args + ['--force']) == 0
+    assert _calls() == 2
+    assert capsys.readouterr().out.count(', cache)') == 2
+
+
+def test_a_failed_image_fails_the_run_but_not_the_others(fake_backend, designs, tmp_path):
+    (designs / 'broken.png').write_bytes(b'not really a png')
+    out = tmp_path / 'out'
+    assert _run(designs, out) == 1
+    assert (out / 'home.html').exists() and not (out / 'broken.html').exists()
+
+
+def test_no_api_key_is_a_usage_error(designs, tmp_path, monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', '')
+    monkeypatch.setattr('codevision_batch.load_dotenv', lambda: None)
+    assert main([str(designs), '--out', str(tmp_path / 'out')]) == 2
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+import context_cache
+from context_cache import ContextCacheRegistry, LocalContextBackend, PrefixedModel
+from gemini_client import set_model_factory
+
+
+MODEL = 'models/gemini-2.5-flash'
+DOCS = "# Payments API\n\nPOST /charges creates a charge.\n" * 50
+
+
+@pytest.fixture(autouse=True)
+def fake_models(fake_model):
+    set_model_factory(lambda model_name, system_instruction=None: fake_model)
+    yield
+    set_model_factory(None)
+
+
+def _registry(backend=None, **kwargs):
+    kwargs.setdefault('path', None)
+    kwargs.setdefault('min_tokens', 100)
+    return ContextCacheRegistry(backend or LocalContextBackend(), **kwargs)
+
+
+def _get(registry, docs=DOCS, tokens=5000, **kwargs):
+    return registry.get('key', MODEL, 'system', docs, tokens, **kwargs)
+
+
+class FailingBackend(LocalContextBackend):
+    def create(self, *args):
+        self.created += 1
+        raise RuntimeError('model does not support caching')
+
+
+def test_uploads_once_then_reuses():
+    backend = LocalContextBackend()
+    registry = _registry(backend)
+    first = _get(registry)
+    second = _get(registry)
+    assert first is second and second.reused
+    assert backend.created == 1
+    assert registry.stats() == {'caches': 1, 'tokens': 5000, 'uploads': 1, 'reuses': 1}
+    assert isinstance(second.model, PrefixedModel)
+    assert second.model._contents('options')[0].endswith(DOCS)
+
+
+def test_small_documents_are_sent_inline():
+    assert _get(_registry(), tokens=50) is None
+
+
+def test_hit_in_the_last_quarter_of_the_ttl_refreshes_it():
+    registry = _registry(ttl=400)
+    entry = _get(registry)
+    entry.expires_at = time.time() + 200          # half left - left alone
+    _get(registry)
+    assert entry.seconds_left < 201
+    entry.expires_at = time.time() + 60           # last quarter - extended
+    _get(registry)
+    assert entry.seconds_left > 390
+
+
+def test_least_recently_used_cache_is_evicted_at_the_cap():
+    backend = LocalContextBackend()
+    registry = _registry(backend, max_caches=2)
+    first = _get(registry, docs=DOCS + 'one')
+    second = _get(registry, docs=DOCS + 'two')
+    time.sleep(0.01)
+    _get(registry, docs=DOCS + 'one')             # first is now the most recent
+    _get(registry, docs=DOCS + 'three')
+    assert registry.stats()['caches'] == 2
+    assert second.name not in backend._caches
+    assert first.name in backend._caches
+    assert _get(registry, docs=DOCS + 'one') is first
+
+
+def test_failed_creation_backs_off(monkeypatch):
+    backend = FailingBackend()
+    registry = _registry(backend)
+    assert _get(registry) is None
+    assert _get(registry) is None
+    assert backend.created == 1
+    # Once the backoff is over the next click tries again
+    monkeypatch.setattr(context_cache, 'FAILURE_BACKOFF', 0)
+    registry = _registry(backend)
+    assert _get(registry) is None
+    assert _get(registry) is None
+    assert backend.created == 3
+
+
+def test_cache_gone_on_the_server_is_created_again():
+    backend = LocalContextBackend()
+    registry = _registry(backend)
+    old = _get(registry)
+    backend.delete('key', old.name)               # backend.model() now fails for it
+    new = _get(registry)
+    assert new is not None and new.name != old.name and not new.reused
+    assert registry.stats()['uploads'] == 2
+
+
+def test_handles_survive_a_restart(tmp_path):
+    backend = LocalContextBackend()
+    path = str(tmp_path / 'context_caches.json')
+    entry = _get(_registry(backend, path=path))
+    restarted = _registry(backend, path=path)
+    again = _get(restarted)
+    assert again.name == entry.name and again.reused
+    assert backend.created == 1
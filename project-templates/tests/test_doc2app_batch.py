@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+import doc2app_batch
+from doc2app_batch import completed_ids, load_items, main
+from doc2app_prompts import MODEL_NAME, SYSTEM_INSTRUCTION
+from gemini_client import get_model
+
+
+DEFAULTS = {'app_type': 'CLI Tool', 'complexity': 3, 'include_tests': True,
+            'include_docs': True, 'include_error_handling': True}
+
+
+@pytest.fixture
+def specs(tmp_path):
+    folder = tmp_path / 'specs'
+    (folder / 'shop').mkdir(parents=True)
+    (folder / 'todo.md').write_text("# Todo API\n\nGET /todos lists todos.\n")
+    (folder / 'shop' / 'orders.yaml').write_text("openapi: 3.0.0\npaths: {}\n")
+    (folder / 'logo.png').write_bytes(b'not a spec')
+    return folder
+
+
+def _run(source, out, *extra):
+    return main([str(source), '--out', str(out), '--api-key', 'fake', '--no-cache', *extra])
+
+
+def _results(out):
+    return [json.loads(line) for line in out.read_text().splitlines()]
+
+
+def _calls():
+    return get_model('fake', MODEL_NAME, system_instruction=SYSTEM_INSTRUCTION).calls
+
+
+def test_folder_items_are_named_by_relative_path(specs):
+    items = load_items(str(specs), DEFAULTS)
+    assert [item['id'] for item in items] == ['todo', 'shop/orders']
+    assert all(item['app_type'] == 'CLI Tool' for item in items)
+
+
+def test_jsonl_items_override_the_defaults(tmp_path):
+    (tmp_path / 'billing.yaml').write_text("openapi: 3.0.0\n")
+    jobs = tmp_path / 'jobs.jsonl'
+    jobs.write_text(
+        '{"path": "billing.yaml", "complexity": 5}\n'
+        '\n'
+        '{"documentation": "GET /ping", "include_tests": false}\n'
+    )
+    billing, ping = load_items(str(jobs), DEFAULTS)
+    assert billing['id'] == 'billing' and billing['complexity'] == 5
+    assert billing['path'] == str(tmp_path / 'billing.yaml')
+    assert ping['id'] == 'line-3' and ping['include_tests'] is False and ping['complexity'] == 3
+
+
+@pytest.mark.parametrize('lines, message', [
+    ('{"id": "x"}\n', "needs 'documentation' or 'path'"),
+    ('{"id": "x", "documentation": "a"}\n{"id": "x", "documentation": "b"}\n', 'Duplicate ids: x'),
+])
+def test_bad_jsonl_is_rejected(tmp_path, lines, message):
+    jobs = tmp_path / 'jobs.jsonl'
+    jobs.write_text(lines)
+    with pytest.raises(ValueError, match=message):
+        load_items(str(jobs), DEFAULTS)
+
+
+def test_only_successful_ids_count_as_done(tmp_path):
+    out = tmp_path / 'results.jsonl'
+    out.write_text(
+        '{"id": "a", "status": "ok"}\n'
+        '{"id": "b", "status": "error"}\n'
+        '{"id": "c", "sta'
+    )
+    assert completed_ids(str(out)) == {'a'}
+    assert completed_ids(str(tmp_path / 'missing.jsonl')) == set()
+
+
+def test_every_spec_gets_a_result_line(fake_backend, specs, tmp_path):
+    out = tmp_path / 'results.jsonl'
+    assert _run(specs, out, '-j', '2') == 0
+    results = {record['id']: record for record in _results(out)}
+    assert sorted(results) == ['shop/orders', 'todo']
+    assert all(r['status'] == 'ok' and r['source'] == 'api' and r['text'] for r in results.values())
+    assert all(r['total_tokens'] > 0 and r['latency_s'] >= 0 for r in results.values())
+    assert _calls() == 2
+
+
+def test_rerun_only_retries_what_did_not_succeed(fake_backend, specs, tmp_path, capsys):
+    out = tmp_path / 'results.jsonl'
+    jobs = tmp_path / 'jobs.jsonl'
+    jobs.write_text(
+        f'{{"id": "todo", "path": "{specs / "todo.md"}"}}\n'
+        '{"id": "gone", "path": "missing.md"}\n'
+    )
+    assert _run(jobs, out) == 1
+    assert {r['id']: r['status'] for r in _results(out)} == {'todo': 'ok', 'gone': 'error'}
+
+    assert _run(jobs, out) == 1
+    assert '1 spec(s) to generate, 1 already done' in capsys.readouterr().out
+    assert _calls() == 1
+
+    assert _run(jobs, out, '--force') == 1 and _calls() == 2
+    assert len(_results(out)) == 5
+
+
+def test_cached_generations_are_reused(fake_backend, specs, tmp_path, monkeypatch):
+    monkeypatch.setattr(doc2app_batch, 'DEFAULT_CACHE_DIR', str(tmp_path / 'cache'))
+    out = tmp_path / 'results.jsonl'
+    args = [str(specs), '--out', str(out), '--api-key', 'fake']
+    assert main(args) == 0
+    assert main(args + ['--force']) == 0
+    assert _calls() == 2
+    assert [r['source'] for r in _results(out)] == ['api', 'api', 'cache', 'cache']
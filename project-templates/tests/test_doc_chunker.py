@@ -0,0 +1,136 @@
+import json
+
+from doc_chunker import (
+    Chunk, build_condensed_documentation, extract_contracts, parse_openapi, split_documentation,
+    split_markdown,
+)
+from gemini_client import BLOCKED, GeminiError
+
+
+F = '```'
+
+MARKDOWN = (
+    "Intro text.\n\n"
+    "# API\n\nOverview.\n\n"
+    "## Users\n\nList users.\n\n"
+    f"{F}bash\n# not a heading inside a fence\ncurl /users\n{F}\n\n"
+    "## Orders\n\nList orders.\n\n"
+    "# Errors\n\nError codes.\n"
+)
+
+
+def _spec(paths):
+    return {
+        'openapi': '3.0.0',
+        'info': {'title': 'Shop', 'version': '1', 'description': 'long marketing text'},
+        'paths': paths,
+        'components': {'schemas': {
+            'Pet': {'type': 'object', 'properties': {'owner': {'$ref': '#/components/schemas/User'}}},
+            'User': {'type': 'object', 'properties': {'name': {'type': 'string'}}},
+            'Unused': {'type': 'object'},
+        }},
+    }
+
+
+def _op(tag=None, ref=None):
+    op = {'summary': 'x' * 200}
+    if tag:
+        op['tags'] = [tag]
+    if ref:
+        op['responses'] = {'200': {'content': {'application/json': {'schema': {'$ref': ref}}}}}
+    return {'get': op}
+
+
+def test_markdown_sections_keep_the_heading_trail_and_ignore_fenced_hashes():
+    chunks = split_markdown(MARKDOWN, max_chars=80)
+    assert [c.title for c in chunks] == ['Introduction | API', 'API > Users', 'API > Orders | Errors']
+    assert ''.join(c.text for c in chunks) == MARKDOWN
+
+
+def test_markdown_sections_are_packed_up_to_the_limit():
+    chunks = split_markdown(MARKDOWN, max_chars=10_000)
+    assert len(chunks) == 1
+    assert chunks[0].title == 'Introduction | API | API > Users | API > Orders | Errors'
+    small = split_markdown(MARKDOWN, max_chars=120)
+    assert len(small) > 1 and all(len(c) <= 120 for c in small)
+
+
+def test_oversized_section_is_split_on_blank_lines_then_hard_cut():
+    paragraphs = '\n\n'.join(f"Paragraph {n} " + 'word ' * 30 for n in range(6))
+    text = "# Guide\n\n" + paragraphs + "\n\n" + 'x' * 500
+    chunks = split_markdown(text, max_chars=200)
+    assert all(len(c) <= 200 for c in chunks)
+    assert [c.title for c in chunks[:2]] == ['Guide (part 1)', 'Guide (part 2)']
+    assert ''.join(c.text for c in chunks) == text
+    # Paragraphs are only cut when a single one is too long
+    assert all(c.text.startswith(('# Guide', 'Paragraph', '\n\n', 'x')) for c in chunks)
+
+
+def test_openapi_is_split_by_tag_then_first_path_segment():
+    spec = _spec({
+        '/pets': _op('pets', '#/components/schemas/Pet'),
+        '/pets/{id}': _op('pets'),
+        '/users': _op(),
+        '/users/{id}': _op(),
+    })
+    chunks = split_documentation(json.dumps(spec), max_chars=100_000)
+    assert [c.title for c in chunks] == ['tag: pets', 'tag: users']
+    pets = json.loads(chunks[0].text)
+    # Transitive $refs come along, unrelated components and long info don't
+    assert sorted(pets['referenced']) == ['#/components/schemas/Pet', '#/components/schemas/User']
+    assert pets['info'] == {'title': 'Shop', 'version': '1'}
+    assert sorted(json.loads(chunks[1].text)['paths']) == ['/users', '/users/{id}']
+
+
+def test_big_tag_is_split_path_by_path():
+    paths = {f'/pets/{n}': _op('pets') for n in range(10)}
+    chunks = split_documentation(json.dumps(_spec(paths)), max_chars=800)
+    assert len(chunks) > 1
+    assert chunks[0].title == 'tag: pets (part 1)'
+    seen = [path for c in chunks for path in json.loads(c.text)['paths']]
+    assert seen == list(paths)
+
+
+def test_only_openapi_documents_are_parsed_as_specs():
+    assert parse_openapi('{"paths": {}}') == {'paths': {}}
+    assert parse_openapi('{"name": "not a spec"}') is None
+    assert parse_openapi('{broken json') is None
+    assert parse_openapi('# Just markdown') is None
+
+
+class BlockingModel:
+    class Response:
+        def __init__(self, text):
+            self._text = text
+
+        @property
+        def text(self):
+            if self._text is None:
+                raise ValueError("The response has no parts")
+            return self._text
+
+    def generate_content(self, contents, **kwargs):
+        return self.Response(None if 'SECTION: Errors' in contents else 'ENDPOINTS: GET /x')
+
+
+def test_contracts_are_extracted_for_every_chunk(fake_model):
+    chunks = split_markdown(MARKDOWN, max_chars=80)
+    contracts = [None] * len(chunks)
+    for index, contract, seconds, error in extract_contracts(fake_model, chunks, max_workers=3):
+        assert error is None
+        contracts[index] = contract
+    assert all(contracts) and fake_model.calls == len(chunks)
+
+
+def test_blocked_extraction_is_reported_as_an_error():
+    chunks = [Chunk('Users', 'List users.'), Chunk('Errors', 'Error codes.')]
+    outcomes = {index: error for index, _, _, error in extract_contracts(BlockingModel(), chunks)}
+    assert outcomes[0] is None
+    assert isinstance(outcomes[1], GeminiError) and outcomes[1].kind == BLOCKED
+
+
+def test_condensed_documentation_skips_empty_and_failed_chunks():
+    chunks = [Chunk('Users', ''), Chunk('Marketing', ''), Chunk('Orders', ''), Chunk('Errors', '')]
+    condensed = build_condensed_documentation(chunks, ['GET /users', ' none ', 'GET /orders', None])
+    assert '## Users\nGET /users' in condensed and '## Orders\nGET /orders' in condensed
+    assert 'Marketing' not in condensed and 'Errors' not in condensed
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from fake_gemini import CHARS_PER_TOKEN, FakeModel, FakeSettings
+from gemini_client import rough_token_count
+
+
+def _model(**overrides):
+    settings = dict(ttft=0.0, tokens_per_second=1e6, chunk_seconds=0.01, output_tokens=300, jitter=0.0)
+    settings.update(overrides)
+    return FakeModel('models/fake', settings=FakeSettings(**settings))
+
+
+def test_settings_reject_unknown_fields_and_coerce_env_values(monkeypatch):
+    with pytest.raises(TypeError, match='ttfb'):
+        FakeSettings(ttfb=1)
+    monkeypatch.setenv('GEMINI_FAKE_OUTPUT_TOKENS', '800')
+    monkeypatch.setenv('GEMINI_FAKE_ERROR_RATE', '0.25')
+    settings = FakeSettings.from_env()
+    assert settings.output_tokens == 800 and settings.error_rate == 0.25
+    assert settings.as_dict()['ttft'] == FakeSettings.FIELDS['ttft']
+
+
+def test_answers_are_deterministic_and_sized_to_the_request():
+    model = _model()
+    first = model.generate_content('prompt A')
+    assert model.generate_content('prompt A').text == first.text
+    assert model.generate_content('prompt B').text != first.text
+    assert len(first.text) == 300 * CHARS_PER_TOKEN
+    assert first.usage_metadata.prompt_token_count == rough_token_count('prompt A')
+    assert first.candidates[0].finish_reason.name == 'STOP'
+    assert model.calls == 3
+
+
+def test_max_output_tokens_caps_the_answer():
+    response = _model().generate_content('prompt', generation_config={'max_output_tokens': 100})
+    assert len(response.text) == 100 * CHARS_PER_TOKEN
+    assert response.candidates[0].finish_reason.name == 'MAX_TOKENS'
+
+
+def test_json_requests_get_a_file_plan():
+    response = _model().generate_content('plan', generation_config={'response_mime_type': 'application/json'})
+    plan = json.loads(response.text)
+    assert plan['files'] and all({'path', 'purpose', 'interfaces'} <= set(f) for f in plan['files'])
+
+
+def test_stream_chunks_add_up_and_only_the_last_carries_usage():
+    model = _model(tokens_per_second=1000.0)
+    stream = model.generate_content('prompt', stream=True)
+    chunks = list(stream)
+    assert len(chunks) > 1
+    assert ''.join(chunk.text for chunk in chunks) == stream.text == model.generate_content('prompt').text
+    assert [chunk.usage_metadata is not None for chunk in chunks] == [False] * (len(chunks) - 1) + [True]
+
+
+def test_stream_text_drains_the_rest():
+    stream = _model(tokens_per_second=1000.0).generate_content('prompt', stream=True)
+    first = next(iter(stream))
+    assert stream.text.startswith(first.text) and len(stream.text) == 300 * CHARS_PER_TOKEN
+
+
+def test_injected_errors_fail_before_the_first_token():
+    model = _model(error_rate=1.0)
+    errors = set()
+    for _ in range(30):
+        with pytest.raises(api_exceptions.GoogleAPICallError) as caught:
+            model.generate_content('prompt', stream=True)
+        errors.add(type(caught.value))
+    assert errors == {api_exceptions.ResourceExhausted, api_exceptions.ServiceUnavailable,
+                      api_exceptions.DeadlineExceeded}
+    assert model.calls == 30
+
+
+def test_async_and_token_counting_match_the_sync_calls():
+    model = _model()
+    response = asyncio.run(model.generate_content_async('prompt'))
+    assert response.text == model.generate_content('prompt').text
+    assert model.count_tokens('x' * 400).total_tokens == rough_token_count('x' * 400)
+    assert asyncio.run(model.count_tokens_async('x' * 400)).total_tokens == rough_token_count('x' * 400)
+
+
+def test_factory_builds_models_that_share_the_settings():
+    settings = FakeSettings(output_tokens=50)
+    model = settings.factory()('models/x', system_instruction='be brief')
+    assert model.settings is settings and model.system_instruction == 'be brief'
@@ -0,0 +1,68 @@
+import threading
+import time
+
+from fan_out import fan_out, fan_out_events
+from multi_framework import generate_all
+
+
+def test_results_arrive_in_completion_order_with_errors_in_place():
+    delays = [0.3, 0.0, 0.15]
+
+    def work(index):
+        time.sleep(delays[index])
+        if index == 2:
+            raise ValueError('bad item')
+        return index * 10
+
+    outcomes = list(fan_out(work, 3, max_workers=3))
+    assert [index for index, _, _, _ in outcomes] == [1, 2, 0]
+    assert outcomes[0][1:] == (10, outcomes[0][2], None)
+    assert outcomes[1][1] is None and isinstance(outcomes[1][3], ValueError)
+    assert outcomes[2][1] == 0 and outcomes[2][2] >= 0.3
+
+
+def test_workers_run_concurrently_and_respect_max_workers():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(index):
+        with lock:
+            running.append(index)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(index)
+
+    list(fan_out(work, 8, max_workers=3))
+    assert max(peak) == 3
+
+
+def test_events_are_relayed_before_the_outcome():
+    def work(index, emit):
+        emit('progress', index)
+        return index
+
+    events = list(fan_out_events(work, 4, max_workers=2))
+    for index in range(4):
+        mine = [kind for kind, i, _ in events if i == index]
+        assert mine == ['progress', 'done']
+
+
+def test_no_items_yields_nothing():
+    assert list(fan_out(lambda index: index, 0, max_workers=4)) == []
+
+
+def test_generate_all_streams_every_framework(fake_model):
+    jobs = [f"Generate React code #{n}" for n in range(3)]
+    done = {}
+    texts = set()
+    for kind, index, payload in generate_all(fake_model, jobs, stream=True, max_workers=3):
+        if kind == 'text':
+            texts.add(index)
+        elif kind == 'done':
+            done[index] = payload
+        else:
+            assert kind != 'error', payload
+    assert sorted(done) == [0, 1, 2] and texts == {0, 1, 2}
+    assert all(result.text for result in done.values())
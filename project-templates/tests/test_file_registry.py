@@ -0,0 +1,99 @@
+import time
+
+import file_registry
+from file_registry import EXPIRY_MARGIN, FileRegistry, LocalFileBackend
+
+
+IMAGE = b'\x89PNG' + bytes(range(256)) * 200
+
+
+class CountingBackend(LocalFileBackend):
+    def __init__(self, lifetime=None):
+        super().__init__()
+        self.lifetime = lifetime
+        self.uploaded = 0
+
+    def upload(self, api_key, data, mime_type):
+        self.uploaded += 1
+        name, uri, expires_at = super().upload(api_key, data, mime_type)
+        return name, uri, time.time() + self.lifetime if self.lifetime else expires_at
+
+
+def _registry(backend, **kwargs):
+    kwargs.setdefault('path', None)
+    kwargs.setdefault('background', False)
+    return FileRegistry(backend, min_bytes=1024, **kwargs)
+
+
+def _is_inline(part):
+    return part == {'mime_type': 'image/png', 'data': IMAGE}
+
+
+def test_first_use_goes_inline_later_uses_reference_the_upload():
+    backend = CountingBackend()
+    registry = _registry(backend)
+    assert _is_inline(registry.part('key', IMAGE, 'image/png'))
+    for _ in range(3):
+        part = registry.part('key', IMAGE, 'image/png')
+        assert part['file_data']['file_uri'].startswith('local://files/')
+    assert backend.uploaded == 1
+    stats = registry.stats()
+    assert (stats['uploads'], stats['reuses'], stats['bytes_saved']) == (1, 3, 3 * len(IMAGE))
+
+
+def test_small_images_stay_inline():
+    backend = CountingBackend()
+    registry = _registry(backend)
+    small = b'tiny'
+    assert registry.part('key', small, 'image/png') == {'mime_type': 'image/png', 'data': small}
+    assert backend.uploaded == 0
+
+
+def test_uploads_belong_to_one_api_key():
+    backend = CountingBackend()
+    registry = _registry(backend)
+    registry.part('first', IMAGE, 'image/png')
+    assert _is_inline(registry.part('second', IMAGE, 'image/png'))
+    assert backend.uploaded == 2
+
+
+def test_file_dropped_by_the_server_is_uploaded_again(monkeypatch):
+    backend = CountingBackend()
+    registry = _registry(backend)
+    registry.part('key', IMAGE, 'image/png')
+    name = registry.part('key', IMAGE, 'image/png')['file_data']['file_uri'][len('local://'):]
+    backend.delete(name)
+    monkeypatch.setattr(file_registry, 'VERIFY_SECONDS', -1)     # check existence on every use
+    assert _is_inline(registry.part('key', IMAGE, 'image/png'))
+    assert 'file_data' in registry.part('key', IMAGE, 'image/png')
+    assert backend.uploaded == 2
+
+
+def test_upload_inside_the_expiry_margin_is_not_used():
+    backend = CountingBackend(lifetime=EXPIRY_MARGIN - 60)
+    registry = _registry(backend)
+    registry.part('key', IMAGE, 'image/png')
+    assert _is_inline(registry.part('key', IMAGE, 'image/png'))
+    assert backend.uploaded == 2
+    assert registry.stats()['reuses'] == 0
+
+
+def test_background_uploads_and_wait():
+    backend = CountingBackend()
+    registry = _registry(backend, background=True)
+    assert _is_inline(registry.part('key', IMAGE, 'image/png'))
+    assert registry.wait(timeout=5)
+    assert 'file_data' in registry.part('key', IMAGE, 'image/png')
+    other = IMAGE + b'other'
+    assert 'file_data' in registry.part('key', other, 'image/png', wait=True)
+
+
+def test_handles_survive_a_restart_until_they_near_expiry(tmp_path):
+    path = str(tmp_path / 'uploaded_files.json')
+    backend = CountingBackend()
+    _registry(backend, path=path).part('key', IMAGE, 'image/png')
+    assert 'file_data' in _registry(backend, path=path).part('key', IMAGE, 'image/png')
+
+    short = CountingBackend(lifetime=EXPIRY_MARGIN - 60)
+    _registry(short, path=path).part('key', IMAGE + b'2', 'image/png')
+    assert _registry(short, path=path).stats()['files'] == 1
@@ -0,0 +1,116 @@
+import asyncio
+import socket
+
+import pytest
+import requests
+from google.api_core import exceptions as api_exceptions
+
+import gemini_client
+from gemini_client import (
+    AUTH, BLOCKED, INVALID_REQUEST, NETWORK, RATE_LIMIT, SERVER, TIMEOUT, UNKNOWN,
+    GeminiError, backoff_delay, classify_error, generate, generate_async,
+)
+
+
+class FlakyModel:
+    """Raises the given errors in turn, then answers."""
+
+    class Response:
+        text = 'ok'
+        usage_metadata = None
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.Response()
+
+    def generate_content(self, contents, **kwargs):
+        return self._next()
+
+    async def generate_content_async(self, contents, **kwargs):
+        return self._next()
+
+
+class StopCandidateException(Exception):
+    pass
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(gemini_client, 'backoff_delay', lambda attempt: 0.0)
+
+
+@pytest.mark.parametrize('error, kind', [
+    (api_exceptions.ResourceExhausted('quota'), RATE_LIMIT),
+    (api_exceptions.ServiceUnavailable('down'), SERVER),
+    (api_exceptions.DeadlineExceeded('slow'), TIMEOUT),
+    (api_exceptions.PermissionDenied('key'), AUTH),
+    (api_exceptions.InvalidArgument('too long'), INVALID_REQUEST),
+    (TimeoutError('read timed out'), TIMEOUT),
+    (ConnectionResetError('reset'), NETWORK),
+    (socket.gaierror('name resolution'), NETWORK),
+    (requests.exceptions.ConnectionError('refused'), NETWORK),
+    (requests.exceptions.ReadTimeout('slow'), TIMEOUT),
+    (StopCandidateException('safety'), BLOCKED),
+    (ValueError('API key not valid'), AUTH),
+    (FileNotFoundError('missing.png'), UNKNOWN),
+    (PermissionError('denied'), UNKNOWN),
+    (OSError('disk full'), UNKNOWN),
+])
+def test_classify_error(error, kind):
+    assert classify_error(error) == kind
+    assert classify_error(GeminiError(kind, error)) == kind
+
+
+def test_local_os_errors_are_not_retried(no_backoff):
+    model = FlakyModel(FileNotFoundError('missing.png'))
+    with pytest.raises(GeminiError) as caught:
+        generate(model, 'prompt')
+    assert caught.value.kind == UNKNOWN and not caught.value.retryable
+    assert caught.value.attempts == 1 and model.calls == 1
+
+
+def test_retryable_errors_are_retried_until_an_answer(no_backoff):
+    retries = []
+    model = FlakyModel(api_exceptions.ServiceUnavailable('down'), ConnectionResetError('reset'))
+    response = generate(model, 'prompt', on_retry=lambda *args: retries.append(args))
+    assert response.text == 'ok' and model.calls == 3
+    assert retries == [(1, SERVER, 0.0), (2, NETWORK, 0.0)]
+
+
+def test_retries_stop_at_max_retries(no_backoff):
+    model = FlakyModel(*[api_exceptions.ResourceExhausted('quota')] * 5)
+    with pytest.raises(GeminiError) as caught:
+        generate(model, 'prompt', max_retries=2)
+    assert caught.value.kind == RATE_LIMIT
+    assert caught.value.attempts == 3 and model.calls == 3
+
+
+def test_no_retry_whose_backoff_would_pass_the_deadline(monkeypatch):
+    monkeypatch.setattr(gemini_client, 'backoff_delay', lambda attempt: 10.0)
+    model = FlakyModel(api_exceptions.ServiceUnavailable('down'))
+    with pytest.raises(GeminiError) as caught:
+        generate(model, 'prompt', deadline=5.0)
+    assert caught.value.attempts == 1 and model.calls == 1
+
+
+def test_async_calls_retry_the_same_way(no_backoff):
+    model = FlakyModel(api_exceptions.DeadlineExceeded('slow'))
+    response = asyncio.run(generate_async(model, 'prompt'))
+    assert response.text == 'ok' and model.calls == 2
+
+    model = FlakyModel(PermissionError('denied'))
+    with pytest.raises(GeminiError):
+        asyncio.run(generate_async(model, 'prompt'))
+    assert model.calls == 1
+
+
+def test_backoff_is_full_jitter_under_the_cap():
+    for attempt in range(8):
+        delay = backoff_delay(attempt, base=1.0, cap=5.0)
+        assert 0 <= delay <= min(5.0, 2 ** attempt)
@@ -0,0 +1,85 @@
+import io
+
+from PIL import Image
+
+from image_cache import PREVIEW_EDGE, ImageCache, decode
+from image_dedup import dhash_image, hamming
+
+
+def _png(size=(100, 100), color=(30, 120, 200), mode='RGB'):
+    buf = io.BytesIO()
+    Image.new(mode, size, color).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def test_repeat_uploads_are_decoded_once():
+    cache = ImageCache()
+    data = _png()
+    first = cache.get(data)
+    assert cache.get(bytes(data)) is first
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_preview_is_a_small_jpeg_with_the_original_size_kept():
+    entry = decode(_png((2000, 1000)))
+    assert entry.size == (2000, 1000)
+    preview = Image.open(io.BytesIO(entry.thumbnail))
+    assert preview.format == 'JPEG' and preview.size == (PREVIEW_EDGE, PREVIEW_EDGE // 2)
+    # Small uploads are never upscaled
+    small = decode(_png((300, 200)))
+    assert Image.open(io.BytesIO(small.thumbnail)).size == (300, 200)
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6                   # rotated 90 degrees clockwise
+    buf = io.BytesIO()
+    Image.new('RGB', (200, 100)).save(buf, format='JPEG', exif=exif)
+    entry = decode(buf.getvalue())
+    assert entry.size == (100, 200) and entry.image.size == (100, 200)
+
+
+def test_transparent_uploads_preview_on_white():
+    entry = decode(_png(color=(0, 0, 0, 0), mode='RGBA'))
+    preview = Image.open(io.BytesIO(entry.thumbnail)).convert('RGB')
+    assert min(preview.getpixel((50, 50))) > 240
+
+
+def test_fingerprint_comes_from_the_thumbnail():
+    img = Image.linear_gradient('L').resize((1600, 900)).convert('RGB')
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    entry = decode(buf.getvalue())
+    assert hamming(entry.fingerprint, dhash_image(img)) <= 2
+    assert entry.fingerprint is entry.fingerprint
+
+
+def test_least_recently_used_images_go_first():
+    uploads = [_png(color=(n, 0, 0)) for n in range(5)]
+    per_image = decode(uploads[0]).nbytes
+    cache = ImageCache(max_bytes=per_image * 4 + per_image // 2)
+    for data in uploads[:4]:
+        cache.get(data)
+    cache.get(uploads[0])              # touch the oldest
+    cache.get(uploads[4])
+    stats = cache.stats()
+    assert stats['images'] == 4 and stats['evictions'] == 1 and stats['bytes'] <= stats['max_bytes']
+    misses = stats['misses']
+    cache.get(uploads[0])
+    cache.get(uploads[1])
+    assert cache.stats()['misses'] == misses + 1   # only #1 had been evicted
+
+
+def test_an_image_too_big_for_the_cap_keeps_only_its_thumbnail():
+    cache = ImageCache(max_bytes=4 * 1024 * 1024)
+    big = cache.get(_png((1200, 1200)))
+    assert big.image is None and big.thumbnail
+    assert big.nbytes == len(big.thumbnail)
+    assert cache.get(_png()).image is not None
+
+
+def test_clear_empties_the_cache():
+    cache = ImageCache()
+    cache.get(_png())
+    cache.clear()
+    assert cache.stats()['images'] == 0 and cache.stats()['bytes'] == 0
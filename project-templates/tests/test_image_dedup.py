@@ -0,0 +1,69 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from image_dedup import DEFAULT_THRESHOLD, dhash_image, group_duplicates, hamming
+
+
+def _screen(boxes, size=(640, 360)):
+    """A fake app screen: header bar plus dark boxes (left, top, right, bottom)."""
+    img = Image.new('RGB', size, (245, 245, 245))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, size[0], 40), fill=(30, 90, 200))
+    for box in boxes:
+        draw.rectangle(box, fill=(60, 60, 60))
+    return img
+
+
+def _reencoded(img, format='JPEG', **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, format=format, **kwargs)
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+
+# Sidebar + content vs a grid of tiles
+HOME = _screen([(0, 40, 160, 360), (200, 80, 600, 200)])
+SETTINGS = _screen([(x, y, x + 100, y + 80) for x in (40, 260, 480) for y in (70, 220)])
+
+
+def test_hamming_counts_differing_bits():
+    assert hamming(0b1011, 0b0010) == 2
+    assert hamming(2 ** 64 - 1, 0) == 64
+
+
+def test_rescaled_and_reencoded_copies_hash_alike():
+    base = dhash_image(HOME)
+    assert dhash_image(HOME.resize((1280, 720))) == base
+    assert hamming(dhash_image(_reencoded(HOME, quality=60)), base) <= DEFAULT_THRESHOLD
+
+
+def test_transparent_background_hashes_like_a_light_page():
+    # Black under the transparent pixels - without flattening onto white the
+    # background would come out dark
+    rgba = Image.new('RGBA', HOME.size, (0, 0, 0, 0))
+    rgba.paste(HOME, mask=HOME.convert('L').point(lambda v: 0 if v > 240 else 255))
+    assert hamming(dhash_image(rgba), dhash_image(HOME)) <= DEFAULT_THRESHOLD
+
+
+def test_different_screens_are_far_apart():
+    assert hamming(dhash_image(HOME), dhash_image(SETTINGS)) > DEFAULT_THRESHOLD
+
+
+def test_groups_keep_upload_order_and_distances():
+    home, settings = dhash_image(HOME), dhash_image(SETTINGS)
+    near_home = home ^ 0b111           # 3 bits off
+    groups = group_duplicates([home, settings, near_home, home])
+    assert [g.representative for g in groups] == [0, 1]
+    assert groups[0].duplicates == {2: 3, 3: 0}
+    assert groups[0].members == [0, 2, 3] and groups[1].members == [1]
+
+
+def test_an_image_joins_the_closest_group_within_the_threshold():
+    a = 0
+    b = (1 << 10) - 1                  # 10 bits from a
+    between = (1 << 7) - 1             # 7 from a, 3 from b
+    groups = group_duplicates([a, b, between], threshold=8)
+    assert groups[1].duplicates == {2: 3}
+    # Past the threshold it starts a group of its own
+    assert len(group_duplicates([a, b, between], threshold=2)) == 3
+    assert len(group_duplicates([a, a], threshold=0)) == 1
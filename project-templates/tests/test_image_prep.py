@@ -0,0 +1,94 @@
+import io
+import random
+
+from PIL import Image, ImageOps
+
+from image_prep import estimate_image_tokens, passthrough_image, preprocess_image
+
+
+def _png(size, mode='RGB', color=(30, 120, 200)):
+    buf = io.BytesIO()
+    Image.new(mode, size, color).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _photo(size, seed=0):
+    # Noise doesn't fit a 256-colour palette, so Auto picks WebP or JPEG
+    rng = random.Random(seed)
+    img = Image.frombytes('RGB', size, rng.randbytes(size[0] * size[1] * 3))
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def _decode(prepared):
+    return Image.open(io.BytesIO(prepared.data))
+
+
+def test_token_estimate_counts_768px_tiles():
+    assert estimate_image_tokens(300, 200) == 258
+    assert estimate_image_tokens(768, 768) == 258
+    assert estimate_image_tokens(1536, 800) == 258 * 2 * 2
+    assert estimate_image_tokens(2880, 1800) == 258 * 4 * 3
+
+
+def test_large_images_are_downscaled_to_max_edge_keeping_the_aspect_ratio():
+    prepared = preprocess_image(_png((3000, 1500)), max_edge=1536)
+    assert prepared.size == (1536, 768) == _decode(prepared).size
+    assert prepared.original_size == (3000, 1500)
+    assert prepared.tokens < prepared.original_tokens
+    assert '3000×1500 → 1536×768' in prepared.summary()
+
+
+def test_requested_format_is_used():
+    jpeg = preprocess_image(_photo((400, 300)), output_format='JPEG', quality=60)
+    assert jpeg.mime_type == 'image/jpeg' and _decode(jpeg).format == 'JPEG'
+    png = preprocess_image(_photo((400, 300)), max_edge=200, output_format='PNG (palette)')
+    assert png.mime_type == 'image/png' and _decode(png).mode == 'P'
+
+
+def test_auto_keeps_the_smallest_encoding():
+    data = _photo((1200, 900))
+    auto = preprocess_image(data, max_edge=800)
+    for fmt in ('JPEG', 'PNG (palette)'):
+        assert len(auto.data) <= len(preprocess_image(data, max_edge=800, output_format=fmt).data)
+    assert auto.bytes_saved > 0
+
+
+def test_transparency_is_flattened_onto_white():
+    data = _png((500, 500), mode='RGBA', color=(255, 0, 0, 0))
+    prepared = preprocess_image(data, max_edge=100, output_format='JPEG')
+    r, g, b = _decode(prepared).convert('RGB').getpixel((50, 50))
+    assert min(r, g, b) > 245
+
+
+def test_exif_orientation_is_applied():
+    img = Image.new('RGB', (600, 300), (10, 10, 10))
+    exif = img.getexif()
+    exif[0x0112] = 6          # rotated 90 degrees
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', exif=exif)
+    prepared = preprocess_image(buf.getvalue())
+    assert prepared.original_size == (600, 300)
+    assert prepared.size == (300, 600)
+
+
+def test_small_untouched_image_is_sent_as_is():
+    data = _png((64, 64))
+    prepared = preprocess_image(data, output_format='JPEG', quality=100)
+    assert prepared.data == data and prepared.mime_type == 'image/png'
+    assert prepared.bytes_saved == 0
+
+
+def test_decoded_image_is_reused_and_left_alone():
+    data = _photo((1000, 500))
+    decoded = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    decoded.load()
+    prepared = preprocess_image(data, max_edge=500, decoded=decoded)
+    assert prepared.size == (500, 250) and decoded.size == (1000, 500)
+
+
+def test_passthrough_keeps_the_bytes():
+    data = _png((900, 700))
+    prepared = passthrough_image(data)
+    assert (prepared.data, prepared.mime_type, prepared.size) == (data, 'image/png', (900, 700))
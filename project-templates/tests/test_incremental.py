@@ -0,0 +1,109 @@
+from google.api_core import exceptions as api_exceptions
+
+from call_metrics import get_metrics
+from gemini_client import BLOCKED, INVALID_REQUEST
+from incremental import option_delta, patch_previous, previous_result
+from result_store import ResultHistory
+
+
+F = '```'
+
+PREVIOUS = f"""### `App.jsx`
+{F}jsx
+export default function App() {{
+  return (
+    <div className="app">
+      <h1>Hello</h1>
+    </div>
+  );
+}}
+{F}
+"""
+
+DIFF = f"""{F}diff
+@@ -2,5 +2,5 @@
+   return (
+-    <div className="app">
++    <div className="app responsive">
+       <h1>Hello</h1>
+     </div>
+   );
+{F}
+"""
+
+
+class _Response:
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("The response has no parts - it was blocked")
+        return self._text
+
+
+class ScriptedModel:
+    def __init__(self, answer=None, error=None):
+        self.answer = answer
+        self.error = error
+        self.prompts = []
+
+    def generate_content(self, contents, **kwargs):
+        self.prompts.append(contents)
+        if self.error is not None:
+            raise self.error
+        return _Response(self.answer)
+
+
+DELTA = [('Make it responsive', False, True)]
+
+
+def _last_status(feature):
+    return get_metrics().recent(feature)[-1].status
+
+
+def test_option_delta_lists_changed_options_only():
+    previous = {'Make it responsive': False, 'Add animations': True}
+    current = {'Make it responsive': True, 'Add animations': True}
+    assert option_delta(previous, current) == DELTA
+
+
+def test_previous_result_needs_same_base_and_different_options(tmp_path):
+    history = ResultHistory('session', directory=str(tmp_path))
+    options = {'Make it responsive': False}
+    history.add('image', PREVIOUS, inputs={'base': 'a', 'options': options})
+    assert previous_result(history.entries(), 'b', {'Make it responsive': True}) is None
+    assert previous_result(history.entries(), 'a', options) is None
+    assert previous_result(history.entries(), 'a', {'Make it responsive': True}).text == PREVIOUS
+
+
+def test_patch_is_applied_to_the_previous_answer():
+    model = ScriptedModel(DIFF)
+    result = patch_previous(model, PREVIOUS, DELTA, feature='test.patch')
+    assert result is not None and result.applied == 1
+    assert '<div className="app responsive">' in result.text
+    assert result.text.endswith(f'{F}\n')
+    assert '- Make it responsive: False -> True' in model.prompts[0]
+    assert _last_status('test.patch') == 'ok'
+
+
+def test_no_changes_keeps_the_previous_answer():
+    result = patch_previous(ScriptedModel('NO CHANGES'), PREVIOUS, DELTA)
+    assert result.text == PREVIOUS and result.applied == 0
+
+
+def test_patch_that_does_not_apply_means_regenerate():
+    answer = DIFF.replace('className="app">', 'className="root">')
+    assert patch_previous(ScriptedModel(answer), PREVIOUS, DELTA) is None
+
+
+def test_failed_call_means_regenerate_and_fails_the_record():
+    model = ScriptedModel(error=api_exceptions.InvalidArgument('prompt too long'))
+    assert patch_previous(model, PREVIOUS, DELTA, feature='test.patch.failed') is None
+    assert _last_status('test.patch.failed') == INVALID_REQUEST
+
+
+def test_blocked_answer_means_regenerate_and_fails_the_record():
+    assert patch_previous(ScriptedModel(None), PREVIOUS, DELTA, feature='test.patch.blocked') is None
+    assert _last_status('test.patch.blocked') == BLOCKED
@@ -0,0 +1,113 @@
+import itertools
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+import gemini_client
+from call_metrics import OK, SHARED, get_metrics
+from fake_gemini import FakeModel, FakeSettings
+from gemini_client import INVALID_REQUEST, SERVER, GeminiError
+from multi_framework import framework_folder, generate_all
+
+
+_keys = itertools.count()
+
+
+class PickyModel(FakeModel):
+    """FakeModel that rejects prompts mentioning SwiftUI and fails 'Vue' prompts once."""
+
+    def __init__(self):
+        super().__init__('models/fake', settings=FakeSettings(
+            ttft=0.01, tokens_per_second=50000.0, chunk_seconds=0.01, output_tokens=200, jitter=0.0
+        ))
+        self.failed_once = False
+
+    def generate_content(self, contents, **kwargs):
+        if 'SwiftUI' in contents:
+            raise api_exceptions.InvalidArgument('unsupported')
+        if 'Vue' in contents and not self.failed_once:
+            self.failed_once = True
+            raise api_exceptions.ServiceUnavailable('busy')
+        return super().generate_content(contents, **kwargs)
+
+
+def _slow_model():
+    # Slow enough that identical jobs are still in flight together
+    return FakeModel('models/fake', settings=FakeSettings(
+        ttft=0.3, tokens_per_second=50000.0, chunk_seconds=0.01, output_tokens=200, jitter=0.0
+    ))
+
+
+def _events(*args, **kwargs):
+    events = {}
+    for kind, index, payload in generate_all(*args, **kwargs):
+        events.setdefault(index, []).append((kind, payload))
+    return events
+
+
+def _statuses(feature):
+    return sorted(record.status for record in get_metrics().recent(feature))
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(gemini_client, 'backoff_delay', lambda attempt: 0.0)
+
+
+@pytest.mark.parametrize('framework, folder', [
+    ('HTML/CSS/JS', 'html-css-js'), ('React', 'react'), ('SwiftUI', 'swiftui'), ('Vue.js ', 'vue-js'),
+])
+def test_framework_folder(framework, folder):
+    assert framework_folder(framework) == folder
+
+
+def test_blocking_mode_sends_no_text_events(fake_model):
+    events = _events(fake_model, ['React', 'Flutter'], stream=False, feature='test.frameworks.blocking')
+    for index in (0, 1):
+        (kind, result), = events[index]
+        assert kind == 'done' and result.text and result.chunks == 1
+    assert _statuses('test.frameworks.blocking') == [OK, OK]
+
+
+def test_failed_framework_reports_an_error_event_and_retries_are_relayed(no_backoff):
+    events = _events(PickyModel(), ['React', 'SwiftUI', 'Vue'], stream=True)
+    assert events[0][-1][0] == 'done'
+    kind, error = events[1][-1]
+    assert kind == 'error' and isinstance(error, GeminiError) and error.kind == INVALID_REQUEST
+    assert ('retry', (1, SERVER, 0.0)) in events[2]
+    assert events[2][-1][0] == 'done' and events[2][-1][1].text
+
+
+def test_identical_jobs_share_one_call_and_store_once():
+    model = _slow_model()
+    key = f"test-key-{next(_keys)}"
+    stored = []
+    events = _events(model, ['React', 'React'], stream=True, keys=[key, key],
+                     stores=[stored.append, stored.append], feature='test.frameworks.shared')
+    texts = [events[index][-1][1].text for index in (0, 1)]
+    assert texts[0] == texts[1] and texts[0]
+    assert model.calls == 1 and stored == [texts[0]]
+    assert _statuses('test.frameworks.shared') == sorted([OK, SHARED])
+
+
+def test_no_keys_means_no_sharing():
+    model = _slow_model()
+    stored = []
+    _events(model, ['React', 'React'], stream=False, stores=[stored.append, stored.append])
+    assert model.calls == 2 and len(stored) == 2
+
+
+def test_blocked_answer_is_an_error_event():
+    class Blocked:
+        usage_metadata = None
+
+        @property
+        def text(self):
+            raise ValueError("The response has no parts")
+
+    class BlockingModel:
+        def generate_content(self, contents, **kwargs):
+            return Blocked()
+
+    (kind, error), = _events(BlockingModel(), ['React'], stream=False)[0]
+    assert kind == 'error' and 'no parts' in str(error)
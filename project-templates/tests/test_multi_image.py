@@ -0,0 +1,55 @@
+from call_metrics import OK, get_metrics
+from gemini_client import BLOCKED, GeminiError
+from multi_image import analyze_screens, build_reduce_prompt
+
+
+PARTS = [{'mime_type': 'image/png', 'data': f'screen {n}'.encode()} for n in range(3)]
+
+
+class _Response:
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("The response has no parts - it was blocked")
+        return self._text
+
+
+class BlockingModel:
+    """Answers every screen except #2, whose answer comes back blocked."""
+
+    def generate_content(self, contents, **kwargs):
+        prompt = contents[0]
+        return _Response(None if 'screen #2 of' in prompt else 'SCREEN NAME: Login')
+
+
+def _statuses(feature):
+    return sorted(record.status for record in get_metrics().recent(feature))
+
+
+def test_every_screen_is_analyzed_and_recorded(fake_model):
+    outcomes = list(analyze_screens(fake_model, PARTS, max_workers=3, feature='test.screens'))
+    assert sorted(index for index, _, _, _ in outcomes) == [0, 1, 2]
+    assert all(summary and error is None and seconds > 0 for _, summary, seconds, error in outcomes)
+    assert fake_model.calls == 3
+    assert _statuses('test.screens') == [OK] * 3
+
+
+def test_blocked_screen_fails_its_record_and_reports_the_error():
+    outcomes = {index: (summary, error)
+                for index, summary, _, error in analyze_screens(BlockingModel(), PARTS,
+                                                                feature='test.screens.blocked')}
+    summary, error = outcomes[1]
+    assert summary is None
+    assert isinstance(error, GeminiError) and error.kind == BLOCKED
+    assert outcomes[0][0] == outcomes[2][0] == 'SCREEN NAME: Login'
+    assert _statuses('test.screens.blocked') == sorted([BLOCKED, OK, OK])
+
+
+def test_reduce_prompt_numbers_the_screens_that_made_it():
+    prompt = build_reduce_prompt(['Login  \n', None, 'Dashboard'], 'React application')
+    assert '=== SCREEN 1 ===\nLogin' in prompt and '=== SCREEN 3 ===\nDashboard' in prompt
+    assert 'SCREEN 2' not in prompt
+    assert 'summaries of 2 screens' in prompt and 'complete React application' in prompt
@@ -0,0 +1,85 @@
+import pytest
+
+from gemini_client import rough_token_count
+from preflight import (
+    CONTEXT_LIMIT, EDGE_LADDER, Estimate, choose_max_edge, compact_text, estimate_request,
+    fit_text_to_budget, resized,
+)
+
+
+DOCS = '\n'.join(f"GET /items/{n} returns item {n} with its fields and links" for n in range(4000))
+
+
+def test_estimate_numbers_and_caption():
+    estimate = Estimate(10_000, 1_500)
+    assert estimate.latency_seconds == pytest.approx(1.0 + 1.0 + 10.0)
+    assert estimate.cost_usd == pytest.approx((10_000 * 0.30 + 1_500 * 2.50) / 1e6)
+    assert estimate.caption().startswith('📏 ~10,000 input tokens')
+    assert 'context window' not in estimate.caption()
+
+    over = Estimate(CONTEXT_LIMIT + 1, 0, exact=True)
+    assert over.over_context
+    assert over.caption().startswith(f'📏 {CONTEXT_LIMIT + 1:,}')
+    assert '⚠️ over the' in over.caption()
+
+
+def test_exact_counts_come_from_the_model(fake_model):
+    assert not estimate_request('x' * 4000, 100).exact
+    exact = estimate_request('x' * 4000, 100, model=fake_model)
+    assert exact.exact and exact.input_tokens == rough_token_count('x' * 4000)
+
+
+def test_compact_text_drops_boilerplate_and_repeated_blocks():
+    footer = "This documentation is generated from the public OpenAPI description of the service."
+    text = (
+        "Skip to main content\n\n"
+        "## Items   \n\n\n\n"
+        "Example:\n\n"
+        "    items:\n      - id: 1\n\n"
+        f"{footer}\n\n"
+        "Example:\n\n"
+        f"{footer}\n\n"
+        "Was this page helpful? Yes No\n"
+        "© 2024 Example Corp\n"
+    )
+    compacted = compact_text(text)
+    assert 'Skip to' not in compacted and 'helpful' not in compacted and '©' not in compacted
+    assert compacted.count(footer) == 1
+    assert compacted.count('Example:') == 2                 # short blocks may repeat
+    assert '    items:\n      - id: 1' in compacted        # indentation kept
+    assert '## Items\n\nExample:' in compacted
+
+
+def test_text_that_fits_is_only_compacted():
+    text = "Intro   \n\n\n\nBody\n"
+    fitted, trimmed = fit_text_to_budget(text, budget_tokens=1000)
+    assert fitted == 'Intro\n\nBody'
+    assert trimmed == len(text) - len(fitted)
+
+
+@pytest.mark.parametrize('budget, reserved', [(1_000, 0), (5_000, 2_000), (30, 0)])
+def test_truncated_text_fits_the_budget_note_included(budget, reserved):
+    fitted, trimmed = fit_text_to_budget(DOCS, budget, reserved_tokens=reserved)
+    assert rough_token_count(fitted) <= budget - reserved
+    assert fitted.endswith('characters truncated to fit the token budget ...]')
+    assert trimmed == len(DOCS) - len(fitted)
+
+
+def test_truncation_cuts_at_a_line_break():
+    fitted, _ = fit_text_to_budget(DOCS, 1_000)
+    kept = fitted.split('\n\n[...')[0]
+    assert DOCS.startswith(kept + '\n')
+
+
+def test_resized_keeps_the_aspect_ratio_and_never_upscales():
+    assert resized((3000, 1500), 1536) == (1536, 768)
+    assert resized((800, 600), 1536) == (800, 600)
+
+
+def test_max_edge_steps_down_until_the_images_fit():
+    sizes = [(2880, 1800)] * 4
+    # Preferred edge fits a generous budget as is
+    assert choose_max_edge(sizes, budget_tokens=100_000, preferred_edge=1536) == 1536
+    # 4 x 2x2 tiles at 1536 = 4128 tokens; 4 x 1 tile at 768 = 1032
+    assert choose_max_edge(sizes, budget_tokens=2_000, preferred_edge=1536) == 768
+    assert choose_max_edge(sizes, budget_tokens=10, preferred_edge=1536) == EDGE_LADDER[-1]
@@ -0,0 +1,126 @@
+import io
+import zipfile
+
+from project_files import ProjectBuilder, bundle, clean_path, find_label, parse_project
+
+
+F = '```'
+
+ANSWER = f"""Here is the complete project.
+
+### `src/app.py`
+{F}python
+from flask import Flask
+
+app = Flask(__name__)
+{F}
+
+**requirements.txt**
+{F}
+flask>=3.0
+{F}
+
+File: static/style.css
+{F}css
+body {{ margin: 0; }}
+{F}
+
+Install and run it with:
+{F}bash
+pip install -r requirements.txt
+python src/app.py
+{F}
+
+### `README.md`
+{F}markdown
+# Demo
+
+Run it:
+
+{F}bash
+python src/app.py
+{F}
+
+That's all.
+{F}
+
+Good luck!
+"""
+
+
+def _paths(project):
+    return [f.path for f in project.files]
+
+
+def test_heading_bold_and_prefixed_labels_name_the_files():
+    project = parse_project(ANSWER)
+    assert _paths(project) == ['src/app.py', 'requirements.txt', 'static/style.css', 'README.md']
+    assert project.read('requirements.txt') == 'flask>=3.0\n'
+    assert project.files[0].language == 'python'
+
+
+def test_nested_fences_stay_inside_markdown_blocks():
+    readme = parse_project(ANSWER).read('README.md')
+    assert readme.startswith('# Demo\n')
+    assert f'{F}bash\npython src/app.py\n{F}\n' in readme
+    assert readme.endswith("That's all.\n")
+
+
+def test_shell_snippets_are_not_files():
+    project = parse_project(ANSWER)
+    assert len(project) == 4
+    assert not any('pip install' in project.read(path) for path in _paths(project) if path != 'README.md')
+    assert len(parse_project(f"Run:\n{F}bash\nnpm install\n{F}\n")) == 0
+
+
+def test_names_from_the_fence_info_and_first_line():
+    text = (f'{F}js:src/index.js\nconsole.log(1);\n{F}\n'
+            f'{F}python title="tools/run.py"\nprint(2)\n{F}\n'
+            f'{F}ts\n// file: lib/util.ts\nexport const x = 1;\n{F}\n')
+    assert _paths(parse_project(text)) == ['src/index.js', 'tools/run.py', 'lib/util.ts']
+
+
+def test_single_unlabeled_block_gets_the_default_name():
+    text = f"Here you go:\n\n{F}jsx\nexport default function App() {{}}\n{F}\n"
+    project = parse_project(text, default_name='generated_code.jsx')
+    assert _paths(project) == ['generated_code.jsx']
+    assert project.read('generated_code.jsx') == 'export default function App() {}\n'
+
+
+def test_answers_without_fences_become_one_file():
+    project = parse_project("print('hello')\n", default_name='generated_app.py')
+    assert _paths(project) == ['generated_app.py']
+
+
+def test_streamed_in_small_chunks_matches_the_whole_text():
+    builder = ProjectBuilder()
+    completed = []
+    for start in range(0, len(ANSWER), 7):
+        completed += [f.path for f in builder.feed(ANSWER[start:start + 7])]
+    project = builder.close()
+    whole = parse_project(ANSWER)
+    assert completed == _paths(whole) == _paths(project)
+    assert project.zip_data and all(project.read(p) == whole.read(p) for p in _paths(whole))
+
+
+def test_output_cut_off_mid_file_keeps_what_arrived():
+    project = parse_project(f"### `main.go`\n{F}go\npackage main\n\nfunc main() {{")
+    assert project.read('main.go') == 'package main\n\nfunc main() {\n'
+
+
+def test_duplicate_names_and_unsafe_paths():
+    text = f"### `../app.py`\n{F}python\na = 1\n{F}\n### `app.py`\n{F}python\nb = 2\n{F}\n"
+    assert _paths(parse_project(text)) == ['app.py', 'app_2.py']
+    assert clean_path('/etc/../passwd') == 'etc/passwd'
+
+
+def test_prose_mentioning_a_file_is_not_a_label():
+    assert find_label('### `src/app.py`') == 'src/app.py'
+    assert find_label('Then run `app.py` with the flags below:') is None
+
+
+def test_bundle_puts_each_project_in_its_own_folder():
+    react = parse_project(f"### `App.jsx`\n{F}jsx\nx\n{F}\n")
+    vue = parse_project(f"### `App.vue`\n{F}vue\ny\n{F}\n")
+    with zipfile.ZipFile(io.BytesIO(bundle([('react', react), ('vue', vue)]))) as archive:
+        assert sorted(archive.namelist()) == ['react/App.jsx', 'vue/App.vue']
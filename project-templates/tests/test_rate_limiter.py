@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+import rate_limiter
+from rate_limiter import QueueTimeout, RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    # Refills don't notify anyone, so waiters only notice them when polling
+    monkeypatch.setattr(rate_limiter, 'POLL_SECONDS', 0.01)
+
+
+def _limiter(first_in=0.3):
+    """10 requests a second, nothing available for the first `first_in` seconds."""
+    limiter = RateLimiter(rpm=600, tpm=1_000_000)
+    limiter.requests.level = 1 - first_in * limiter.requests.rate
+    return limiter
+
+
+class Queue:
+    """Starts acquire() calls one by one, in a known queue order."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.served = []
+        self.errors = []
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def add(self, session_id, name=None, **kwargs):
+        queued = self.limiter.snapshot()['queued']
+
+        def run():
+            try:
+                self.limiter.acquire(session_id, 100, **kwargs)
+            except QueueTimeout as e:
+                with self._lock:
+                    self.errors.append((name or session_id, e))
+                return
+            with self._lock:
+                self.served.append(name or session_id)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        deadline = time.monotonic() + 2
+        while self.limiter.snapshot()['queued'] == queued and thread.is_alive():
+            assert time.monotonic() < deadline
+            time.sleep(0.002)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join(5)
+        assert not any(thread.is_alive() for thread in self.threads)
+
+
+def test_sessions_are_served_round_robin():
+    queue = Queue(_limiter())
+    for _ in range(4):
+        queue.add('batch')
+    queue.add('click')
+    queue.join()
+    # The single click goes right after the batch's first request, not after all four
+    assert queue.served == ['batch', 'click', 'batch', 'batch', 'batch']
+    assert queue.limiter.snapshot()['queued'] == 0
+
+
+def test_waiting_past_the_timeout_raises_and_leaves_the_queue():
+    limiter = _limiter(first_in=60)
+    with pytest.raises(QueueTimeout):
+        limiter.acquire('a', 100, timeout=0.05)
+    assert limiter.snapshot()['sessions_waiting'] == 0
+
+
+def test_session_whose_head_timed_out_keeps_its_turn():
+    queue = Queue(_limiter())
+    queue.add('a', name='a1', timeout=0.05)
+    queue.add('a', name='a2')
+    queue.add('b', name='b1')
+    queue.join()
+    assert [name for name, _ in queue.errors] == ['a1']
+    assert queue.served == ['a2', 'b1']
+
+
+def test_waiters_get_position_and_expected_wait_without_the_lock():
+    limiter = _limiter(first_in=60)
+    queue = Queue(limiter)
+    for _ in range(3):
+        queue.add('batch', timeout=2)
+    reports = []
+    reported = threading.Event()
+
+    def on_wait(position, seconds):
+        # Another thread can use the limiter while we redraw
+        probe = threading.Thread(target=limiter.snapshot)
+        probe.start()
+        probe.join(1)
+        reports.append((position, seconds, probe.is_alive()))
+        reported.set()
+
+    queue.add('click', on_wait=on_wait, timeout=2)
+    assert reported.wait(2)
+    with limiter._cond:
+        limiter.requests.level = limiter.requests.capacity
+        limiter._cond.notify_all()
+    queue.join()
+
+    position, seconds, blocked = reports[0]
+    # Round robin: second in line behind the batch's first request
+    assert position == 2 and not blocked
+    assert seconds == pytest.approx(60 + 0.1, abs=0.5)
+    assert queue.served[1] == 'click' and not queue.errors
+
+
+def test_settle_refunds_or_charges_the_difference():
+    limiter = RateLimiter(rpm=600, tpm=1000)
+    limiter.acquire('a', 800)
+    assert limiter.snapshot()['tokens_available'] == pytest.approx(200, abs=5)
+    limiter.settle(800, 300)
+    assert limiter.snapshot()['tokens_available'] == pytest.approx(700, abs=5)
+    limiter.settle(300, None)
+    assert limiter.snapshot()['tokens_available'] == pytest.approx(700, abs=5)
@@ -0,0 +1,107 @@
+import random
+
+import response_cache
+from response_cache import ResponseCache, make_key, make_request_key
+
+
+class Clock:
+    """Stands in for the time module inside response_cache."""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def _clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, 'time', clock)
+    return clock
+
+
+def _code(seed, size=2000):
+    # Random hex barely compresses, so every entry costs about the same on disk
+    return random.Random(seed).randbytes(size).hex()
+
+
+def test_keys_are_length_prefixed_and_ignore_cosmetic_edits():
+    assert make_key('ab', 'c') != make_key('a', 'bc')
+    assert make_key('a', None) == make_key('a', b'')
+    assert (make_request_key('m', 'Build it  \r\nnow\n', 'sys')
+            == make_request_key('m', 'Build it\nnow', 'sys'))
+
+
+def test_first_read_comes_from_disk_then_from_memory(tmp_path):
+    path = str(tmp_path / 'responses.sqlite3')
+    cache = ResponseCache(path)
+    cache.put('k', 'code')
+    assert cache.get('k') == 'code' and cache.get('k') == 'code'
+    assert cache.get('missing') is None
+    stats = cache.stats()
+    assert (stats['disk_hits'], stats['memory_hits'], stats['misses']) == (1, 1, 1)
+
+    # A restart starts with an empty memory tier
+    reopened = ResponseCache(path)
+    assert reopened.get('k') == 'code'
+    assert reopened.stats()['disk_hits'] == 1
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = _clock(monkeypatch)
+    cache = ResponseCache(':memory:', ttl_seconds=60)
+    cache.put('k', 'code')
+    assert cache.get('k') == 'code'          # now also in memory
+    clock.now += 61
+    assert cache.get('k') is None
+    assert cache.stats()['disk_entries'] == 0
+
+
+def test_disk_budget_evicts_the_least_recently_read(monkeypatch):
+    clock = _clock(monkeypatch)
+    probe = ResponseCache(':memory:')
+    probe.put('probe', _code(0))
+    entry_bytes = probe.stats()['disk_bytes']
+
+    # No memory tier, so every read touches the disk row
+    cache = ResponseCache(':memory:', memory_items=0, max_disk_bytes=int(entry_bytes * 2.5))
+    for seed, key in enumerate('ab', start=1):
+        cache.put(key, _code(seed))
+        clock.now += 1
+    assert cache.get('a') is not None
+    clock.now += 1
+    cache.put('c', _code(3))
+
+    assert cache.get('b') is None
+    assert cache.get('a') == _code(1) and cache.get('c') == _code(3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_schema_change_drops_the_old_table(tmp_path, monkeypatch):
+    path = str(tmp_path / 'responses.sqlite3')
+    ResponseCache(path).put('k', 'code')
+    assert ResponseCache(path).get('k') == 'code'
+
+    monkeypatch.setattr(response_cache, 'SCHEMA_VERSION', response_cache.SCHEMA_VERSION + 1)
+    assert ResponseCache(path).get('k') is None
+
+
+def test_samples_are_newest_first_and_capped():
+    cache = ResponseCache(':memory:')
+    for n in range(5):
+        cache.add_sample('k', f'variant {n}', max_samples=3)
+    assert cache.get_samples('k') == ['variant 4', 'variant 3', 'variant 2']
+    assert cache.get('k') == 'variant 4'
+    assert cache.stats()['disk_entries'] == 3
+    assert cache.get_samples('missing') == []
+
+
+def test_put_replaces_every_sample():
+    cache = ResponseCache(':memory:')
+    cache.add_sample('k', 'first')
+    cache.add_sample('k', 'second')
+    assert cache.get_samples('k') == ['second', 'first']     # memory tier now holds both
+    cache.put('k', 'only')
+    assert cache.get_samples('k') == ['only']
+    cache.add_sample('k', 'next')
+    assert cache.get_samples('k') == ['next', 'only']
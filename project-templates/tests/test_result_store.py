@@ -0,0 +1,54 @@
+import os
+
+from result_store import INLINE_CHARS, ResultHistory
+
+
+def _history(tmp_path, **kwargs):
+    return ResultHistory('session', directory=str(tmp_path), **kwargs)
+
+
+def test_small_results_stay_in_memory(tmp_path):
+    history = _history(tmp_path)
+    entry = history.add('image_to_code', 'print("hi")', title='React')
+    assert entry.in_memory and entry.text == 'print("hi")'
+    assert not os.path.exists(os.path.join(str(tmp_path), 'session'))
+
+
+def test_big_results_spill_to_disk_and_reload_lazily(tmp_path):
+    history = _history(tmp_path)
+    text = 'x = 1\n' * (INLINE_CHARS // 6 + 10)
+    entry = history.add('doc2app', text)
+    assert not entry.in_memory and entry.memory_bytes == 0
+    assert entry.chars == len(text)
+    spilled = os.listdir(os.path.join(str(tmp_path), 'session'))
+    assert spilled == [f"{entry.id}.z"]
+    assert os.path.getsize(os.path.join(str(tmp_path), 'session', spilled[0])) < len(text) // 10
+    # Read back on every access, never cached in memory again
+    assert entry.text == text
+    assert not entry.in_memory
+
+
+def test_memory_cap_spills_the_oldest_entries_first(tmp_path):
+    history = _history(tmp_path, max_memory_bytes=2500)
+    entries = [history.add('doc2app', str(n) * 1000) for n in range(4)]
+    assert [e.in_memory for e in entries] == [False, False, True, True]
+    assert history.memory_bytes() <= 2500
+    assert [e.text for e in entries] == [str(n) * 1000 for n in range(4)]
+
+
+def test_oldest_entries_are_dropped_with_their_files(tmp_path):
+    history = _history(tmp_path, max_memory_bytes=0, max_entries=2)
+    first = history.add('doc2app', 'a')
+    history.add('refactor', 'b')
+    history.add('doc2app', 'c')
+    assert [e.text for e in history.entries()] == ['c', 'b']
+    assert [e.text for e in history.entries('doc2app')] == ['c']
+    assert history.latest('doc2app').text == 'c'
+    assert not os.path.exists(os.path.join(str(tmp_path), 'session', f"{first.id}.z"))
+
+
+def test_missing_spill_file_reads_as_none(tmp_path):
+    history = _history(tmp_path, max_memory_bytes=0)
+    entry = history.add('doc2app', 'gone soon')
+    os.remove(os.path.join(str(tmp_path), 'session', f"{entry.id}.z"))
+    assert entry.text is None
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from fake_gemini import FakeChunk, FakeModel, FakeSettings
+from gemini_client import GeminiError
+from single_flight import FlightAbandoned, SharedResponse, SingleFlight
+
+
+def _slow_stream_model():
+    # ~20 chunks, 20 ms apart - long enough for followers to join mid-stream
+    return FakeModel('models/fake', settings=FakeSettings(
+        ttft=0.05, tokens_per_second=2000.0, chunk_seconds=0.02, output_tokens=400, jitter=0.0
+    ))
+
+
+class FailingModel:
+    """Raises a non-retryable error from the call itself, or after some chunks of a stream."""
+
+    def __init__(self, chunks_before_error=None, delay=0.2):
+        self.chunks_before_error = chunks_before_error
+        self.delay = delay
+        self.calls = 0
+        self.calling = threading.Event()
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        self.calls += 1
+        self.calling.set()
+        time.sleep(self.delay)
+        if self.chunks_before_error is None:
+            raise api_exceptions.InvalidArgument('bad request')
+        return self._stream()
+
+    def _stream(self):
+        for n in range(self.chunks_before_error):
+            yield FakeChunk(f"part {n}\n")
+            time.sleep(0.05)
+        raise ConnectionError('stream dropped')
+
+
+def _in_thread(target):
+    outcome = {}
+
+    def run():
+        try:
+            outcome['value'] = target()
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def _read(response):
+    return ''.join(chunk.text for chunk in response)
+
+
+def test_followers_get_the_whole_stream_and_store_runs_once():
+    flights = SingleFlight()
+    model = _slow_stream_model()
+    stored = []
+    first_chunk = threading.Event()
+
+    def lead():
+        parts = []
+        for chunk in flights.generate('key', model, 'prompt', stream=True, store=stored.append):
+            parts.append(chunk.text)
+            first_chunk.set()
+        return ''.join(parts)
+
+    leader, led = _in_thread(lead)
+    assert first_chunk.wait(5)
+    followers = [_in_thread(lambda: _read(flights.generate('key', model, 'prompt', stream=True,
+                                                           store=stored.append)))
+                 for _ in range(4)]
+    leader.join(5)
+    for thread, _ in followers:
+        thread.join(5)
+
+    text = led['value']
+    assert len(text) > 1000
+    assert [outcome['value'] for _, outcome in followers] == [text] * 4
+    assert stored == [text]
+    assert model.calls == 1
+    assert flights.stats() == {'in_flight': 0, 'leaders': 1, 'shared': 4}
+
+
+def test_blocking_calls_share_one_call():
+    flights = SingleFlight()
+    model = _slow_stream_model()
+    stored = []
+    start = threading.Barrier(5)
+
+    def call():
+        start.wait()
+        return flights.generate('key', model, 'prompt', store=stored.append).text
+
+    threads = [_in_thread(call) for _ in range(5)]
+    for thread, _ in threads:
+        thread.join(5)
+    texts = {outcome['value'] for _, outcome in threads}
+    assert len(texts) == 1 and stored == list(texts)
+    assert model.calls == 1
+
+
+def test_follower_takes_over_when_the_leader_fails_first():
+    flights = SingleFlight()
+    failing = FailingModel()
+    working = _slow_stream_model()
+
+    leader, led = _in_thread(lambda: flights.generate('key', failing, 'prompt'))
+    assert failing.calling.wait(5)
+    # Joins while the leader's call is still out, then makes its own once it fails
+    follower, followed = _in_thread(lambda: flights.generate('key', working, 'prompt').text)
+    leader.join(5)
+    follower.join(5)
+
+    assert isinstance(led['error'], GeminiError)
+    assert followed['value'].startswith("Here's the complete")
+    assert (failing.calls, working.calls) == (1, 1)
+    assert flights.stats()['leaders'] == 2
+
+
+def test_error_mid_stream_reaches_the_followers():
+    flights = SingleFlight()
+    model = FailingModel(chunks_before_error=3, delay=0.0)
+    first_chunk = threading.Event()
+
+    def lead():
+        for _ in flights.generate('key', model, 'prompt', stream=True):
+            first_chunk.set()
+
+    leader, led = _in_thread(lead)
+    assert first_chunk.wait(5)
+    follower, followed = _in_thread(lambda: _read(flights.generate('key', model, 'prompt', stream=True)))
+    leader.join(5)
+    follower.join(5)
+
+    assert isinstance(led['error'], ConnectionError)
+    assert followed['error'] is led['error']
+    assert model.calls == 1
+
+
+def test_leader_that_stops_reading_abandons_the_flight():
+    flights = SingleFlight()
+    model = _slow_stream_model()
+    response = flights.generate('key', model, 'prompt', stream=True)
+    chunks = iter(response)
+    next(chunks)
+    follower = flights.generate('key', model, 'prompt', stream=True)
+    assert isinstance(follower, SharedResponse)
+    chunks.close()          # e.g. a Streamlit rerun interrupting the leader
+    with pytest.raises(FlightAbandoned):
+        _read(follower)
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_no_key_opts_out_of_sharing_but_still_stores():
+    flights = SingleFlight()
+    model = _slow_stream_model()
+    stored = []
+    first = flights.generate(None, model, 'prompt', store=stored.append).text
+    second = flights.generate(None, model, 'prompt', store=stored.append).text
+    assert stored == [first, second]
+    assert model.calls == 2 and flights.stats()['shared'] == 0
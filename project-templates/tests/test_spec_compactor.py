@@ -0,0 +1,165 @@
+import json
+
+import pytest
+
+from spec_compactor import compact_openapi, compact_spec, short_description
+
+
+LONG = ("The pet as stored by the shop. " + "It carries every detail the clerks asked for over the years. " * 6)
+
+PET = {
+    'type': 'object',
+    'description': LONG,
+    'required': ['id', 'name'],
+    'properties': {
+        'id': {'type': 'integer', 'format': 'int64', 'example': 10},
+        'name': {'type': 'string', 'example': 'doggie', 'x-internal-note': 'legacy column'},
+        'status': {'type': 'string', 'enum': ['available', 'pending', 'sold']},
+    },
+    'xml': {'name': 'pet'},
+}
+
+ADDRESS = {
+    'type': 'object',
+    'properties': {
+        'street': {'type': 'string', 'description': 'Street and number.'},
+        'city': {'type': 'string', 'description': 'City the customer lives in.'},
+        'zip': {'type': 'string', 'description': 'Postal code, five digits.', 'pattern': '^[0-9]{5}$'},
+    },
+}
+
+
+def _expanded_spec(paths=6):
+    """A spec the way exporters paste it: components $ref-expanded into every operation."""
+    spec = {
+        'openapi': '3.0.3',
+        'info': {'title': 'Petstore', 'version': '1.0', 'description': LONG},
+        'components': {'schemas': {'Pet': PET}},
+        'paths': {},
+    }
+    for n in range(paths):
+        spec['paths'][f'/pets{n}/{{petId}}'] = {
+            'get': {
+                'summary': f'Find pet {n}. ' + LONG,
+                'operationId': f'getPet{n}',
+                'parameters': [{'name': 'petId', 'in': 'path', 'required': True,
+                                'schema': {'type': 'integer'}, 'example': 3}],
+                'responses': {'200': {'description': 'OK', 'content': {'application/json': {
+                    'schema': json.loads(json.dumps(PET)),
+                    'examples': {'dog': {'value': {'id': 1, 'name': 'Rex', 'status': 'sold'}}},
+                }}}},
+                'x-codegen': {'tags': ['generated'] * 20},
+            },
+        }
+    return spec
+
+
+def _section(text, heading):
+    return text.split(f"## {heading}\n", 1)[1].split('\n\n## ', 1)[0]
+
+
+def test_expanded_copies_fold_back_into_the_component():
+    text, operations, schemas, dropped = compact_openapi(_expanded_spec())
+    assert operations == 6
+    assert schemas == 1 and dropped == 0
+    assert '-> 200: Pet' in text
+    # The component is written out once, noise and all dropped
+    assert text.count('status: "available" | "pending" | "sold"') == 1
+    assert 'doggie' not in text and 'legacy column' not in text and 'x-codegen' not in text
+
+
+def test_repeated_inline_objects_are_hoisted_and_named():
+    spec = {
+        'openapi': '3.0.0',
+        'info': {'title': 'Shop', 'version': '2'},
+        'paths': {
+            '/customers': {'post': {'operationId': 'addCustomer', 'requestBody': {'content': {
+                'application/json': {'schema': {'type': 'object', 'properties': {
+                    'name': {'type': 'string'}, 'billing': ADDRESS}}}}}, 'responses': {'201': {}}}},
+            '/orders': {'post': {'operationId': 'addOrder', 'requestBody': {'content': {
+                'application/json': {'schema': {'type': 'object', 'properties': {
+                    'total': {'type': 'number'}, 'shipping': ADDRESS}}}}}, 'responses': {'201': {}}}},
+        },
+    }
+    text, _, schemas, _ = compact_openapi(spec)
+    assert schemas == 1
+    schema_section = _section(text, 'Schemas')
+    name = schema_section.split('\n', 1)[0]
+    assert name == 'Billing'
+    assert f'billing: {name}' in text and f'shipping: {name}' in text
+    assert text.count('street') == 1
+    assert 'zip: string [pattern="^[0-9]{5}$"] - Postal code, five digits.' in schema_section
+
+
+def test_unreferenced_schemas_are_dropped():
+    spec = _expanded_spec(paths=1)
+    spec['components']['schemas']['Unused'] = {'type': 'object', 'properties': {'a': {'type': 'string'}}}
+    text, _, schemas, dropped = compact_openapi(spec)
+    assert (schemas, dropped) == (1, 1)
+    assert 'Unused' not in text
+
+
+def test_malformed_path_items_are_skipped():
+    spec = {
+        'swagger': '2.0',
+        'info': {'title': 'Odd', 'version': '0'},
+        'paths': {
+            '/none': None,
+            '/list': ['get'],
+            '/text': 'GET me',
+            '/bad-op': {'get': 'not an operation', 'post': None},
+            '/dangling': {'$ref': '#/paths/missing'},
+            '/ok': {'get': {'responses': {'204': {'description': 'gone'}},
+                            'parameters': [None, {'in': 'query'}, {'name': 'q', 'in': 'query', 'type': 'string'}]}},
+        },
+    }
+    text, operations, _, _ = compact_openapi(spec)
+    assert operations == 1
+    assert 'GET /ok' in text and '  query q: string' in text and '-> 204' in text
+
+
+@pytest.mark.parametrize('schema', [
+    {'allOf': []},
+    {'type': 'string', 'enum': None},
+    {'type': 'object', 'properties': ['id', 'name']},
+    {'type': 'object', 'properties': None},
+])
+def test_odd_schema_shapes_still_compact(schema):
+    spec = _expanded_spec(paths=12)
+    spec['components']['schemas']['Odd'] = schema
+    response = spec['paths']['/pets0/{petId}']['get']['responses']['200']['content']['application/json']
+    response['schema'] = {'$ref': '#/components/schemas/Odd'}
+    result = compact_spec(json.dumps(spec))
+    assert result is not None and 'Odd' in result.text
+
+
+@pytest.mark.parametrize('mangle', [
+    lambda spec: spec['components'].update(schemas=['Pet']),
+    lambda spec: spec['components']['schemas']['Pet'].update(required=5),
+    lambda spec: spec['paths']['/pets0/{petId}']['get'].update(parameters=[{'name': 'x', 'in': 'query', 'schema': ['int']}]),
+])
+def test_unexpected_shapes_keep_the_raw_documentation(mangle):
+    spec = json.loads(json.dumps(_expanded_spec(paths=12)))
+    mangle(spec)
+    # Either compacted or left alone (None) - never an exception
+    result = compact_spec(json.dumps(spec))
+    assert result is None or result.tokens < result.original_tokens
+
+
+def test_compaction_delivers_the_token_reduction():
+    raw = json.dumps(_expanded_spec(paths=12), indent=2)
+    result = compact_spec(raw)
+    assert result is not None
+    assert result.ratio >= 4
+    assert result.tokens < result.original_tokens
+    assert f"{result.operations} operations" in result.caption()
+
+
+def test_non_specs_are_left_alone():
+    assert compact_spec("# Weather API\n\nGET /forecast returns the forecast.") is None
+
+
+def test_short_description_keeps_the_first_sentence():
+    assert short_description("Creates a pet.  Needs **admin**\nrights.") == 'Creates a pet.'
+    assert short_description('x' * 500).endswith('…')
+    assert short_description(None) == ''
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from call_metrics import OK, get_metrics, start_call
+from fake_gemini import FakeChunk
+from gemini_client import NETWORK
+from streaming import finish_blocking, stream_to_placeholder
+
+
+class Placeholder:
+    """Records what st.empty() would have been asked to draw."""
+
+    def __init__(self):
+        self.draws = []
+
+    def code(self, text, language=None):
+        self.draws.append(('code', text, language))
+
+    def markdown(self, text):
+        self.draws.append(('markdown', text, None))
+
+
+class BlockedChunk:
+    @property
+    def text(self):
+        raise ValueError("The response has no parts")
+
+
+class Sink:
+    def __init__(self):
+        self.fed = []
+
+    def feed(self, text):
+        self.fed.append(text)
+
+
+def _dropping(pieces):
+    for piece in pieces:
+        yield FakeChunk(piece)
+    raise ConnectionError('stream dropped')
+
+
+def test_stream_is_drawn_as_it_arrives_and_closed_without_cursor(fake_model):
+    placeholder = Placeholder()
+    sink = Sink()
+    record = start_call('test.stream')
+    started = time.perf_counter()
+    response = fake_model.generate_content('prompt', stream=True)
+    result = stream_to_placeholder(response, placeholder, started, language='python',
+                                   refresh_seconds=0.0, record=record, sink=sink)
+
+    assert result.text == response.text and result.chunks > 1
+    assert ''.join(sink.fed) == result.text
+    assert 0 < result.ttft <= result.total
+    assert all(text.endswith(' ▌') for _, text, _ in placeholder.draws[:-1])
+    assert placeholder.draws[-1] == ('code', result.text, 'python')
+    assert get_metrics().recent('test.stream')[-1].output_tokens == response.usage_metadata.candidates_token_count
+    assert 'First token after' in result.timing_caption()
+
+
+def test_redraws_are_throttled():
+    placeholder = Placeholder()
+    chunks = [FakeChunk(f'line {n}\n') for n in range(50)]
+    result = stream_to_placeholder(chunks, placeholder, markdown=True, refresh_seconds=60)
+    # The first chunk and the final text
+    assert len(placeholder.draws) == 2
+    assert placeholder.draws[-1] == ('markdown', result.text, None)
+
+
+def test_chunks_without_parts_are_skipped():
+    chunks = [FakeChunk('a'), BlockedChunk(), FakeChunk(''), FakeChunk('b')]
+    result = stream_to_placeholder(chunks, Placeholder())
+    assert (result.text, result.chunks) == ('ab', 2)
+
+
+def test_broken_stream_fails_the_record_and_reraises():
+    record = start_call('test.stream.broken')
+    with pytest.raises(ConnectionError):
+        stream_to_placeholder(_dropping(['a', 'b']), Placeholder(), record=record)
+    assert record.status == NETWORK
+
+
+def test_finish_blocking_times_a_regular_response(fake_model):
+    record = start_call('test.blocking')
+    started = time.perf_counter()
+    result = finish_blocking(fake_model.generate_content('prompt'), started, record)
+    assert result.ttft == result.total > 0 and result.chunks == 1
+    assert record.status == OK
+    assert result.timing_caption().startswith('⏱️ Generated in')